@@ -0,0 +1,166 @@
+"""
+Grafo de animações data-driven (estados, frames, durações e transições)
+
+O ficheiro JSON é compilado no carregamento para tabelas planas, de modo
+que escolher o frame a partir do tempo decorrido é O(1).
+"""
+import json
+import logging
+from collections import namedtuple
+from math import gcd
+
+logger = logging.getLogger('GeminiCat')
+
+# Limite de entradas por tabela de frames (evita tabelas gigantes com durações sem divisor comum)
+MAX_TABLE_SIZE = 4096
+
+# Grafo usado se o ficheiro de dados não existir ou for inválido
+DEFAULT_GRAPH = {
+    "initial": "idle",
+    "states": {
+        "idle": {"frames": ["sit"], "frame_ms": 1000},
+        "happy": {"frames": ["sit"], "frame_ms": 1000},
+        "sleeping": {"frames": ["sit"], "frame_ms": 1000},
+        "walking": {
+            "frames": ["walk_0", "walk_1", "walk_2", "walk_3", "walk_4", "walk_5"],
+            "frame_ms": 1000
+        }
+    },
+    "transitions": [
+        {"mood": "sleep", "state": "sleeping"},
+        {"moving": True, "state": "walking"},
+        {"mood": "happy", "state": "happy"},
+        {"state": "idle"}
+    ]
+}
+
+
+class AnimationGraphError(ValueError):
+    """Erro na definição do grafo de animações"""
+
+
+CompiledState = namedtuple(
+    'CompiledState', 'name frames table bucket_ms total_ms loop next_state'
+)
+
+
+class AnimationGraph:
+    """Grafo de animações compilado em tabelas de lookup"""
+
+    def __init__(self, data):
+        states = data.get("states")
+        if not states:
+            raise AnimationGraphError("grafo sem estados")
+
+        self.state_ids = {name: index for index, name in enumerate(states)}
+        self.states = tuple(
+            self._compile_state(name, spec) for name, spec in states.items()
+        )
+
+        initial = data.get("initial", next(iter(states)))
+        self.initial = self._state_id(initial)
+
+        self._rules = tuple(self._compile_rule(rule) for rule in data.get("transitions", ()))
+        if not self._rules:
+            raise AnimationGraphError("grafo sem regras de transição")
+
+        # Tabela (mood, moving) -> estado para os moods conhecidos; outros são memoizados
+        moods = {rule[0] for rule in self._rules if rule[0] is not None}
+        self._transition_table = {
+            (mood, moving): self._evaluate_rules(mood, moving)
+            for mood in moods for moving in (False, True)
+        }
+
+        self.frame_names = frozenset(
+            frame for state in self.states for frame in state.frames
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Carregar grafo de um ficheiro JSON (fallback para o grafo por omissão)"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                graph = cls(json.load(f))
+            logger.info(f"Grafo de animações carregado: {path} ({len(graph.states)} estados)")
+            return graph
+        except (OSError, json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Erro ao carregar grafo de animações: {e} - usando grafo por omissão")
+            return cls(DEFAULT_GRAPH)
+
+    def _state_id(self, name):
+        try:
+            return self.state_ids[name]
+        except KeyError:
+            raise AnimationGraphError(f"estado desconhecido: {name}") from None
+
+    def _compile_state(self, name, spec):
+        frames = tuple(spec.get("frames", ()))
+        if not frames:
+            raise AnimationGraphError(f"estado '{name}' sem frames")
+
+        durations = spec.get("durations_ms")
+        if durations is None:
+            durations = [spec.get("frame_ms", 100)] * len(frames)
+        if len(durations) != len(frames):
+            raise AnimationGraphError(f"estado '{name}': {len(frames)} frames mas {len(durations)} durações")
+        if any(int(d) <= 0 for d in durations):
+            raise AnimationGraphError(f"estado '{name}': durações têm de ser positivas")
+
+        durations = [int(d) for d in durations]
+        bucket_ms = 0
+        for duration in durations:
+            bucket_ms = gcd(bucket_ms, duration)
+        total_ms = sum(durations)
+        if total_ms // bucket_ms > MAX_TABLE_SIZE:
+            raise AnimationGraphError(f"estado '{name}': durações sem divisor comum razoável")
+
+        # Cada entrada cobre bucket_ms e guarda o índice do frame ativo
+        table = []
+        for index, duration in enumerate(durations):
+            table.extend([index] * (duration // bucket_ms))
+
+        next_state = self._state_id(spec["next"]) if "next" in spec else -1
+        return CompiledState(
+            name=name,
+            frames=frames,
+            table=tuple(table),
+            bucket_ms=bucket_ms,
+            total_ms=total_ms,
+            loop=bool(spec.get("loop", True)),
+            next_state=next_state
+        )
+
+    def _compile_rule(self, rule):
+        state = self._state_id(rule["state"])
+        return (rule.get("mood"), rule.get("moving"), state)
+
+    def _evaluate_rules(self, mood, moving):
+        for rule_mood, rule_moving, state in self._rules:
+            if rule_mood is not None and rule_mood != mood:
+                continue
+            if rule_moving is not None and rule_moving != moving:
+                continue
+            return state
+        return self.initial
+
+    def target_state(self, mood, moving):
+        """Estado alvo para o mood/movimento atual - O(1)"""
+        key = (mood, moving)
+        state = self._transition_table.get(key)
+        if state is None:
+            state = self._transition_table[key] = self._evaluate_rules(mood, moving)
+        return state
+
+    def frame_at(self, state_id, elapsed_ms):
+        """Frame para o tempo decorrido no estado - O(1)
+
+        Returns:
+            tuple: (str: nome do frame, bool: animação one-shot terminou)
+        """
+        state = self.states[state_id]
+        if elapsed_ms >= state.total_ms:
+            if not state.loop:
+                return state.frames[-1], True
+            elapsed_ms %= state.total_ms
+        return state.frames[state.table[int(elapsed_ms) // state.bucket_ms]], False
+
@@ -0,0 +1,46 @@
+"""
+Microbenchmark do matcher de keywords de should_activate_search
+
+Mede o tempo por mensagem da implementação compilada (uma passagem) e do
+algoritmo anterior (um `in` por keyword, várias passagens). A equivalência
+dos scores é verificada em test_search_matcher.py.
+
+Uso:
+    python bench_search_matcher.py [--messages 5000] [--seed 1]
+"""
+import argparse
+import time
+
+from gemini_chat_real import GeminiCatChat
+from test_search_matcher import corpus, legacy_score
+
+
+def bench(label, func, messages, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            func(message)
+    elapsed = time.perf_counter() - started
+    per_call = elapsed / (repeat * len(messages)) * 1e6
+    print(f"{label:>10}: {per_call:7.2f} µs/mensagem")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do matcher de keywords")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    chat = GeminiCatChat(None)
+    messages = corpus(chat, args.messages, args.seed)
+    print(f"{len(messages)} mensagens")
+
+    legacy = bench("anterior", lambda m: legacy_score(chat, m), messages, args.repeat)
+    compiled = bench("compilado", chat.should_activate_search, messages, args.repeat)
+    print(f"{'speedup':>10}: {legacy / compiled:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
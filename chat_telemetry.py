@@ -0,0 +1,295 @@
+"""
+Telemetria por pedido do chat: routing, fila, primeiro byte, modelo,
+tamanho, tokens e renderização no Tk
+
+Cada pedido fica num registo JSONL rotativo (escrito por uma thread
+própria) e em histogramas agregados, exportáveis em formato de texto do
+Prometheus numa porta local opcional (`GEMINICAT_METRICS_PORT`).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from event_tracing import LatencyHistogram
+
+logger = logging.getLogger('GeminiCat')
+
+HISTOGRAM_BUCKETS = 28  # log2 de µs, até ~134s
+PHASES = ('queue_wait', 'ttfb', 'model', 'render', 'total')
+MAX_OPEN = 256
+
+
+class RequestMetrics:
+    """Medições de um pedido (preenchidas pela thread de trabalho e pelo Tk)"""
+
+    __slots__ = ('key', 'started', 'queue_wait', 'score', 'decision', 'route', 'model', 'tier',
+                 'ttfb', 'model_time', 'response_chars', 'usage', 'render', 'outcome', 'hedge',
+                 'knowledge', 'prestaged', 'pending', '_model_started')
+
+    def __init__(self, key, queue_wait):
+        self.key = key
+        self.started = time.monotonic() - (queue_wait or 0)  # total conta desde a submissão
+        self.queue_wait = queue_wait
+        self.score = None
+        self.decision = None  # heuristica, classificador ou utilizador
+        self.route = None  # grounded, plain, cache, local ou erro
+        self.model = None
+        self.tier = None
+        self.ttfb = None
+        self.model_time = None
+        self.response_chars = 0
+        self.usage = None
+        self.render = 0.0
+        self.outcome = "ok"
+        self.hedge = None  # desfecho do pedido com pesquisa em paralelo (scores ambíguos)
+        self.knowledge = None  # semelhança do melhor excerto das notas locais
+        self.prestaged = False  # routing/notas/cache preparados enquanto o utilizador escrevia
+        self.pending = 1  # partes por terminar antes do registo (render final e eventuais `hold`)
+        self._model_started = None
+
+    def model_started(self):
+        self._model_started = time.monotonic()
+
+    def first_byte(self):
+        """Primeiro chunk do modelo (só conta o primeiro)"""
+        if self.ttfb is None and self._model_started is not None:
+            self.ttfb = time.monotonic() - self._model_started
+
+    def model_finished(self, usage=None):
+        if self._model_started is not None:
+            self.model_time = time.monotonic() - self._model_started
+            if self.ttfb is None:
+                self.ttfb = self.model_time
+        if usage:
+            self.usage = usage
+
+    def as_record(self, total):
+        return {
+            'ts': round(time.time(), 3),
+            'route': self.route,
+            'outcome': self.outcome,
+            'score': self.score,
+            'decision': self.decision,
+            'model': self.model,
+            'tier': self.tier,
+            'queue_wait_ms': _ms(self.queue_wait),
+            'ttfb_ms': _ms(self.ttfb),
+            'model_ms': _ms(self.model_time),
+            'render_ms': _ms(self.render),
+            'total_ms': _ms(total),
+            'response_chars': self.response_chars,
+            'hedge': self.hedge,
+            'knowledge': None if self.knowledge is None else round(self.knowledge, 3),
+            'prestaged': self.prestaged,
+            'usage': self.usage
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+class ChatTelemetry:
+    """Registo e agregação das métricas por pedido
+
+    Args:
+        path: ficheiro JSONL (None desativa o registo em ficheiro)
+        max_bytes/backups: rotação do ficheiro
+        port: porta local para /metrics em formato Prometheus (None desativa)
+    """
+
+    def __init__(self, path=None, max_bytes=1 << 20, backups=3, port=None):
+        self.histograms = {}  # (fase, rota) -> LatencyHistogram
+        self.requests = Counter()  # (rota, resultado) -> pedidos
+        self.tokens = Counter()  # tipo -> tokens
+        self.hedges = Counter()  # desfecho -> pedidos duplicados
+        self.response_chars = 0
+        self._open = {}
+        self._lock = threading.Lock()
+        self._file_logger = None
+        self._listener = None
+        self._server = None
+        if path:
+            self._open_file(path, max_bytes, backups)
+        if port:
+            self.serve(port)
+
+    def _open_file(self, path, max_bytes, backups):
+        """Registo JSONL rotativo escrito por uma thread própria (QueueListener)"""
+        records = queue.Queue()
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self._listener = logging.handlers.QueueListener(records, handler)
+        self._listener.start()
+
+        self._file_logger = logging.getLogger('GeminiCat.metrics')
+        self._file_logger.propagate = False
+        self._file_logger.setLevel(logging.INFO)
+        self._file_logger.addHandler(logging.handlers.QueueHandler(records))
+
+    def start(self, key, queue_wait=None):
+        """Começar a medir o pedido identificado por `key` (placeholder da resposta)"""
+        metrics = RequestMetrics(key, queue_wait)
+        with self._lock:
+            # Pedidos nunca fechados (ex: janela fechada antes do render) não se acumulam
+            while len(self._open) >= MAX_OPEN:
+                del self._open[next(iter(self._open))]
+            self._open[key] = metrics
+        return metrics
+
+    def rendered(self, key, seconds, final=False):
+        """Tempo gasto pelo Tk a desenhar a resposta (soma dos lotes)"""
+        metrics = self._open.get(key)
+        if metrics is None:
+            return
+        metrics.render += seconds
+        if final:
+            self.release(key)
+
+    def hold(self, metrics):
+        """Adiar o registo até um `release` extra (ex: pedido em paralelo por resolver)"""
+        with self._lock:
+            metrics.pending += 1
+
+    def release(self, key):
+        """Parte do pedido terminada; regista quando não falta nenhuma"""
+        with self._lock:
+            metrics = self._open.get(key)
+            if metrics is None:
+                return
+            metrics.pending -= 1
+            if metrics.pending > 0:
+                return
+        self.finish(key)
+
+    def finish(self, key, outcome=None):
+        """Fechar o pedido: agregar e escrever o registo"""
+        with self._lock:
+            metrics = self._open.pop(key, None)
+            if metrics is None:
+                return
+            if outcome is not None:
+                metrics.outcome = outcome
+            total = time.monotonic() - metrics.started
+            route = metrics.route or "local"
+
+            phases = (metrics.queue_wait, metrics.ttfb, metrics.model_time, metrics.render, total)
+            for phase, seconds in zip(PHASES, phases):
+                if seconds is None:
+                    continue
+                histogram = self.histograms.get((phase, route))
+                if histogram is None:
+                    histogram = self.histograms[(phase, route)] = LatencyHistogram(HISTOGRAM_BUCKETS)
+                histogram.add(int(seconds * 1e9))
+            self.requests[(route, metrics.outcome)] += 1
+            self.response_chars += metrics.response_chars
+            if metrics.hedge is not None:
+                self.hedges[metrics.hedge] += 1
+            for kind, count in (metrics.usage or {}).items():
+                self.tokens[kind] += count or 0
+
+        if self._file_logger is not None:
+            self._file_logger.info(json.dumps(metrics.as_record(total), ensure_ascii=False))
+
+    def summary(self):
+        """p50/p95 por fase e rota (µs), para logs e diagnóstico"""
+        with self._lock:
+            return {f"{phase}/{route}": histogram.as_dict() for (phase, route), histogram in self.histograms.items()}
+
+    def prometheus(self):
+        """Métricas no formato de texto do Prometheus"""
+        lines = []
+        with self._lock:
+            for phase in PHASES:
+                name = f"geminicat_chat_{phase}_seconds"
+                lines.append(f"# TYPE {name} histogram")
+                for (hist_phase, route), histogram in sorted(self.histograms.items()):
+                    if hist_phase != phase:
+                        continue
+                    cumulative = 0
+                    # O último bucket não tem limite superior (fica só em +Inf)
+                    for bucket, count in enumerate(histogram.counts[:-1]):
+                        cumulative += count
+                        upper = (1 << bucket) / 1e6
+                        lines.append(f'{name}_bucket{{route="{route}",le="{upper:g}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{route="{route}",le="+Inf"}} {histogram.samples}')
+                    lines.append(f'{name}_sum{{route="{route}"}} {histogram.total_ns / 1e9:.6f}')
+                    lines.append(f'{name}_count{{route="{route}"}} {histogram.samples}')
+
+            lines.append("# TYPE geminicat_chat_requests_total counter")
+            for (route, outcome), count in sorted(self.requests.items()):
+                lines.append(f'geminicat_chat_requests_total{{route="{route}",outcome="{outcome}"}} {count}')
+            lines.append("# TYPE geminicat_chat_tokens_total counter")
+            for kind, count in sorted(self.tokens.items()):
+                lines.append(f'geminicat_chat_tokens_total{{kind="{kind}"}} {count}')
+            lines.append("# TYPE geminicat_chat_hedges_total counter")
+            for result, count in sorted(self.hedges.items()):
+                lines.append(f'geminicat_chat_hedges_total{{result="{result}"}} {count}')
+            lines.append("# TYPE geminicat_chat_response_chars_total counter")
+            lines.append(f"geminicat_chat_response_chars_total {self.response_chars}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port):
+        """Servir /metrics em 127.0.0.1:`port` numa thread daemon"""
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        except OSError as e:
+            logger.warning(f"Métricas Prometheus indisponíveis na porta {port}: {e}")
+            return
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info(f"Métricas do chat em http://127.0.0.1:{port}/metrics")
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry(path=None, max_bytes=1 << 20, backups=3, port=None):
+    """Telemetria partilhada pelo processo (os argumentos só contam na primeira chamada)"""
+    global _telemetry
+    with _telemetry_lock:
+        if _telemetry is None:
+            _telemetry = ChatTelemetry(path, max_bytes, backups, port)
+            atexit.register(_telemetry.close)
+        return _telemetry
+
+
+def close_telemetry():
+    """Escrever os registos em fila e parar o servidor, se a telemetria foi criada"""
+    with _telemetry_lock:
+        telemetry = _telemetry
+    if telemetry is not None:
+        telemetry.close()
@@ -0,0 +1,312 @@
+"""
+Transcrição virtualizada do chat: todas as mensagens ficam num store em
+memória, mas o widget Text só contém as últimas N; as anteriores são
+carregadas por páginas quando o utilizador chega ao topo
+"""
+import itertools
+import tkinter as tk
+import webbrowser
+
+from markdown_render import configure_tags
+
+
+class TranscriptEntry:
+    """Mensagem do chat: segmentos (texto, tags, url) já processados e marcas no widget"""
+
+    __slots__ = ('name', 'segments', 'open', 'links', 'tail')
+
+    def __init__(self, name, segments, open_=False):
+        self.name = name
+        self.segments = list(segments)
+        self.open = open_  # Resposta ainda por chegar (placeholder ou streaming)
+        self.links = []  # Marcas dos links enquanto a mensagem está no widget
+        self.tail = None  # Marcas dos links da parte provisória (streaming), se existir
+
+
+class ChatTranscript:
+    """Mensagens do chat num Text com conteúdo limitado
+
+    Cada mensagem começa na marca `<nome>.start`; respostas abertas têm
+    ainda `<nome>.end`. Acrescentar ou substituir uma resposta mexe só nas
+    marcas dessa mensagem, por isso o custo não depende do tamanho da
+    sessão. Métodos chamados na thread do Tk.
+
+    Args:
+        max_messages: mensagens mantidas no widget (as mais antigas saem ao acrescentar)
+        page_size: mensagens carregadas de cada vez ao chegar ao topo
+
+    Chegando ao topo sem mensagens da sessão por mostrar, chama-se
+    `load_more()` (se definido) para pedir mensagens de sessões anteriores,
+    que chegam depois por `prepend`.
+    """
+
+    def __init__(self, max_messages=200, page_size=50):
+        self.max_messages = max_messages
+        self.page_size = page_size
+        self.entries = []  # Store da sessão, da mais antiga para a mais recente
+        self.first_shown = 0  # Índice em entries da primeira mensagem no widget
+        self.link_urls = {}  # marca de início do link -> (marca de fim, URL)
+        self.text = None
+        self._open = {}  # nome -> entrada com resposta por chegar
+        self._ids = itertools.count(1)
+        self._link_ids = itertools.count(1)
+        self._paging = False
+        self.load_more = None
+
+    def attach(self, text):
+        """Ligar a um widget Text novo (janela aberta) e mostrar as últimas mensagens"""
+        self.text = text
+        self.link_urls = {}
+        configure_tags(self.text)
+        self.text.tag_config("hyperlink", foreground="blue", underline=True)
+        self.text.tag_bind("hyperlink", "<Button-1>", self.on_link_click)
+        self.text.tag_bind("hyperlink", "<Enter>", lambda e: self.text.config(cursor="hand2"))
+        self.text.tag_bind("hyperlink", "<Leave>", lambda e: self.text.config(cursor=""))
+
+        # Detetar chegada ao topo a partir do scroll (a barra do ScrolledText continua a ser atualizada)
+        self.text.config(yscrollcommand=self.on_scroll)
+
+        # Respostas por chegar da janela anterior foram canceladas ao fechá-la
+        self.entries = [entry for entry in self.entries if not entry.open]
+        self._open.clear()
+        self.first_shown = max(0, len(self.entries) - self.max_messages)
+
+        self.text.config(state=tk.NORMAL)
+        for entry in self.entries[self.first_shown:]:
+            self._render(entry, tk.END)
+        self.text.see(tk.END)
+        self.text.config(state=tk.DISABLED)
+
+    def append(self, segments):
+        """Acrescentar mensagem completa no fim"""
+        entry = TranscriptEntry(f"msg{next(self._ids)}", segments)
+        self.entries.append(entry)
+        self.text.config(state=tk.NORMAL)
+        self._render(entry, tk.END)
+        self.text.see(tk.END)
+        self._trim()
+        self.text.config(state=tk.DISABLED)
+        return entry.name
+
+    def add_placeholder(self, text):
+        """Acrescentar mensagem provisória (ex: "A processar..."); devolve o nome"""
+        entry = TranscriptEntry(f"msg{next(self._ids)}", [(text, (), None)], open_=True)
+        self.entries.append(entry)
+        self._open[entry.name] = entry
+        self.text.config(state=tk.NORMAL)
+        self._render(entry, tk.END)
+        self.text.see(tk.END)
+        self._trim()
+        self.text.config(state=tk.DISABLED)
+        return entry.name
+
+    def open_reply(self, name, prefix):
+        """Trocar o texto provisório pelo prefixo da resposta; devolve a marca final"""
+        entry = self._open[name]
+        end = f"{name}.end"
+        self.text.delete(f"{name}.start", end)
+        self._forget_links(entry)
+        entry.segments = [(prefix, (), None)]
+        self.text.mark_gravity(end, tk.RIGHT)
+        self.text.insert(end, prefix)
+        return end
+
+    def extend(self, name, segments, provisional=()):
+        """Acrescentar segmentos a uma resposta aberta
+
+        `provisional` (linha ainda por terminar no streaming) substitui a
+        parte provisória anterior, entre as marcas `<nome>.tail` e `<nome>.end`.
+        """
+        entry = self._open[name]
+        end = f"{name}.end"
+        tail = f"{name}.tail"
+        if entry.tail is not None:
+            self.text.delete(tail, end)
+            self._unset_links(entry.tail)
+            entry.tail = None
+
+        entry.segments.extend(segments)
+        entry.links += self.insert_segments(segments, end)
+
+        if provisional:
+            self.text.mark_set(tail, end)
+            self.text.mark_gravity(tail, tk.LEFT)
+            entry.tail = self.insert_segments(provisional, end)
+
+    def close(self, name):
+        """Resposta completa: a mensagem fica só com a marca inicial"""
+        entry = self._open.pop(name, None)
+        if entry is None:
+            return
+        entry.open = False
+        if entry.tail is not None:
+            # Resposta interrompida a meio de uma linha: a parte provisória fica como está
+            entry.links += entry.tail
+            entry.tail = None
+        self.text.mark_unset(f"{name}.end", f"{name}.tail")
+        self._trim()
+
+    def _render(self, entry, where):
+        """Inserir uma mensagem em `where` (fim ou marca com gravidade direita)"""
+        where = tk.END + "-1c" if where == tk.END else where
+        start = f"{entry.name}.start"
+        self.text.mark_set(start, where)
+        self.text.mark_gravity(start, tk.LEFT)
+        entry.links = self.insert_segments(entry.segments, where)
+        if entry.open:
+            end = f"{entry.name}.end"
+            self.text.mark_set(end, where)
+            self.text.mark_gravity(end, tk.LEFT)
+        self.text.insert(where, "\n\n")
+
+    def insert_segments(self, segments, where):
+        """Inserir segmentos (texto, tags, url) numa só chamada; devolve as marcas dos links
+
+        Os links partilham a tag "hyperlink" (aspeto e cliques). Cada um tem
+        marcas no início e no fim, registadas com o URL em `link_urls`: dois
+        links seguidos formam um só intervalo da tag mas não se confundem.
+        """
+        where = tk.END + "-1c" if where == tk.END else where
+        start = self.text.index(where)
+
+        args = []
+        links = []  # (desvio do início, desvio do fim, URL)
+        offset = 0
+        for text, tags, url in segments:
+            length = _tk_length(text)
+            if url is None:
+                args += [text, tags]
+            else:
+                args += [text, tags + ("hyperlink",)]
+                if length:
+                    links.append((offset, offset + length, url))
+            offset += length
+        if not args:
+            return []
+        self.text.insert(where, *args)
+
+        marks = []
+        for link_start, link_end, url in links:
+            mark = f"link{next(self._link_ids)}"
+            end = f"{mark}_end"
+            self.text.mark_set(mark, f"{start}+{link_start}c")
+            self.text.mark_gravity(mark, tk.RIGHT)
+            self.text.mark_set(end, f"{start}+{link_end}c")
+            self.text.mark_gravity(end, tk.LEFT)
+            self.link_urls[mark] = (end, url)
+            marks.append(mark)
+        return marks
+
+    def _unset_links(self, marks):
+        for mark in marks:
+            link = self.link_urls.pop(mark, None)
+            if link is not None:
+                self.text.mark_unset(mark, link[0])
+
+    def _forget_links(self, entry):
+        self._unset_links(entry.links)
+        entry.links = []
+
+    def _trim(self):
+        """Retirar do topo do widget as mensagens acima do limite (a vista está no fim)"""
+        excess = len(self.entries) - self.first_shown - self.max_messages
+        if excess <= 0:
+            return
+
+        cut = self.first_shown
+        while cut < self.first_shown + excess and not self.entries[cut].open:
+            cut += 1
+        if cut == self.first_shown:
+            return
+
+        self.text.delete("1.0", f"{self.entries[cut].name}.start")
+        for entry in self.entries[self.first_shown:cut]:
+            self.text.mark_unset(f"{entry.name}.start")
+            self._forget_links(entry)
+        self.first_shown = cut
+
+    def on_scroll(self, first, last):
+        """yscrollcommand: atualizar a barra e carregar mensagens antigas ao chegar ao topo"""
+        scrollbar = getattr(self.text, 'vbar', None)
+        if scrollbar is not None:
+            scrollbar.set(first, last)
+        if float(first) > 0.0 or self._paging:
+            return
+        if self.first_shown > 0:
+            self._paging = True
+            self.text.after_idle(self.load_older)
+        elif self.load_more is not None:
+            self._paging = True
+            self.text.after_idle(self.load_more)
+
+    def prepend(self, segment_lists):
+        """Acrescentar mensagens mais antigas (ex: do histórico guardado) antes de todas as outras"""
+        self._paging = False
+        entries = [TranscriptEntry(f"msg{next(self._ids)}", segments) for segments in segment_lists]
+        self.entries[0:0] = entries
+        if self.first_shown > 0 or self.text is None or not self.text.winfo_exists():
+            self.first_shown += len(entries)
+            return
+        self.first_shown = len(entries)
+        self.load_older(len(entries))
+
+    def load_older(self, count=None):
+        """Inserir a página anterior no topo, mantendo a mensagem visível no mesmo sítio"""
+        self._paging = False
+        if self.text is None or not self.text.winfo_exists() or self.first_shown == 0:
+            return
+
+        start = max(0, self.first_shown - (count or self.page_size))
+        self.text.config(state=tk.NORMAL)
+        if self.first_shown == len(self.entries):
+            # Widget vazio: basta inserir no fim
+            for entry in self.entries[start:]:
+                self._render(entry, tk.END)
+            self.text.config(state=tk.DISABLED)
+            self.first_shown = start
+            return
+
+        anchor = f"{self.entries[self.first_shown].name}.start"
+        # A marca da mensagem que estava no topo tem de ficar depois do texto inserido
+        self.text.mark_gravity(anchor, tk.RIGHT)
+        self.text.mark_set("transcript.page", "1.0")
+        self.text.mark_gravity("transcript.page", tk.RIGHT)
+        for entry in self.entries[start:self.first_shown]:
+            self._render(entry, "transcript.page")
+        self.text.mark_unset("transcript.page")
+        self.text.mark_gravity(anchor, tk.LEFT)
+        self.text.config(state=tk.DISABLED)
+
+        self.first_shown = start
+        self.text.yview(anchor)
+
+    def on_link_click(self, event):
+        """Abrir o URL do link clicado (intervalo de marcas que contém o ponto clicado)"""
+        index = self.text.index(f"@{event.x},{event.y}")
+        link_range = self.text.tag_prevrange("hyperlink", f"{index}+1c")
+        if not link_range:
+            return
+        # Só as marcas dentro do intervalo da tag (links seguidos partilham-no)
+        for _, name, _ in self.text.dump(*link_range, mark=True):
+            link = self.link_urls.get(name)
+            if (link is not None and self.text.compare(name, "<=", index)
+                    and self.text.compare(index, "<", link[0])):
+                open_link(link[1])
+                return
+        # Sem marcas (não devia acontecer): o texto do link é o próprio URL
+        open_link(self.text.get(*link_range))
+
+
+def _tk_length(text):
+    """Comprimento do texto em índices do Tk (o Tcl 8.6 conta cada carácter fora do BMP como dois)"""
+    if tk.TkVersion >= 9:
+        return len(text)
+    return len(text) + sum(1 for char in text if ord(char) > 0xFFFF)
+
+
+def open_link(url):
+    """Abrir URL no browser"""
+    # Adicionar https:// se não tiver protocolo
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    webbrowser.open(url)
@@ -0,0 +1,201 @@
+"""
+Pool limitado de workers para pedidos do chat (fila, prazos e cancelamento)
+"""
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger('GeminiCat')
+
+
+class RequestCancelled(Exception):
+    """Pedido cancelado (ex: janela do chat fechada)"""
+
+
+class RequestTimeout(Exception):
+    """Prazo do pedido esgotado"""
+
+
+class CancellationToken:
+    """Sinal de cancelamento partilhado por vários pedidos
+
+    Com `parent`, fica também cancelado quando o pai é cancelado (mas
+    `wait` só acorda com o cancelamento próprio).
+    """
+
+    def __init__(self, parent=None):
+        self._event = threading.Event()
+        self.parent = parent
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def wait(self, timeout):
+        """Dormir até `timeout` segundos; True se entretanto foi cancelado"""
+        return self._event.wait(timeout)
+
+
+class ChatRequest:
+    """Pedido submetido ao pool, com prazo absoluto e token de cancelamento"""
+    _ids = itertools.count(1)
+
+    def __init__(self, func, args, token, timeout, lane):
+        self.id = next(self._ids)
+        self.func = func
+        self.args = args
+        self.token = token or CancellationToken()
+        self.lane = lane
+        self.submitted_at = time.monotonic()
+        self.deadline = self.submitted_at + timeout if timeout else None
+        self.started_at = None
+
+    @property
+    def cancelled(self):
+        return self.token.cancelled
+
+    @property
+    def queue_wait(self):
+        """Segundos passados na fila até começar"""
+        if self.started_at is None:
+            return None
+        return self.started_at - self.submitted_at
+
+    def remaining(self):
+        """Segundos até ao prazo (None sem prazo)"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def check(self):
+        """Levantar exceção se o pedido foi cancelado ou expirou"""
+        if self.token.cancelled:
+            raise RequestCancelled()
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise RequestTimeout()
+
+    def fork(self):
+        """Sub-pedido com o mesmo prazo e cancelamento próprio (cancelar este cancela-o também)"""
+        child = ChatRequest(None, (), CancellationToken(self.token), None, None)
+        child.deadline = self.deadline
+        child.started_at = child.submitted_at
+        return child
+
+
+class Hedge:
+    """Chamada secundária `call(sub_pedido)` numa thread própria, em paralelo com a principal
+
+    O resultado (ou a exceção) fica em `result`/`error` quando `done`;
+    `cancel()` abandona-a (a chamada deve verificar `check()` do sub-pedido).
+    """
+
+    def __init__(self, request, call, name="chat-hedge"):
+        self.request = request.fork()
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+        threading.Thread(target=self._run, args=(call,), name=name, daemon=True).start()
+
+    def _run(self, call):
+        try:
+            self.result = call(self.request)
+        except Exception as e:
+            self.error = e
+        finally:
+            self._done.set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Esperar pelo fim até `timeout` segundos; True se terminou"""
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        self.request.token.cancel()
+
+
+class ChatWorkerPool:
+    """Número fixo de threads a consumir uma fila limitada
+
+    Pedidos na mesma `lane` (ex: uma conversa) correm em série e pela ordem
+    de submissão; lanes diferentes correm em paralelo até `max_workers`.
+    Uma chamada pendurada ocupa no máximo um worker até ao seu prazo.
+    """
+
+    def __init__(self, max_workers=2, max_queue=16, name="chat-worker"):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.name = name
+        self._queue = queue.Queue()  # limite aplicado em submit (workers nunca bloqueiam a reencaminhar)
+        self._outstanding = 0
+        self._lanes = {}  # lane -> deque de pedidos à espera (o primeiro está a correr)
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _ensure_workers(self):
+        """Criar threads na primeira submissão (com lock)"""
+        while len(self._threads) < self.max_workers:
+            thread = threading.Thread(
+                target=self._worker, name=f"{self.name}-{len(self._threads)}", daemon=True
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    def submit(self, func, *args, token=None, timeout=None, lane=None):
+        """Submeter `func(request, *args)`; devolve o ChatRequest
+
+        Raises:
+            queue.Full: fila cheia
+        """
+        request = ChatRequest(func, args, token, timeout, lane)
+        with self._lock:
+            if self._outstanding >= self.max_queue:
+                raise queue.Full()
+            self._outstanding += 1
+            self._ensure_workers()
+
+            if lane is None:
+                self._queue.put(request)
+            else:
+                pending = self._lanes.setdefault(lane, deque())
+                pending.append(request)
+                if len(pending) == 1:
+                    self._queue.put(request)
+        return request
+
+    def pending(self, lane):
+        """Pedidos da lane ainda por terminar"""
+        with self._lock:
+            return len(self._lanes.get(lane, ()))
+
+    def _release(self, request):
+        """Libertar lugar na fila e passar a vez ao próximo pedido da mesma lane"""
+        with self._lock:
+            self._outstanding -= 1
+            pending = self._lanes.get(request.lane) if request.lane is not None else None
+            if not pending:
+                return
+            pending.popleft()
+            if pending:
+                self._queue.put(pending[0])
+            else:
+                del self._lanes[request.lane]
+
+    def _worker(self):
+        while True:
+            request = self._queue.get()
+            try:
+                request.started_at = time.monotonic()
+                request.func(request, *request.args)
+            except Exception as e:
+                logger.error(f"Erro não tratado no pedido {request.id}: {e}")
+            finally:
+                self._release(request)
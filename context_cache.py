@@ -0,0 +1,165 @@
+"""
+Cache de contexto: o prefixo estável dos pedidos (system instruction e
+turnos antigos da conversa) é registado uma vez no backend e referido
+pelo nome nos turnos seguintes, em vez de ser reenviado por inteiro
+"""
+import logging
+import threading
+import time
+from collections import Counter
+
+from conversation_memory import estimate_tokens
+from llm_backend import contents_text
+
+logger = logging.getLogger('GeminiCat')
+
+
+def _is_prefix(turns, contents):
+    return len(turns) <= len(contents) and contents[:len(turns)] == turns
+
+
+class _Entry:
+    """Cache registada para um modelo: turnos que contém e validade"""
+
+    __slots__ = ('context', 'turns', 'refreshing')
+
+    def __init__(self, context, turns):
+        self.context = context  # CachedContext do backend
+        self.turns = turns
+        self.refreshing = False
+
+
+class ContextCache:
+    """Prefixo em cache por modelo, criado e renovado em background
+
+    `prepare` nunca espera pelo backend: se ainda não há cache válida o
+    pedido segue com tudo inline e a cache fica pronta para o turno
+    seguinte. O prefixo é tudo menos o turno novo; volta a ser registado
+    quando deixa de ser prefixo (ex: turnos antigos resumidos) ou quando
+    a parte fora da cache passa `grow_tokens`.
+
+    Args:
+        backend: LLMBackend com `supports_caching`
+        system_instruction: incluída em todas as caches
+        ttl: validade pedida ao backend (segundos)
+        min_tokens: dict modelo -> mínimo de tokens aceite pelo backend (`default` para os restantes)
+        refresh_margin: renovar o TTL quando faltar menos do que isto
+        expiry_margin: deixar de usar a cache quando faltar menos do que isto
+    """
+
+    def __init__(self, backend, system_instruction, ttl=600, min_tokens=None, grow_tokens=2048,
+                 refresh_margin=120, expiry_margin=15, retry_after=600):
+        self.backend = backend
+        self.system_instruction = system_instruction
+        self.ttl = ttl
+        self.min_tokens = min_tokens or {'default': 4096}
+        self.grow_tokens = grow_tokens
+        self.refresh_margin = refresh_margin
+        self.expiry_margin = expiry_margin
+        self.retry_after = retry_after
+
+        self.stats = Counter()  # hits, inline, created, refreshed, errors
+        self._system_tokens = estimate_tokens(system_instruction or "")
+        self._entries = {}  # modelo -> _Entry
+        self._creating = set()
+        self._disabled_until = {}  # modelo -> time.time() a partir do qual se volta a tentar
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return getattr(self.backend, 'supports_caching', False)
+
+    def prepare(self, model, contents):
+        """(nome da cache ou None, contents a enviar) para um pedido sem pesquisa"""
+        if not self.enabled or isinstance(contents, str):
+            return None, contents
+
+        now = time.time()
+        start = stale = refresh = None
+        with self._lock:
+            entry = self._entries.get(model)
+            if entry is not None and (
+                entry.context.expires_at - self.expiry_margin <= now or not _is_prefix(entry.turns, contents)
+            ):
+                stale = self._entries.pop(model)
+                entry = None
+
+            # Prefixo candidato: tudo menos o turno novo
+            frozen = contents[:-1]
+            cached_tokens = entry.context.tokens if entry is not None else 0
+            frozen_tokens = self._system_tokens + estimate_tokens(contents_text(frozen)) if frozen else 0
+            minimum = self.min_tokens.get(model, self.min_tokens['default'])
+            can_create = (model not in self._creating and self._disabled_until.get(model, 0) <= now
+                          and frozen_tokens >= minimum)
+            growth = frozen_tokens - cached_tokens
+            if can_create and (entry is None or growth >= self.grow_tokens):
+                self._creating.add(model)
+                start = frozen
+            elif (entry is not None and not entry.refreshing
+                  and entry.context.expires_at - now < self.refresh_margin):
+                entry.refreshing = True
+                refresh = entry
+
+            self.stats['hits' if entry is not None else 'inline'] += 1
+
+        if stale is not None:
+            self._background(self._delete, stale)
+        if start is not None:
+            self._background(self._create, model, start)
+        if refresh is not None:
+            self._background(self._refresh, model, refresh)
+
+        if entry is None:
+            return None, contents
+        return entry.context.name, contents[len(entry.turns):]
+
+    def invalidate(self, model, name):
+        """Cache recusada pelo backend (expirada ou apagada): deixar de a usar"""
+        with self._lock:
+            entry = self._entries.get(model)
+            if entry is None or entry.context.name != name:
+                return
+            del self._entries[model]
+            self.stats['errors'] += 1
+        logger.info(f"Cache de contexto {name} recusada - pedidos seguem inline")
+
+    def _background(self, target, *args):
+        threading.Thread(target=target, args=args, name="context-cache", daemon=True).start()
+
+    def _create(self, model, turns):
+        try:
+            context = self.backend.create_cache(model, turns, self.system_instruction, self.ttl)
+        except Exception as e:
+            logger.info(f"Cache de contexto indisponível para {model}: {e} - pedidos seguem inline")
+            with self._lock:
+                self._creating.discard(model)
+                self._disabled_until[model] = time.time() + self.retry_after
+                self.stats['errors'] += 1
+            return
+
+        with self._lock:
+            self._creating.discard(model)
+            previous = self._entries.get(model)
+            self._entries[model] = _Entry(context, turns)
+            self.stats['created'] += 1
+        logger.debug(f"Cache de contexto {context.name}: {len(turns)} turnos, {context.tokens} tokens")
+        if previous is not None:
+            self._delete(previous)
+
+    def _refresh(self, model, entry):
+        try:
+            expires_at = self.backend.refresh_cache(entry.context.name, self.ttl)
+        except Exception as e:
+            logger.debug(f"Erro ao renovar cache de contexto {entry.context.name}: {e}")
+            self.invalidate(model, entry.context.name)
+            return
+        with self._lock:
+            entry.context = entry.context._replace(expires_at=expires_at)
+            entry.refreshing = False
+            self.stats['refreshed'] += 1
+
+    def _delete(self, entry):
+        try:
+            self.backend.delete_cache(entry.context.name)
+        except Exception as e:
+            logger.debug(f"Erro ao apagar cache de contexto {entry.context.name}: {e}")
@@ -0,0 +1,195 @@
+"""
+Memória de conversação com orçamento de tokens e resumo das mensagens antigas
+"""
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger('GeminiCat')
+
+SUMMARY_PREFIX = "[Resumo da conversa anterior]\n"
+SUMMARY_ACK = "Entendido, tenho em conta o resumo."
+
+
+def estimate_tokens(text):
+    """Estimativa local de tokens (~4 caracteres por token, mínimo 1 por palavra)"""
+    return max((len(text) + 3) // 4, len(text.split()))
+
+
+def make_turn(role, text):
+    """Turno no formato de contents da API Gemini"""
+    return {"role": role, "parts": [{"text": text}]}
+
+
+class ConversationMemory:
+    """Histórico com orçamento de tokens
+
+    Os turnos recentes são mantidos na íntegra; quando o orçamento é
+    excedido, os mais antigos saem do histórico e são dobrados num resumo
+    gerado em background pelo `summarizer`. Até o resumo chegar, usa-se um
+    resumo extrativo (início de cada turno) para não perder contexto.
+    """
+
+    def __init__(self, token_budget=6000, recent_turns=6, summary_budget=600, summarizer=None, fold_target=1.0):
+        self.token_budget = token_budget
+        # Ao exceder o orçamento, dobrar até esta fração: o início do histórico fica
+        # estável durante vários turnos (prefixo reutilizável pela cache de contexto)
+        self.fold_target = fold_target
+        self.recent_turns = recent_turns
+        self.summary_budget = summary_budget
+        self.summarizer = summarizer
+
+        self.summary = ""
+        self._turns = deque()  # (turn, tokens)
+        self._turn_tokens = 0
+        self._unsummarized = []  # (role, text) já fora do histórico mas ainda sem resumo
+        self._summarizing = False
+        self._lock = threading.Lock()
+        self.version = 0  # incrementa a cada alteração (para caches de pré-processamento)
+
+    def __len__(self):
+        return len(self._turns)
+
+    @property
+    def total_tokens(self):
+        """Tokens estimados do que é enviado (resumo + turnos recentes)"""
+        summary = self.summary_text()
+        return self._turn_tokens + (estimate_tokens(summary) if summary else 0)
+
+    def append(self, role, text):
+        """Adicionar turno e dobrar os antigos se o orçamento for excedido"""
+        self._extend([(role, text)])
+
+    def append_exchange(self, question, answer):
+        """Adicionar pergunta e resposta de uma vez
+
+        Só depois de haver resposta: um pedido que falhou ou foi cancelado
+        não deixa a pergunta sozinha no histórico (turnos "user" seguidos).
+        """
+        self._extend([("user", question), ("model", answer)])
+
+    def _extend(self, turns):
+        turns = [(make_turn(role, text), estimate_tokens(text)) for role, text in turns]
+        with self._lock:
+            for turn, tokens in turns:
+                self._turns.append((turn, tokens))
+                self._turn_tokens += tokens
+            self.version += 1
+            start_summary = self._fold_old_turns()
+
+        if start_summary:
+            threading.Thread(target=self._summarize, daemon=True).start()
+
+    def contents_with(self, question):
+        """Contents a enviar para uma pergunta ainda fora do histórico"""
+        return self.contents() + [make_turn("user", question)]
+
+    def restore(self, turns):
+        """Carregar turnos (role, texto) de uma sessão anterior
+
+        Turnos acima do orçamento ficam como notas extrativas, sem pedir
+        resumo à API ao arrancar.
+        """
+        with self._lock:
+            for role, text in turns:
+                tokens = estimate_tokens(text)
+                self._turns.append((make_turn(role, text), tokens))
+                self._turn_tokens += tokens
+            self.version += 1
+            if self._fold_old_turns():
+                self._summarizing = False
+
+    def _fold_old_turns(self):
+        """Retirar turnos antigos acima do orçamento (com lock); True se deve resumir"""
+        folded = False
+        target = self.token_budget * self.fold_target if self._turn_tokens > self.token_budget else self.token_budget
+        while self._turn_tokens > target and len(self._turns) > self.recent_turns:
+            turn, tokens = self._turns.popleft()
+            self._turn_tokens -= tokens
+            self._unsummarized.append((turn["role"], turn["parts"][0]["text"]))
+            folded = True
+
+        # Histórico enviado deve começar com o utilizador
+        while len(self._turns) > 1 and self._turns[0][0]["role"] != "user":
+            turn, tokens = self._turns.popleft()
+            self._turn_tokens -= tokens
+            self._unsummarized.append((turn["role"], turn["parts"][0]["text"]))
+            folded = True
+
+        if folded and self.summarizer and not self._summarizing:
+            self._summarizing = True
+            return True
+        return False
+
+    def _summarize(self):
+        """Gerar resumo em background (pode encadear se entretanto houver mais turnos)"""
+        while True:
+            with self._lock:
+                batch = list(self._unsummarized)
+                previous = self.summary
+            if not batch:
+                break
+
+            try:
+                summary = self.summarizer(previous, batch)
+            except Exception as e:
+                logger.warning(f"Erro ao resumir conversa: {e} - mantendo resumo extrativo")
+                summary = None
+
+            with self._lock:
+                if not summary:
+                    self._summarizing = False
+                    return
+                self.summary = summary.strip()
+                del self._unsummarized[:len(batch)]
+                self.version += 1
+                if not self._unsummarized:
+                    break
+
+        with self._lock:
+            self._summarizing = False
+
+    def summary_text(self):
+        """Resumo atual mais notas extrativas dos turnos ainda por resumir"""
+        if not self._unsummarized:
+            return self.summary
+
+        lines = []
+        budget = self.summary_budget - estimate_tokens(self.summary)
+        for role, text in reversed(self._unsummarized):
+            speaker = "Utilizador" if role == "user" else "GeminiCat"
+            line = f"{speaker}: {text[:160]}"
+            budget -= estimate_tokens(line)
+            if budget < 0:
+                break
+            lines.append(line)
+
+        notes = "\n".join(reversed(lines))
+        return f"{self.summary}\n{notes}".strip()
+
+    def last_text(self, role):
+        """Texto do último turno recente com o papel indicado (ou "")"""
+        with self._lock:
+            for turn, _ in reversed(self._turns):
+                if turn["role"] == role:
+                    return turn["parts"][0]["text"]
+        return ""
+
+    def contents(self):
+        """Contents a enviar: resumo (se houver) seguido dos turnos recentes"""
+        with self._lock:
+            contents = [turn for turn, _ in self._turns]
+            summary = self.summary_text()
+
+        if summary:
+            return [make_turn("user", SUMMARY_PREFIX + summary), make_turn("model", SUMMARY_ACK)] + contents
+        return contents
+
+    def clear(self):
+        """Esquecer toda a conversa"""
+        with self._lock:
+            self._turns.clear()
+            self._turn_tokens = 0
+            self._unsummarized.clear()
+            self.summary = ""
+            self.version += 1
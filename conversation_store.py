@@ -0,0 +1,200 @@
+"""
+Histórico persistente das conversas (SQLite em modo WAL) com pesquisa FTS5
+
+As escritas vão para uma fila e são gravadas em lotes por uma thread
+própria (write-behind), por isso `append` nunca faz I/O na thread de
+quem chama. Leituras (histórico recente, pesquisa) são feitas nas
+threads de trabalho do chat.
+"""
+import logging
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger('GeminiCat')
+
+# Mensagem guardada (role "user" ou "model", como na memória de conversação, ou NOTICE)
+StoredMessage = namedtuple('StoredMessage', 'id session ts role text')
+# Resultado de pesquisa: mensagem e excerto com os termos entre [ ]
+SearchHit = namedtuple('SearchHit', 'message snippet')
+
+# Role das mensagens de erro/timeout mostradas no lugar da resposta: ficam no histórico
+# visível mas não contam como respostas (memória restaurada, respostas offline)
+NOTICE = "aviso"
+
+_WORDS = re.compile(r'\w+')
+_STOP = object()
+
+
+def fts_query(text):
+    """Consulta FTS5 segura a partir de texto livre (todas as palavras, por prefixo)"""
+    return " ".join(f'"{word}"*' for word in _WORDS.findall(text.lower()))
+
+
+class ConversationStore:
+    """Mensagens de todas as sessões numa tabela só de inserções, com índice FTS5
+
+    Args:
+        path: ficheiro SQLite
+        batch_size: máximo de mensagens gravadas por transação
+        flush_interval: segundos a acumular mensagens antes de gravar um lote
+    """
+
+    def __init__(self, path='conversations.sqlite3', batch_size=64, flush_interval=0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.session = int(time.time() * 1000)  # Sessão = execução do GeminiCat
+
+        self._queue = queue.Queue()
+        self._ready = threading.Event()  # Esquema criado (ou falhou)
+        self._reader = None
+        self._read_lock = threading.Lock()
+        self.available = True
+        self._writer = threading.Thread(target=self._write_loop, name="conversation-store", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _create_schema(self, db):
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session INTEGER NOT NULL,
+                ts REAL NOT NULL,
+                role TEXT NOT NULL,
+                text TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_session ON messages(session, id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                text, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text);
+            END;
+        """)
+        db.commit()
+
+    def append(self, role, text):
+        """Guardar mensagem da sessão atual (não bloqueia: gravada em background)"""
+        if self.available:
+            self._queue.put((self.session, time.time(), role, text))
+
+    def _write_loop(self):
+        try:
+            db = self._connect()
+            self._create_schema(db)
+        except sqlite3.Error as e:
+            logger.warning(f"Histórico de conversas indisponível: {e}")
+            self.available = False
+            self._ready.set()
+            return
+        self._ready.set()
+
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            # Juntar o que chegar entretanto num só commit
+            deadline = time.monotonic() + self.flush_interval
+            while item is not _STOP and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            rows = [row for row in batch if row is not _STOP]
+            if rows:
+                try:
+                    with db:
+                        db.executemany("INSERT INTO messages(session, ts, role, text) VALUES (?, ?, ?, ?)", rows)
+                except sqlite3.Error as e:
+                    logger.warning(f"Erro ao gravar histórico: {e}")
+            for _ in batch:
+                self._queue.task_done()
+            if item is _STOP:
+                db.close()
+                return
+
+    def flush(self):
+        """Esperar que as mensagens em fila estejam gravadas"""
+        if self._writer.is_alive():
+            self._queue.join()
+
+    def close(self):
+        """Gravar o que falta e terminar a thread de escrita"""
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        with self._read_lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+    def _read(self, sql, params):
+        """Consulta na ligação de leitura (WAL: não bloqueia com a escrita)"""
+        self._ready.wait()
+        if not self.available:
+            return []
+        with self._read_lock:
+            if self._reader is None:
+                self._reader = self._connect()
+            return self._reader.execute(sql, params).fetchall()
+
+    def recent(self, limit=50, before_id=None, previous_sessions=True):
+        """Últimas mensagens (ordem cronológica) antes de `before_id`
+
+        Com `previous_sessions`, só sessões anteriores (a atual já está no ecrã).
+        """
+        conditions, params = [], []
+        if before_id is not None:
+            conditions.append("id < ?")
+            params.append(before_id)
+        if previous_sessions:
+            conditions.append("session != ?")
+            params.append(self.session)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._read(
+            f"SELECT id, session, ts, role, text FROM messages {where} ORDER BY id DESC LIMIT ?",
+            params + [limit]
+        )
+        return [StoredMessage(*row) for row in reversed(rows)]
+
+    def answered(self, limit=5000):
+        """Pares (pergunta, resposta) mais recentes de todas as sessões, do mais antigo para o mais recente"""
+        rows = self._read("SELECT session, role, text FROM messages ORDER BY id DESC LIMIT ?", (limit * 2,))
+        pairs = []
+        previous = None
+        for session, role, text in reversed(rows):
+            if role == "model" and previous is not None and previous[:2] == (session, "user"):
+                pairs.append((previous[2], text))
+            previous = (session, role, text)
+        return pairs
+
+    def search(self, text, limit=50):
+        """Mensagens que contêm todas as palavras (por prefixo), mais recentes primeiro"""
+        query = fts_query(text)
+        if not query:
+            return []
+        try:
+            rows = self._read(
+                "SELECT m.id, m.session, m.ts, m.role, m.text, "
+                "snippet(messages_fts, 0, '[', ']', '…', 12) "
+                "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+                "WHERE messages_fts MATCH ? ORDER BY m.id DESC LIMIT ?",
+                (query, limit)
+            )
+        except sqlite3.Error as e:
+            logger.debug(f"Erro na pesquisa do histórico: {e}")
+            return []
+        return [SearchHit(StoredMessage(*row[:5]), row[5]) for row in rows]
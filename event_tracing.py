@@ -0,0 +1,130 @@
+"""
+Instrumentação opcional do EventBus/TimerManager com exportação Chrome trace
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger('GeminiCat')
+
+
+class LatencyHistogram:
+    """Histograma de durações em buckets log2 de microssegundos"""
+    BUCKETS = 24  # até ~8s
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * buckets
+        self.total_ns = 0
+        self.max_ns = 0
+        self.samples = 0
+
+    def add(self, duration_ns):
+        micros = duration_ns // 1000
+        bucket = min(micros.bit_length(), self.buckets - 1)
+        self.counts[bucket] += 1
+        self.total_ns += duration_ns
+        self.samples += 1
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    def percentile(self, fraction):
+        """Limite superior (µs) do bucket que contém o percentil"""
+        if not self.samples:
+            return 0
+        target = fraction * self.samples
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return (1 << bucket) - 1 if bucket else 0
+        return (1 << (self.buckets - 1)) - 1
+
+    def as_dict(self):
+        return {
+            'samples': self.samples,
+            'mean_us': round(self.total_ns / self.samples / 1000, 1) if self.samples else 0,
+            'p50_us': self.percentile(0.5),
+            'p95_us': self.percentile(0.95),
+            'max_us': round(self.max_ns / 1000, 1)
+        }
+
+
+class EventTracer:
+    """Contagens por tópico, histogramas por listener e ring buffer de spans"""
+
+    def __init__(self, capacity=8192):
+        self.capacity = capacity
+        self.publish_counts = {}
+        self.histograms = {}
+        self._spans = [None] * capacity
+        self._next = 0
+        self._lock = threading.Lock()
+        self._origin_ns = time.perf_counter_ns()
+        self._pid = os.getpid()
+
+    def count_publish(self, event):
+        self.publish_counts[event] = self.publish_counts.get(event, 0) + 1
+
+    def record(self, category, name, start_ns, duration_ns, args=None):
+        """Guardar span no ring buffer (e no histograma do seu nome)"""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.add(duration_ns)
+
+        span = (category, name, start_ns, duration_ns, threading.get_ident(), args)
+        with self._lock:
+            self._spans[self._next % self.capacity] = span
+            self._next += 1
+
+    def recent_spans(self):
+        """Spans do ring buffer por ordem cronológica"""
+        with self._lock:
+            if self._next <= self.capacity:
+                return self._spans[:self._next]
+            split = self._next % self.capacity
+            return self._spans[split:] + self._spans[:split]
+
+    def to_chrome_trace(self):
+        """Converter ring buffer para o formato JSON de chrome://tracing / Perfetto"""
+        events = []
+        threads = set()
+        for category, name, start_ns, duration_ns, tid, args in self.recent_spans():
+            threads.add(tid)
+            event = {
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': (start_ns - self._origin_ns) / 1000,
+                'dur': duration_ns / 1000,
+                'pid': self._pid,
+                'tid': tid
+            }
+            if args:
+                event['args'] = args
+            events.append(event)
+
+        main_tid = threading.main_thread().ident
+        for tid in threads:
+            events.append({
+                'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': tid,
+                'args': {'name': 'Tk' if tid == main_tid else f'thread-{tid}'}
+            })
+
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': {
+                'publish_counts': dict(self.publish_counts),
+                'histograms': {name: h.as_dict() for name, h in self.histograms.items()}
+            }
+        }
+
+    def export_chrome_trace(self, path):
+        """Escrever trace para ficheiro JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_chrome_trace(), f)
+        logger.info(f"Trace exportado para {path} ({min(self._next, self.capacity)} spans)")
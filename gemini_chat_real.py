@@ -1,33 +1,146 @@
 """
 Chat real com Google Gemini API para o gatinho
 """
+import atexit
 import tkinter as tk
 from tkinter import scrolledtext, messagebox
 import threading
+import queue
 import os
 import time
-import re
-import webbrowser
-
-# Tentar importar Gemini (nova biblioteca)
-try:
-    from google import genai
-    from google.genai import types
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
-
-class GeminiCatChat:
-    def __init__(self, parent_window):
-        self.parent = parent_window
-        self.chat_window = None
-        self.client = None
-        self.chat_session = None
-        self.chat_history = []  # Histórico de conversação
-        self.api_key = self.get_api_key()
-
-        # Personalidade do GeminiCat
-        self.assistant_personality = """És o GeminiCat, um gato assistente virtual inteligente que vive no desktop do utilizador.
+import logging
+from collections import namedtuple
+
+from chat_telemetry import close_telemetry, get_telemetry
+from chat_transcript import ChatTranscript
+from chat_workers import ChatWorkerPool, CancellationToken, Hedge, RequestCancelled, RequestTimeout
+from conversation_memory import ConversationMemory, make_turn
+from context_cache import ContextCache
+from conversation_store import ConversationStore, NOTICE
+from markdown_render import MarkdownStream, render_markdown
+from message_tokens import tokenize_message
+from llm_backend import get_backend
+from search_matcher import KeywordMatcher
+from model_router import ModelRouter, ModelChoice, NORMAL
+from offline_responder import OfflineResponder
+from rate_limiter import RateLimitScheduler, TokenBucket, GROUNDED, PLAIN, error_status
+from response_cache import ResponseCache, normalize_prompt
+
+logger = logging.getLogger('GeminiCat')
+
+class GeminiChatConfig:
+    """Configurações centralizadas do chat Gemini"""
+    MODEL = 'gemini-2.5-flash'
+
+    # Routing de modelos: tier rápido para trocas triviais, forte para perguntas pesadas
+    MODEL_ROUTING_ENABLED = os.getenv('GEMINICAT_MODEL_ROUTING', '1') != '0'
+    MODEL_TIERS = {
+        'rapido': os.getenv('GEMINICAT_MODEL_FAST', 'gemini-2.5-flash-lite'),
+        'normal': MODEL,
+        'forte': os.getenv('GEMINICAT_MODEL_STRONG', 'gemini-2.5-pro')
+    }
+    MODEL_FAST_MAX_CHARS = 40
+    MODEL_STRONG_MIN_CHARS = 600
+    MODEL_STRONG_MIN_PARAGRAPHS = 3
+    MODEL_STRONG_MIN_DEPTH = 16  # turnos na memória
+    MODEL_LATENCY_BUDGETS = {'normal': 8.0, 'forte': 15.0}  # segundos até ao primeiro byte (média recente)
+
+    # Cache de contexto: system instruction + turnos antigos registados no backend (pedidos sem pesquisa)
+    CONTEXT_CACHE_ENABLED = os.getenv('GEMINICAT_CONTEXT_CACHE', '1') != '0'
+    CONTEXT_CACHE_TTL = 600  # segundos
+    CONTEXT_CACHE_MIN_TOKENS = {'gemini-2.5-flash': 1024, 'gemini-2.5-flash-lite': 1024, 'default': 4096}
+    CONTEXT_CACHE_GROW_TOKENS = 2048  # input fora da cache a partir do qual se regista um prefixo maior
+
+    # Streaming: chunks agrupados e enviados para o Tk em lotes
+    STREAMING_ENABLED = os.getenv('GEMINICAT_STREAMING', '1') != '0'
+    STREAM_FLUSH_INTERVAL = 50  # ms
+
+    # Memória de conversação: turnos recentes na íntegra, antigos resumidos
+    MEMORY_TOKEN_BUDGET = int(os.getenv('GEMINICAT_MEMORY_TOKENS', '6000'))
+    MEMORY_RECENT_TURNS = 6
+    MEMORY_SUMMARY_BUDGET = 600
+    MEMORY_FOLD_TARGET = 0.6  # fração do orçamento após dobrar (menos dobras = prefixo estável)
+    SUMMARY_MODEL = 'gemini-2.5-flash-lite'
+
+    # Cache local de respostas (TTL curto com pesquisa, longo sem)
+    CACHE_ENABLED = os.getenv('GEMINICAT_CACHE', '1') != '0'
+    CACHE_PATH = 'response_cache.sqlite3'
+    CACHE_GROUNDED_TTL = 3600  # segundos
+    CACHE_PLAIN_TTL = 7 * 86400
+    CACHE_SIMILARITY_THRESHOLD = 0.9  # 0 desativa lookup por semelhança
+
+    # Pool de pedidos: fila limitada, prazo por pedido (inclui espera na fila)
+    WORKER_THREADS = 2
+    MAX_QUEUED_REQUESTS = 8
+    REQUEST_TIMEOUT = 120  # segundos
+
+    # Limites do lado do cliente (pedidos/minuto por rota) e backoff em 429/503
+    GROUNDED_RPM = int(os.getenv('GEMINICAT_GROUNDED_RPM', '5'))
+    PLAIN_RPM = int(os.getenv('GEMINICAT_PLAIN_RPM', '10'))
+    RATE_BURST = 3
+    RATE_MAX_WAIT = 10  # segundos à espera de quota antes de responder localmente
+    RETRY_ATTEMPTS = 3
+    RETRY_BASE_DELAY = 1.0
+    RETRY_MAX_DELAY = 30.0
+
+    # Hedging: scores de pesquisa ambíguos pedem com e sem pesquisa em paralelo; a resposta sem
+    # pesquisa aparece logo e a com pesquisa acrescenta-se se chegar a tempo com fontes
+    HEDGE_ENABLED = os.getenv('GEMINICAT_HEDGE', '1') != '0'
+    HEDGE_MIN_SCORE = 2
+    HEDGE_MAX_SCORE = 3
+    HEDGE_RPM = 4  # pedidos duplicados por minuto (cada um gasta quota de pesquisa)
+    HEDGE_BURST = 2
+    HEDGE_WAIT = 8.0  # segundos à espera do pedido com pesquisa depois de terminada a resposta
+
+    # Routing de pesquisa: registo de decisões/correções e classificador local opcional (NumPy)
+    ROUTING_LOG_ENABLED = os.getenv('GEMINICAT_ROUTING_LOG', '1') != '0'
+    ROUTING_LOG_PATH = 'routing_log.jsonl'
+    CLASSIFIER_ENABLED = os.getenv('GEMINICAT_CLASSIFIER', '1') != '0'
+    CLASSIFIER_PATH = 'search_classifier.npz'
+
+    # Base de conhecimento local (NumPy): excertos das notas em `knowledge/` juntos à pergunta;
+    # um excerto com todos os termos da pergunta dispensa o Google Search
+    KNOWLEDGE_ENABLED = os.getenv('GEMINICAT_KNOWLEDGE', '1') != '0'
+    KNOWLEDGE_DIR = 'knowledge'
+    KNOWLEDGE_INDEX = 'knowledge_index'
+    KNOWLEDGE_CHECK_INTERVAL = 30  # segundos entre verificações de notas alteradas
+    KNOWLEDGE_TOP_K = 3
+    # O cosseno só ordena (muda com o tamanho das notas); juntar e dispensar a pesquisa
+    # dependem de quantos radicais da pergunta aparecem no excerto
+    KNOWLEDGE_MIN_COVERAGE = 0.5  # fração mínima dos radicais da pergunta para juntar um excerto
+    KNOWLEDGE_STRONG_TERMS = 2  # excerto com todos os radicais (e pelo menos estes) responde sem pesquisa
+
+    # Respostas locais (sem API ou sem quota): FAQ editável e respostas anteriores, por BM25
+    OFFLINE_FAQ_PATH = 'faq.json'
+    OFFLINE_MIN_SCORE = 1.5
+    OFFLINE_MAX_ANSWERS = 5000  # respostas de conversas no índice
+
+    # Transcrição virtualizada: mensagens no widget e página carregada ao chegar ao topo
+    TRANSCRIPT_MAX_MESSAGES = int(os.getenv('GEMINICAT_TRANSCRIPT_MESSAGES', '200'))
+    TRANSCRIPT_PAGE_SIZE = 50
+
+    # Histórico persistente (SQLite/FTS5): carregado ao abrir, pesquisa com Ctrl+F
+    HISTORY_ENABLED = os.getenv('GEMINICAT_HISTORY', '1') != '0'
+    HISTORY_PATH = 'conversations.sqlite3'
+    HISTORY_PAGE_SIZE = 50
+    HISTORY_RESTORE_TURNS = 6  # turnos da sessão anterior devolvidos à memória
+    HISTORY_SEARCH_DELAY = 200  # ms sem teclas antes de pesquisar
+
+    # Antecipação enquanto o utilizador escreve: routing, notas, cache e ligação preparados fora do Tk
+    PRESTAGE_ENABLED = os.getenv('GEMINICAT_PRESTAGE', '1') != '0'
+    PRESTAGE_DELAY = 250  # ms sem teclas antes de antecipar
+
+    # Telemetria por pedido: registo JSONL rotativo e /metrics (Prometheus) opcional em localhost
+    TELEMETRY_ENABLED = os.getenv('GEMINICAT_TELEMETRY', '1') != '0'
+    TELEMETRY_PATH = 'chat_metrics.jsonl'
+    TELEMETRY_MAX_BYTES = 1024 * 1024
+    TELEMETRY_BACKUPS = 3
+    METRICS_PORT = int(os.getenv('GEMINICAT_METRICS_PORT', '0'))  # 0 desativa
+
+CHAT_CONFIG = GeminiChatConfig()
+
+# Personalidade do GeminiCat (system instruction)
+ASSISTANT_PERSONALITY = """És o GeminiCat, um gato assistente virtual inteligente que vive no desktop do utilizador.
         Características importantes:
         - O teu nome é GeminiCat e és um gato doméstico (mas não exageres nisso)
         - Tens personalidade felina subtil: és observador, curioso e ocasionalmente independente
@@ -42,6 +155,191 @@ class GeminiCatChat:
         - Sem emojis excessivos
         - Ocasionalmente podes mostrar traços felinos subtis (ex: "estou com sono", "isso desperta a minha curiosidade") mas sem exageros"""
 
+# Resposta local quando nem o FAQ nem as conversas anteriores têm nada parecido
+OFFLINE_FALLBACK = ("Sem ligação ao Gemini não tenho resposta guardada para isso. "
+                    "Reformula a pergunta ou tenta mais tarde.")
+
+# Comandos de correção do routing de pesquisa (sem texto: repetir a pergunta anterior)
+ROUTING_COMMANDS = {'/pesquisa': True, '/sempesquisa': False}
+
+# Pedido preparado enquanto o utilizador escrevia: só vale para exatamente o mesmo texto
+# (decision: resultado de decide_search; cached: resposta da cache para `context`, ou None)
+Prestage = namedtuple('Prestage', 'text message forced decision knowledge context cached')
+
+
+
+class StreamingReply:
+    """Encaminha chunks de streaming da thread de trabalho para o Tk em lotes
+
+    O Markdown é processado na thread de trabalho (linhas completas uma
+    vez, a linha por terminar de novo a cada chunk); o Tk só insere
+    segmentos já prontos.
+    """
+
+    def __init__(self, chat, request, placeholder):
+        self.chat = chat
+        self.request = request
+        self.placeholder = placeholder
+        self.opened = False  # Placeholder já substituído pelo prefixo da resposta (thread do Tk)
+        self.started = False
+        self.finished = False
+        self._markdown = MarkdownStream()
+        self._pending = []  # Segmentos (texto, tags, url) definitivos por inserir
+        self._provisional = []  # Segmentos da linha ainda por terminar
+        self._flush_scheduled = False
+        self._lock = threading.Lock()
+
+    def feed(self, text):
+        """Acumular chunk, processar o Markdown e agendar flush (thread de trabalho)"""
+        with self._lock:
+            committed, self._provisional = self._markdown.feed(text)
+            self._pending.extend(committed)
+            self.started = True
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        self._schedule(CHAT_CONFIG.STREAM_FLUSH_INTERVAL, self._flush)
+
+    def finish(self, suffix=""):
+        """Terminar resposta: último flush (com sufixo opcional)"""
+        with self._lock:
+            if self.finished:
+                return
+            self.finished = True
+            if suffix:
+                self._pending.extend(self._markdown.feed(suffix)[0])
+            self._pending.extend(self._markdown.finish())
+            self._provisional = []
+        self._schedule(0, self._flush, True)
+
+    def _schedule(self, delay, callback, *args):
+        if self.request.cancelled:
+            return  # Janela fechada durante o streaming
+        try:
+            self.chat.chat_window.after(delay, callback, *args)
+        except (tk.TclError, RuntimeError, AttributeError):
+            pass
+
+    def _flush(self, final=False):
+        """Inserir segmentos acumulados (thread do Tk)"""
+        with self._lock:
+            segments = self._pending
+            self._pending = []
+            provisional = self._provisional
+            self._flush_scheduled = False
+        self.chat.append_stream_segments(self, segments, provisional, final)
+
+
+class ChatTurn:
+    """Estado de um pedido do chat partilhado pelas fases de get_response
+
+    Routing (plan_turn), quota e cache (answer_turn), chamada ao modelo
+    (attempt) e gravação/apresentação (finish_turn) leem e preenchem este
+    objeto em vez de closures.
+    """
+
+    __slots__ = ('request', 'placeholder', 'metrics', 'message', 'forced', 'prestaged', 'needs_search', 'score',
+                 'knowledge', 'local_strong', 'context', 'stream', 'hedging', 'hedge', 'grounded_reply')
+
+    def __init__(self, request, placeholder, metrics, message, forced, prestaged=None):
+        self.request = request
+        self.placeholder = placeholder
+        self.metrics = metrics
+        self.message = message
+        self.forced = forced  # /pesquisa ou /sempesquisa (None sem correção)
+        self.prestaged = prestaged
+        self.needs_search = False
+        self.score = 0
+        self.knowledge = []  # [Match] das notas locais
+        self.local_strong = False  # notas próximas o suficiente para dispensar a pesquisa
+        self.context = ""  # contexto da cache de respostas (antes de acrescentar a pergunta)
+        self.stream = None  # StreamingReply da tentativa em curso
+        self.hedging = False  # quota do pedido em paralelo reservada
+        self.hedge = None
+        self.grounded_reply = None  # (texto, fontes) do pedido em paralelo, se chegou a tempo
+
+    @property
+    def streamed(self):
+        """Já há texto da resposta no ecrã (não se pode repetir nem substituir)"""
+        return self.stream is not None and self.stream.started
+
+
+class GeminiCatChat:
+    def __init__(self, parent_window):
+        self.parent = parent_window
+        self.chat_window = None
+        self.client = None
+        self.chat_session = None
+        # Histórico de conversação com orçamento de tokens
+        self.memory = ConversationMemory(
+            token_budget=CHAT_CONFIG.MEMORY_TOKEN_BUDGET,
+            recent_turns=CHAT_CONFIG.MEMORY_RECENT_TURNS,
+            summary_budget=CHAT_CONFIG.MEMORY_SUMMARY_BUDGET,
+            summarizer=self.summarize_history,
+            fold_target=CHAT_CONFIG.MEMORY_FOLD_TARGET
+        )
+        # Pedidos correm num pool limitado; fechar a janela cancela os pendentes
+        self.workers = ChatWorkerPool(CHAT_CONFIG.WORKER_THREADS, CHAT_CONFIG.MAX_QUEUED_REQUESTS)
+        self.cancel_token = CancellationToken()
+        # Mensagens da sessão (o widget só mostra as últimas)
+        self.transcript = ChatTranscript(CHAT_CONFIG.TRANSCRIPT_MAX_MESSAGES, CHAT_CONFIG.TRANSCRIPT_PAGE_SIZE)
+        # Histórico persistente (escritas em background; leituras nas threads de trabalho)
+        self.store = None
+        if CHAT_CONFIG.HISTORY_ENABLED:
+            self.store = ConversationStore(CHAT_CONFIG.HISTORY_PATH)
+            atexit.register(self.store.close)
+        self._history_requested = False
+        self._history_shown = False
+        self._history_before = None  # id da mensagem guardada mais antiga já mostrada
+        self.search_window = None
+        self._search_after = None
+        self._search_seq = 0
+        self._search_hits = []
+        self._prestage_after = None
+        self._prestage_seq = 0
+        self._prestage_text = ""
+        self._prestage = None
+        # Tempos e uso por pedido (histogramas partilhados pelo processo)
+        self.telemetry = get_telemetry(
+            CHAT_CONFIG.TELEMETRY_PATH if CHAT_CONFIG.TELEMETRY_ENABLED else None,
+            CHAT_CONFIG.TELEMETRY_MAX_BYTES, CHAT_CONFIG.TELEMETRY_BACKUPS,
+            CHAT_CONFIG.METRICS_PORT or None
+        )
+        self.model_router = ModelRouter(
+            CHAT_CONFIG.MODEL_TIERS,
+            fast_max_chars=CHAT_CONFIG.MODEL_FAST_MAX_CHARS,
+            strong_min_chars=CHAT_CONFIG.MODEL_STRONG_MIN_CHARS,
+            strong_min_paragraphs=CHAT_CONFIG.MODEL_STRONG_MIN_PARAGRAPHS,
+            strong_min_depth=CHAT_CONFIG.MODEL_STRONG_MIN_DEPTH,
+            latency_budgets=CHAT_CONFIG.MODEL_LATENCY_BUDGETS
+        )
+        self.scheduler = RateLimitScheduler(
+            CHAT_CONFIG.GROUNDED_RPM, CHAT_CONFIG.PLAIN_RPM,
+            burst=CHAT_CONFIG.RATE_BURST,
+            max_wait=CHAT_CONFIG.RATE_MAX_WAIT,
+            retry_attempts=CHAT_CONFIG.RETRY_ATTEMPTS,
+            retry_base_delay=CHAT_CONFIG.RETRY_BASE_DELAY,
+            retry_max_delay=CHAT_CONFIG.RETRY_MAX_DELAY
+        )
+        self.hedge_budget = TokenBucket(CHAT_CONFIG.HEDGE_RPM, CHAT_CONFIG.HEDGE_BURST)
+        # Backend LLM (cliente Gemini partilhado pelo processo, ou falso com GEMINICAT_BACKEND=fake)
+        self.backend = get_backend()
+        self._response_cache = None
+        self._offline_responder = None
+        self.context_cache = None  # Criada em setup_gemini (depende do backend)
+        self._cache_lock = threading.Lock()
+        self._search_classifier = None
+        self._routing_log = None
+        self._routing_loaded = False
+        self._knowledge = None
+        self._knowledge_loaded = False
+        self._knowledge_checked = None  # time.monotonic() da última verificação da pasta (None: desativada)
+        self._knowledge_rebuilding = False
+        self.last_question = ""
+
+        # Personalidade do GeminiCat
+        self.assistant_personality = ASSISTANT_PERSONALITY
+
         # Keywords para detecção de search
         self.search_keywords = {
             # 1. Verbos de Pesquisa (9)
@@ -98,42 +396,34 @@ class GeminiCatChat:
 
         self.question_words = {'qual', 'onde', 'quando', 'quanto', 'como', 'quem'}
         self.narrative_indicators = {'ele', 'ela', 'eles', 'elas', 'estava', 'estavam'}
-    
-    def get_api_key(self):
-        """Obter API key do Gemini"""
-        # Tentar diferentes fontes
-        api_key = os.getenv('GEMINI_API_KEY')
-        
-        if not api_key:
-            try:
-                with open('.env', 'r') as f:
-                    for line in f:
-                        if line.startswith('GEMINI_API_KEY='):
-                            api_key = line.split('=', 1)[1].strip()
-                            break
-            except:
-                pass
-        
-        return api_key
+        self.past_tense_indicators = {'estava', 'estive', 'fui', 'era', 'foram'}
+        # Perguntas sobre estado emocional/pessoal (false positive comum)
+        self.emotional_patterns = {
+            'como estás', 'como está', 'como vai', 'como te sentes',
+            'estou feliz', 'estou triste', 'estou bem', 'estou mal',
+            'sinto-me', 'sentes-te'
+        }
+
+        # Todos os conjuntos compilados num só matcher (uma passagem por mensagem)
+        self.search_matcher = KeywordMatcher({
+            'search': self.search_keywords,
+            'narrative': self.narrative_indicators,
+            'past': self.past_tense_indicators,
+            'emotional': self.emotional_patterns
+        })
     
     def setup_gemini(self):
-        """Configurar Gemini API"""
-        if not GEMINI_AVAILABLE:
-            return False, "google-genai não instalado"
-
-        if not self.api_key:
-            return False, "API key não configurada"
-
-        try:
-            # Criar cliente Gemini (nova biblioteca)
-            self.client = genai.Client(api_key=self.api_key)
-
-            # Iniciar chat session (sem histórico inicial, será usado no get_response)
-            self.chat_session = None
-
-            return True, "Gemini configurado com sucesso"
-        except Exception as e:
-            return False, f"Erro ao configurar Gemini: {str(e)}"
+        """Configurar backend LLM (cliente partilhado, criado uma única vez)"""
+        success, message = self.backend.setup()
+        self.client = self.backend if success else None
+        if self.client is not None and CHAT_CONFIG.CONTEXT_CACHE_ENABLED and self.context_cache is None:
+            self.context_cache = ContextCache(
+                self.client, self.assistant_personality,
+                ttl=CHAT_CONFIG.CONTEXT_CACHE_TTL,
+                min_tokens=CHAT_CONFIG.CONTEXT_CACHE_MIN_TOKENS,
+                grow_tokens=CHAT_CONFIG.CONTEXT_CACHE_GROW_TOKENS
+            )
+        return success, message
 
     def should_activate_search(self, user_message):
         """
@@ -149,11 +439,15 @@ class GeminiCatChat:
         message_lower = user_message.lower()
         message_words = message_lower.split()
 
+        # Uma passagem sobre o texto com espaços normalizados: todos os padrões
+        # presentes (keywords e padrões negativos) e onde aparecem primeiro
+        ends = self.search_matcher.first_ends(' '.join(message_words))
+        found = ends.keys()
+        keywords = found & self.search_keywords
+
         # PONTOS POSITIVOS
         # +1 por cada keyword encontrada
-        for keyword in self.search_keywords:
-            if keyword in message_lower:
-                score += 1
+        score += len(keywords)
 
         # +2 se tem ponto de interrogação
         if '?' in user_message:
@@ -169,18 +463,17 @@ class GeminiCatChat:
             score += 2
 
         # +1 se keyword está nas primeiras 3 palavras
-        for keyword in self.search_keywords:
-            if keyword in ' '.join(message_words[:3]):
-                score += 1
-                break
+        first_words_end = len(' '.join(message_words[:3]))
+        if any(ends[keyword] <= first_words_end for keyword in keywords):
+            score += 1
 
         # +1 se frase é curta (<50 chars) e tem keyword
-        if len(user_message) < 50 and any(kw in message_lower for kw in self.search_keywords):
+        if len(user_message) < 50 and keywords:
             score += 1
 
         # PONTOS NEGATIVOS
         # -2 se contexto narrativo (3ª pessoa)
-        if any(indicator in message_lower for indicator in self.narrative_indicators):
+        if not found.isdisjoint(self.narrative_indicators):
             score -= 2
 
         # -1 se frase muito longa SEM interrogação
@@ -188,22 +481,148 @@ class GeminiCatChat:
             score -= 1
 
         # -1 se usa tempo passado comum
-        past_tense_indicators = ['estava', 'estive', 'fui', 'era', 'foram']
-        if any(past in message_lower for past in past_tense_indicators):
+        if not found.isdisjoint(self.past_tense_indicators):
             score -= 1
 
         # -5 se é pergunta sobre estado emocional/pessoal (false positive comum)
-        emotional_patterns = [
-            'como estás', 'como está', 'como vai', 'como te sentes',
-            'estou feliz', 'estou triste', 'estou bem', 'estou mal',
-            'sinto-me', 'sentes-te'
-        ]
-        if any(pattern in message_lower for pattern in emotional_patterns):
+        if not found.isdisjoint(self.emotional_patterns):
             score -= 5
 
         # THRESHOLD
         return (score >= 3, score)
 
+    def load_routing(self):
+        """Abrir registo de routing e classificador na primeira utilização (fora do Tk)"""
+        with self._cache_lock:
+            if self._routing_loaded:
+                return
+            self._routing_loaded = True
+            from search_classifier import RoutingLog, SearchClassifier
+            if CHAT_CONFIG.ROUTING_LOG_ENABLED:
+                self._routing_log = RoutingLog(CHAT_CONFIG.ROUTING_LOG_PATH)
+            if CHAT_CONFIG.CLASSIFIER_ENABLED:
+                self._search_classifier = SearchClassifier.load(CHAT_CONFIG.CLASSIFIER_PATH)
+
+    def load_knowledge(self):
+        """Base de conhecimento, aberta na primeira utilização; reindexar em background se a pasta mudou
+
+        A pasta é verificada no máximo a cada KNOWLEDGE_CHECK_INTERVAL segundos
+        e só corre uma reindexação de cada vez. O índice anterior continua em
+        uso até o novo estar pronto (cada versão tem a sua pasta).
+        """
+        with self._cache_lock:
+            if not self._knowledge_loaded:
+                self._knowledge_loaded = True
+                if not CHAT_CONFIG.KNOWLEDGE_ENABLED:
+                    return None
+                from knowledge_base import KnowledgeBase, np
+                if np is None:
+                    return None
+                self._knowledge = KnowledgeBase.load(CHAT_CONFIG.KNOWLEDGE_INDEX)
+                self._knowledge_checked = float('-inf')
+
+            knowledge = self._knowledge
+            now = time.monotonic()
+            if (self._knowledge_checked is None or self._knowledge_rebuilding
+                    or now - self._knowledge_checked < CHAT_CONFIG.KNOWLEDGE_CHECK_INTERVAL):
+                return knowledge
+            self._knowledge_checked = now
+
+        from knowledge_base import newest_mtime
+        built_at = knowledge.built_at if knowledge is not None else 0.0
+        if os.path.isdir(CHAT_CONFIG.KNOWLEDGE_DIR) and newest_mtime(CHAT_CONFIG.KNOWLEDGE_DIR) > built_at:
+            with self._cache_lock:
+                if self._knowledge_rebuilding:
+                    return knowledge
+                self._knowledge_rebuilding = True
+            threading.Thread(target=self.rebuild_knowledge, name="knowledge-ingest", daemon=True).start()
+        return knowledge
+
+    def rebuild_knowledge(self):
+        """Reindexar a pasta de notas (thread própria, uma de cada vez)"""
+        from knowledge_base import KnowledgeBase, build_index
+        knowledge = None
+        try:
+            count = build_index(CHAT_CONFIG.KNOWLEDGE_DIR, CHAT_CONFIG.KNOWLEDGE_INDEX)
+            knowledge = KnowledgeBase.load(CHAT_CONFIG.KNOWLEDGE_INDEX)
+            logger.info(f"Notas reindexadas: {count} excertos")
+        except Exception as e:
+            logger.warning(f"Erro ao indexar {CHAT_CONFIG.KNOWLEDGE_DIR}: {e}")
+        with self._cache_lock:
+            # Índice novo visível antes de libertar a guarda (senão a próxima verificação reindexava outra vez)
+            if knowledge is not None:
+                self._knowledge = knowledge
+            self._knowledge_rebuilding = False
+
+    def retrieve_knowledge(self, message):
+        """[Match] das notas locais com parte suficiente dos termos da pergunta, do melhor para o pior"""
+        knowledge = self.load_knowledge()
+        if knowledge is None:
+            return []
+        hits = knowledge.search(message, CHAT_CONFIG.KNOWLEDGE_TOP_K)
+        return [hit for hit in hits if hit.matched and hit.matched >= hit.terms * CHAT_CONFIG.KNOWLEDGE_MIN_COVERAGE]
+
+    @staticmethod
+    def strong_knowledge(knowledge):
+        """Excerto que contém todos os termos da pergunta (dispensa a pesquisa), ou None"""
+        for hit in knowledge:
+            if hit.matched == hit.terms >= CHAT_CONFIG.KNOWLEDGE_STRONG_TERMS:
+                return hit
+        return None
+
+    def with_knowledge(self, contents, knowledge):
+        """Juntar os excertos ao último turno (a pergunta) só neste pedido; a memória fica com a pergunta"""
+        if not knowledge:
+            return contents
+        notes = "\n\n".join(f"[{hit.chunk.source}]\n{hit.chunk.text}" for hit in knowledge)
+        question = contents[-1]["parts"][0]["text"]
+        return contents[:-1] + [make_turn(
+            "user", f"Notas locais do utilizador (usa-as se forem relevantes):\n{notes}\n\nPergunta: {question}"
+        )]
+
+    def routing_command(self, message):
+        """Separar comando de correção; devolve (mensagem, pesquisa forçada ou None)"""
+        command, _, rest = message.partition(' ')
+        forced = ROUTING_COMMANDS.get(command.lower())
+        if forced is None:
+            return message, None
+        return rest.strip() or self.last_question, forced
+
+    def decide_search(self, message, forced=None):
+        """Decisão de pesquisa sem a registar (também usada na antecipação)
+
+        Returns:
+            tuple: (bool: ativar_search, int: score heurístico, bool: heurística, float: probabilidade ou None)
+        """
+        self.load_routing()
+        needs_search, score = self.should_activate_search(message)
+        if forced is not None:
+            return forced, score, needs_search, None
+
+        heuristic = needs_search
+        probability = None
+        if self._search_classifier is not None:
+            needs_search, probability = self._search_classifier.predict(message, score)
+        return needs_search, score, heuristic, probability
+
+    def route_search(self, message, forced=None, decision=None):
+        """Decidir pesquisa: correção do utilizador, classificador treinado ou heurística
+
+        Args:
+            decision: resultado de `decide_search` já calculado (antecipação)
+
+        Returns:
+            tuple: (bool: ativar_search, int: score heurístico)
+        """
+        needs_search, score, heuristic, probability = decision or self.decide_search(message, forced)
+        log = self._routing_log
+        if log is not None:
+            if forced is not None:
+                log.correction(message, score, forced)
+            else:
+                log.decision(message, score, heuristic, probability, needs_search)
+        return needs_search, score
+
     def create_chat_window(self):
         """Criar janela de chat"""
         if self.chat_window and tk.Toplevel.winfo_exists(self.chat_window):
@@ -212,6 +631,8 @@ class GeminiCatChat:
             return
         
         self.chat_window = tk.Toplevel(self.parent)
+        self.cancel_token = CancellationToken()
+        self.chat_window.bind("<Destroy>", self.on_window_destroy)
         self.chat_window.title("GeminiCat")
         self.chat_window.geometry("450x500+400+100")
         
@@ -229,13 +650,10 @@ class GeminiCatChat:
             bg="#f0f0f0"
         )
         self.chat_area.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
-        self.chat_area.config(state=tk.DISABLED)
 
-        # Configurar tag para links clicáveis
-        self.chat_area.tag_config("hyperlink", foreground="blue", underline=True)
-        self.chat_area.tag_bind("hyperlink", "<Button-1>", self.open_link)
-        self.chat_area.tag_bind("hyperlink", "<Enter>", lambda e: self.chat_area.config(cursor="hand2"))
-        self.chat_area.tag_bind("hyperlink", "<Leave>", lambda e: self.chat_area.config(cursor=""))
+        # Mensagens anteriores da sessão e tag partilhada dos links clicáveis
+        self.transcript.attach(self.chat_area)
+        self.chat_window.bind("<Control-f>", self.open_history_search)
 
         # Frame de entrada
         input_frame = tk.Frame(main_frame)
@@ -245,6 +663,7 @@ class GeminiCatChat:
         self.input_field = tk.Entry(input_frame, font=("Arial", 11))
         self.input_field.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
         self.input_field.bind('<Return>', self.send_message)
+        self.input_field.bind('<KeyRelease>', self.schedule_prestage)
         
         # Botão enviar
         self.send_button = tk.Button(
@@ -269,6 +688,14 @@ class GeminiCatChat:
             self.add_message("GeminiCat", "Sem acesso ao Gemini, mas posso ainda assim tentar ajudar-te com respostas básicas.")
             # Manter chat ativo mesmo sem API
         
+        # Histórico guardado: carregado em background antes da primeira pergunta (mesma lane)
+        if self.store is not None and not self._history_requested:
+            self._history_requested = True
+            try:
+                self.workers.submit(self.load_history, None, True, token=self.cancel_token, lane="conversa")
+            except queue.Full:
+                self._history_requested = False
+        
         # Focar no input
         self.input_field.focus()
     
@@ -278,8 +705,6 @@ class GeminiCatChat:
         if not self.chat_window or not self.chat_window.winfo_exists():
             return
 
-        self.chat_area.config(state=tk.NORMAL)
-
         # Prefixo da mensagem
         if sender == "Você":
             prefix = "Tu: "
@@ -288,263 +713,736 @@ class GeminiCatChat:
         else:
             prefix = f"{sender}: "
 
-        # Inserir prefixo
-        self.chat_area.insert(tk.END, prefix)
-
-        # Primeiro: processar links Markdown [texto](url)
-        markdown_link_pattern = r'\[([^\]]+)\]\(([^\)]+)\)'
-
-        # Substituir links Markdown por marcadores temporários
-        temp_message = message
-        markdown_links = []
-        for match in re.finditer(markdown_link_pattern, message):
-            link_text = match.group(1)
-            link_url = match.group(2)
-            markdown_links.append((link_text, link_url))
-            # Substituir por marcador único
-            temp_message = temp_message.replace(match.group(0), f"__MDLINK_{len(markdown_links)-1}__", 1)
-
-        # Regex para detetar URLs simples (com e sem protocolo)
-        url_pattern = r'(?:https?://)?(?:www\.)?[a-zA-Z0-9-]+\.[a-zA-Z]{2,}(?:/[^\s\)\]\>]*)?'
-
-        # Processar mensagem com marcadores
-        last_end = 0
-        current_pos = 0
-
-        while current_pos < len(temp_message):
-            # Verificar se há marcador Markdown
-            md_match = re.search(r'__MDLINK_(\d+)__', temp_message[current_pos:])
-            url_match = re.search(url_pattern, temp_message[current_pos:])
-
-            # Determinar qual vem primeiro
-            next_md_pos = md_match.start() + current_pos if md_match else len(temp_message)
-            next_url_pos = url_match.start() + current_pos if url_match else len(temp_message)
-
-            if next_md_pos < next_url_pos:
-                # Processar link Markdown
-                # Inserir texto antes
-                self.chat_area.insert(tk.END, temp_message[current_pos:next_md_pos])
-
-                # Obter link
-                link_idx = int(md_match.group(1))
-                link_text, link_url = markdown_links[link_idx]
-
-                # Inserir link clicável
-                start_index = self.chat_area.index(tk.END + "-1c")
-                self.chat_area.insert(tk.END, link_url)  # Mostrar URL, não texto
-                end_index = self.chat_area.index(tk.END + "-1c")
-
-                tag_name = f"link_{start_index.replace('.', '_')}"
-                self.chat_area.tag_add(tag_name, start_index, end_index)
-                self.chat_area.tag_config(tag_name, foreground="blue", underline=True)
-                self.chat_area.tag_bind(tag_name, "<Button-1>", lambda e, u=link_url: self.open_link(u))
-                self.chat_area.tag_bind(tag_name, "<Enter>", lambda e: self.chat_area.config(cursor="hand2"))
-                self.chat_area.tag_bind(tag_name, "<Leave>", lambda e: self.chat_area.config(cursor=""))
-
-                current_pos = next_md_pos + len(md_match.group(0))
-
-            elif url_match:
-                # Processar URL simples
-                # Inserir texto antes
-                self.chat_area.insert(tk.END, temp_message[current_pos:next_url_pos])
-
-                url = url_match.group(0)
-                start_index = self.chat_area.index(tk.END + "-1c")
-                self.chat_area.insert(tk.END, url)
-                end_index = self.chat_area.index(tk.END + "-1c")
-
-                tag_name = f"link_{start_index.replace('.', '_')}"
-                self.chat_area.tag_add(tag_name, start_index, end_index)
-                self.chat_area.tag_config(tag_name, foreground="blue", underline=True)
-                self.chat_area.tag_bind(tag_name, "<Button-1>", lambda e, u=url: self.open_link(u))
-                self.chat_area.tag_bind(tag_name, "<Enter>", lambda e: self.chat_area.config(cursor="hand2"))
-                self.chat_area.tag_bind(tag_name, "<Leave>", lambda e: self.chat_area.config(cursor=""))
-
-                current_pos = next_url_pos + len(url)
-            else:
-                # Sem mais links, inserir resto
-                self.chat_area.insert(tk.END, temp_message[current_pos:])
-                break
-
-        # Adicionar quebra de linha
-        self.chat_area.insert(tk.END, "\n\n")
-
-        self.chat_area.see(tk.END)
-        self.chat_area.config(state=tk.DISABLED)
+        # Respostas do GeminiCat em Markdown; restantes mensagens só com links
+        body = render_markdown(message) if sender == "GeminiCat" else tokenize_message(message)
+        self.transcript.append([(prefix, (), None)] + body)
 
-    def open_link(self, url):
-        """Abrir URL no browser"""
-        # Adicionar https:// se não tiver protocolo
-        if not url.startswith(('http://', 'https://')):
-            url = 'https://' + url
-        webbrowser.open(url)
-    
     def send_message(self, event=None):
         """Enviar mensagem"""
         message = self.input_field.get().strip()
         if not message:
             return
         
+        # Antecipação do mesmo texto (se já terminou); a que estiver agendada ou em curso deixa de contar
+        prestaged = self._prestage if self._prestage is not None and self._prestage.text == message else None
+        self._prestage = None
+        self._prestage_text = ""
+        self._prestage_seq += 1
+        if self._prestage_after is not None:
+            self.chat_window.after_cancel(self._prestage_after)
+            self._prestage_after = None
+        
         # Limpar input
         self.input_field.delete(0, tk.END)
         
         # Adicionar mensagem do usuário
         self.add_message("Você", message)
+        if self.store is not None:
+            self.store.append("user", message)
         
-        # Desabilitar input temporariamente
-        self.input_field.config(state="disabled")
-        self.send_button.config(state="disabled")
+        # Placeholder próprio do pedido (input continua ativo para perguntas seguintes)
+        placeholder = self.add_placeholder()
         
-        # Mostrar que está digitando
-        self.add_message("GeminiCat", "A processar...")
+        # Responder no pool de workers (pedidos da conversa correm em série)
+        try:
+            self.workers.submit(
+                self.get_response, message, placeholder, prestaged,
+                token=self.cancel_token,
+                timeout=CHAT_CONFIG.REQUEST_TIMEOUT,
+                lane="conversa"
+            )
+        except queue.Full:
+            self.update_chat_response(
+                tokenize_message("Tenho demasiadas perguntas em espera. Aguarda um pouco."), placeholder
+            )
+    
+    def schedule_prestage(self, event=None):
+        """Antecipar o pedido quando o utilizador para de escrever (thread do Tk)"""
+        if not CHAT_CONFIG.PRESTAGE_ENABLED:
+            return
+        if self._prestage_after is not None:
+            self.chat_window.after_cancel(self._prestage_after)
+        self._prestage_after = self.chat_window.after(CHAT_CONFIG.PRESTAGE_DELAY, self.start_prestage)
+    
+    def start_prestage(self):
+        self._prestage_after = None
+        text = self.input_field.get().strip()
+        if not text or text == self._prestage_text:
+            return  # Campo vazio (ex: depois de enviar) ou só teclas sem alterar o texto
+        self._prestage_text = text
+        self._prestage_seq += 1
+        try:
+            self.workers.submit(self.prestage, text, self._prestage_seq, token=self.cancel_token, lane="antecipacao")
+        except queue.Full:
+            pass
+    
+    def prestage(self, request, text, seq):
+        """Preparar routing, notas, cache e ligação para `text` (thread de trabalho)
+
+        Sem efeitos visíveis nem registo de routing; o resultado só é usado se
+        o texto enviado for este. Fica para o envio apenas a chamada ao modelo.
+        """
+        if seq != self._prestage_seq:
+            return  # Entretanto o utilizador continuou a escrever
+        message, forced = self.routing_command(text)
+        if not message:
+            return
+        if self.client:
+            # Ligação parada há muito tempo (ou nunca aberta): reabrir já em background
+            self.backend.keep_warm(self.assistant_personality)
+
+        decision = self.decide_search(message, forced)
+        knowledge = self.retrieve_knowledge(message) if self.client else []
+        if seq != self._prestage_seq:
+            return
+
+        # Mesma rota que get_response: notas que cobrem a pergunta dispensam a pesquisa
+        grounded = decision[0]
+        if forced is None and self.strong_knowledge(knowledge) is not None:
+            grounded = False
+        context = self.cache_context()
+        cache = self.response_cache if self.client else None
+        cached = cache.get(message, context, grounded) if cache is not None else None
+        if seq == self._prestage_seq:
+            self._prestage = Prestage(text, message, forced, decision, knowledge, context, cached)
+    
+    def on_window_destroy(self, event):
+        """Cancelar pedidos em curso e em fila quando a janela fecha"""
+        if event.widget is self.chat_window:
+            self.cancel_token.cancel()
+            # Histórico ainda não mostrado: voltar a pedi-lo na próxima abertura
+            if not self._history_shown:
+                self._history_requested = False
+    
+    def history_segments(self, message):
+        """Segmentos de uma mensagem guardada, como foi mostrada"""
+        prefix = "Tu: " if message.role == "user" else "GeminiCat: "
+        body = tokenize_message(message.text) if message.role == "user" else render_markdown(message.text)
+        return [(prefix, (), None)] + body
+    
+    def load_history(self, request, before_id=None, initial=False):
+        """Ler a página do histórico guardado anterior a `before_id` (thread de trabalho)"""
+        page_size = CHAT_CONFIG.HISTORY_PAGE_SIZE
+        messages = self.store.recent(page_size, before_id=before_id)
+
+        # Primeira abertura: devolver à memória o fim da conversa anterior
+        if initial and messages and len(self.memory) == 0:
+            turns = []
+            for message in messages[-CHAT_CONFIG.HISTORY_RESTORE_TURNS:]:
+                if message.role == NOTICE:
+                    continue
+                text = self.routing_command(message.text)[0] if message.role == "user" else message.text
+                if text:
+                    turns.append((message.role, text))
+            self.memory.restore(turns)
+
+        segment_lists = [self.history_segments(message) for message in messages]
+        first_id = messages[0].id if messages else before_id
+        self.post_to_ui(request, self.show_history, segment_lists, first_id, len(messages) == page_size, initial)
+    
+    def show_history(self, segment_lists, first_id, has_more, initial=False):
+        """Mostrar mensagens guardadas acima das atuais (thread do Tk)"""
+        if not self.chat_window or not self.chat_window.winfo_exists():
+            return
+        self._history_shown = True
+        self._history_before = first_id
+        # Só depois da primeira página, para o scroll no topo não pedir a mesma duas vezes
+        self.transcript.load_more = self.load_more_history if has_more else None
+        self.transcript.prepend(segment_lists)
+        if initial:
+            self.chat_area.see(tk.END)
+    
+    def load_more_history(self):
+        """Topo da transcrição atingido: pedir mais mensagens guardadas (thread do Tk)"""
+        try:
+            self.workers.submit(self.load_history, self._history_before, token=self.cancel_token, lane="historico")
+        except queue.Full:
+            self.transcript.prepend([])  # Tentar de novo no próximo scroll
+    
+    def open_history_search(self, event=None):
+        """Janela de pesquisa nas conversas guardadas (Ctrl+F)"""
+        if self.store is None:
+            return "break"
+        if self.search_window and self.search_window.winfo_exists():
+            self.search_window.lift()
+            self.search_entry.focus()
+            return "break"
+        
+        self.search_window = tk.Toplevel(self.chat_window)
+        self.search_window.title("Pesquisar conversas")
+        self.search_window.geometry("450x400+860+100")
+        
+        self.search_entry = tk.Entry(self.search_window, font=("Arial", 11))
+        self.search_entry.pack(fill=tk.X, padx=10, pady=(10, 5))
+        self.search_entry.bind('<KeyRelease>', self.schedule_history_search)
+        
+        self.search_results = tk.Listbox(self.search_window, font=("Arial", 10))
+        self.search_results.pack(fill=tk.BOTH, expand=True, padx=10)
+        self.search_results.bind('<<ListboxSelect>>', self.show_search_hit)
         
-        # Responder em thread separada
-        threading.Thread(target=self.get_response, args=(message,), daemon=True).start()
+        self.search_detail = scrolledtext.ScrolledText(
+            self.search_window, wrap=tk.WORD, height=6, font=("Arial", 10), bg="#f0f0f0"
+        )
+        self.search_detail.pack(fill=tk.X, padx=10, pady=(5, 10))
+        self.search_detail.config(state=tk.DISABLED)
+        
+        self.search_entry.focus()
+        return "break"
+    
+    def schedule_history_search(self, event=None):
+        """Pesquisar quando o utilizador para de escrever (thread do Tk)"""
+        if self._search_after is not None:
+            self.search_window.after_cancel(self._search_after)
+        self._search_after = self.search_window.after(CHAT_CONFIG.HISTORY_SEARCH_DELAY, self.start_history_search)
+    
+    def start_history_search(self):
+        self._search_after = None
+        self._search_seq += 1
+        try:
+            self.workers.submit(
+                self.search_history, self.search_entry.get(), self._search_seq,
+                token=self.cancel_token, lane="pesquisa"
+            )
+        except queue.Full:
+            pass
+    
+    def search_history(self, request, text, seq):
+        """Consulta FTS ao histórico (thread de trabalho)"""
+        if seq != self._search_seq:
+            return  # Entretanto o utilizador continuou a escrever
+        hits = self.store.search(text)
+        self.post_to_ui(request, self.show_search_results, hits, seq)
     
-    def get_response(self, message):
-        """Obter resposta do Gemini ou simular"""
+    def show_search_results(self, hits, seq):
+        if seq != self._search_seq or not self.search_window or not self.search_window.winfo_exists():
+            return
+        self._search_hits = hits
+        self.search_results.delete(0, tk.END)
+        for hit in hits:
+            when = time.strftime("%d/%m/%Y %H:%M", time.localtime(hit.message.ts))
+            who = "Tu" if hit.message.role == "user" else "GeminiCat"
+            snippet = " ".join(hit.snippet.split())
+            self.search_results.insert(tk.END, f"{when}  {who}: {snippet}")
+    
+    def show_search_hit(self, event=None):
+        """Mostrar a mensagem completa do resultado selecionado"""
+        selection = self.search_results.curselection()
+        if not selection:
+            return
+        message = self._search_hits[selection[0]].message
+        self.search_detail.config(state=tk.NORMAL)
+        self.search_detail.delete("1.0", tk.END)
+        self.search_detail.insert(tk.END, message.text)
+        self.search_detail.config(state=tk.DISABLED)
+    
+    def add_placeholder(self):
+        """Inserir mensagem "A processar..." no fim; devolve o nome do placeholder"""
+        return self.transcript.add_placeholder("GeminiCat: A processar...")
+    
+    def post_to_ui(self, request, callback, *args):
+        """Agendar callback no Tk (ignorado se o pedido foi cancelado)"""
+        if request.cancelled:
+            return
         try:
-            # Verificar se precisa de search
-            needs_search, score = self.should_activate_search(message)
+            self.chat_window.after(0, callback, *args)
+        except (tk.TclError, RuntimeError, AttributeError):
+            pass  # Janela fechada entretanto
+    
+    def summarize_history(self, previous_summary, turns):
+        """Resumir turnos antigos (chamado em background pela memória)"""
+        if not self.client:
+            return None
 
-            if self.client and GEMINI_AVAILABLE:
+        transcript = "\n".join(
+            f"{'Utilizador' if role == 'user' else 'GeminiCat'}: {text}" for role, text in turns
+        )
+        prompt = (
+            "Atualiza o resumo desta conversa em português de Portugal, em no máximo 8 frases. "
+            "Mantém factos, nomes, preferências do utilizador e pedidos pendentes.\n\n"
+            f"Resumo atual:\n{previous_summary or '(vazio)'}\n\nNovas mensagens:\n{transcript}"
+        )
+        return self.client.generate(CHAT_CONFIG.SUMMARY_MODEL, prompt).text
+
+    @property
+    def response_cache(self):
+        """Cache de respostas, aberta na primeira utilização (fora da thread do Tk)"""
+        if not CHAT_CONFIG.CACHE_ENABLED:
+            return None
+        with self._cache_lock:
+            if self._response_cache is None:
                 try:
-                    # Adicionar mensagem do utilizador ao histórico
-                    self.chat_history.append({
-                        "role": "user",
-                        "parts": [{"text": message}]
-                    })
-
-                    if needs_search:
-                        # Mostrar feedback ao utilizador
-                        if self.chat_window and self.chat_window.winfo_exists():
-                            self.chat_window.after(0, self.add_message, "Sistema",
-                                                   f"🔍 Pesquisa ativada (score: {score}) - a consultar informação atualizada do Google...")
-
-                        # Configuração com Google Search
-                        grounding_tool = types.Tool(
-                            google_search=types.GoogleSearch()
-                        )
-
-                        config = types.GenerateContentConfig(
-                            tools=[grounding_tool],
-                            system_instruction=self.assistant_personality,
-                            temperature=1.0
-                        )
-
-                        # Enviar histórico completo com search ativado
-                        response = self.client.models.generate_content(
-                            model='gemini-2.5-flash',
-                            contents=self.chat_history,
-                            config=config
-                        )
-                        response_text = response.text
-                    else:
-                        # Usar modelo SEM search (normal)
-                        config = types.GenerateContentConfig(
-                            system_instruction=self.assistant_personality
-                        )
-
-                        # Enviar histórico completo
-                        response = self.client.models.generate_content(
-                            model='gemini-2.5-flash',
-                            contents=self.chat_history,
-                            config=config
-                        )
-                        response_text = response.text
-
-                    # Adicionar resposta do modelo ao histórico
-                    self.chat_history.append({
-                        "role": "model",
-                        "parts": [{"text": response_text}]
-                    })
-
-                except Exception as api_error:
-                    # Se API falhar, mostrar erro
-                    self.chat_window.after(0, self.add_message, "Sistema",
-                                           f"⚠️ Erro na API: {str(api_error)}")
-                    response_text = "Desculpa, ocorreu um erro ao processar a tua mensagem."
+                    self._response_cache = ResponseCache(
+                        CHAT_CONFIG.CACHE_PATH,
+                        grounded_ttl=CHAT_CONFIG.CACHE_GROUNDED_TTL,
+                        plain_ttl=CHAT_CONFIG.CACHE_PLAIN_TTL,
+                        similarity_threshold=CHAT_CONFIG.CACHE_SIMILARITY_THRESHOLD
+                    )
+                except Exception as e:
+                    logger.warning(f"Cache de respostas indisponível: {e}")
+                    CHAT_CONFIG.CACHE_ENABLED = False
+            return self._response_cache
+
+    @property
+    def offline_responder(self):
+        """Índice de respostas locais, criado na primeira utilização (fora da thread do Tk)"""
+        with self._cache_lock:
+            if self._offline_responder is None:
+                pairs = self.store.answered(CHAT_CONFIG.OFFLINE_MAX_ANSWERS) if self.store is not None else ()
+                self._offline_responder = OfflineResponder(
+                    CHAT_CONFIG.OFFLINE_FAQ_PATH,
+                    min_score=CHAT_CONFIG.OFFLINE_MIN_SCORE,
+                    max_answers=CHAT_CONFIG.OFFLINE_MAX_ANSWERS
+                ).load(pairs)
+            return self._offline_responder
+
+    def cache_context(self):
+        """Contexto da cache: vazio no início da conversa, senão a última resposta"""
+        return normalize_prompt(self.memory.last_text("model"))[:200]
+
+    def choose_model(self, message, score, grounded):
+        """Modelo para o pedido (tier por tamanho, score, profundidade e grounding)"""
+        if not CHAT_CONFIG.MODEL_ROUTING_ENABLED:
+            return ModelChoice(NORMAL, CHAT_CONFIG.MODEL, "fixo")
+        # Profundidade conta a pergunta atual (ainda fora do histórico)
+        choice = self.model_router.choose(message, score, len(self.memory) + 1, grounded)
+        logger.debug(f"Modelo {choice.model} ({choice.tier}: {choice.reason})")
+        return choice
+
+    def should_hedge(self, score, forced):
+        """Score perto do limiar, sem correção do utilizador e com orçamento para duplicar o pedido"""
+        if not CHAT_CONFIG.HEDGE_ENABLED or forced is not None:
+            return False
+        if not CHAT_CONFIG.HEDGE_MIN_SCORE <= score <= CHAT_CONFIG.HEDGE_MAX_SCORE:
+            return False
+        # Orçamento de hedging e quota de pesquisa (reservada já, sem esperar; devolvida se não for usada)
+        if self.hedge_budget.try_acquire() != 0:
+            return False
+        if not self.scheduler.try_acquire(GROUNDED):
+            self.hedge_budget.refund()
+            return False
+        return True
+
+    def refund_hedge(self):
+        """Devolver a quota de `should_hedge` quando o pedido em paralelo não chega a começar"""
+        self.hedge_budget.refund()
+        self.scheduler.refund(GROUNDED)
+
+    def start_hedge(self, request, message, score, knowledge=()):
+        """Pedido com pesquisa em paralelo com o principal (sem pesquisa); nada vai para o ecrã"""
+        choice = self.choose_model(message, score, True)
+        contents = self.with_knowledge(self.memory.contents_with(message), knowledge)
+
+        def call(hedge_request):
+            parts = []
+            chunks = self.client.stream(
+                choice.model, contents, self.assistant_personality,
+                grounded=True, timeout=hedge_request.remaining()
+            )
+            try:
+                for text in chunks:
+                    # Perdeu a corrida ou a janela fechou: fechar a ligação
+                    hedge_request.check()
+                    parts.append(text)
+            finally:
+                chunks.close()
+            return ''.join(parts), chunks.sources
+
+        return Hedge(request, call)
+
+    def settle_hedge(self, request, hedge):
+        """Resposta com pesquisa (texto, fontes) se chegar a tempo e trouxer fontes; senão cancelá-la
+
+        Returns:
+            tuple: (resultado ou None, desfecho para a telemetria)
+        """
+        wait = CHAT_CONFIG.HEDGE_WAIT
+        remaining = request.remaining()
+        if remaining is not None:
+            wait = min(wait, max(0.0, remaining))
+        if not hedge.wait(wait):
+            hedge.cancel()
+            return None, "cancelado"
+        if hedge.error is not None:
+            logger.debug(f"Pedido com pesquisa (hedge) falhou: {hedge.error}")
+            return None, "erro"
+        text, sources = hedge.result
+        if not sources:
+            return None, "sem fontes"
+        return hedge.result, "anotado"
+
+    def drop_hedge(self, hedge, metrics, result):
+        """Abandonar o pedido em paralelo (se ainda corre) e libertar o registo da telemetria"""
+        hedge.cancel()
+        metrics.hedge = result
+        self.telemetry.release(metrics.key)
+
+    def hedge_annotation(self, text, sources):
+        """Mensagem com a resposta com pesquisa e as fontes, mostrada depois da resposta sem pesquisa"""
+        lines = [f"- {title}: {url}" for title, url in sources]
+        return f"🔍 Com Google Search:\n\n{text}\n\nFontes:\n" + "\n".join(lines)
+
+    def stream_response(self, request, model, contents, grounded, stream, cached_content=None, metrics=None):
+        """Obter resposta em streaming, encaminhando chunks para o chat"""
+        parts = []
+        chunks = self.client.stream(
+            model, contents, self.assistant_personality,
+            grounded=grounded, timeout=request.remaining(), cached_content=cached_content
+        )
+        try:
+            for text in chunks:
+                # Cancelado ou fora de prazo: abandonar e fechar a ligação
+                request.check()
+                if metrics is not None:
+                    metrics.first_byte()
+                parts.append(text)
+                stream.feed(text)
+        finally:
+            chunks.close()
+        if metrics is not None:
+            metrics.model_finished(chunks.usage)
+        return ''.join(parts)
+
+    def get_response(self, request, message, placeholder, prestaged=None):
+        """Obter resposta do Gemini ou simular (worker do pool)
+
+        Args:
+            prestaged: Prestage do mesmo texto, preparado enquanto o utilizador escrevia
+        """
+        metrics = self.telemetry.start(placeholder, request.queue_wait)
+        try:
+            # Pedido cancelado ou expirado enquanto esperava na fila
+            request.check()
+
+            turn = self.plan_turn(request, message, placeholder, metrics, prestaged)
+            if turn is None:
+                return
+            if self.client:
+                response_text = self.answer_turn(turn)
+                if response_text is None:
+                    return  # Resposta já terminada no ecrã (parcial com aviso ou cancelada)
             else:
-                # Resposta simulada do assistente
-                time.sleep(1)  # Simular delay
-                
-                # Respostas baseadas em palavras-chave
-                message_lower = message.lower()
-                
-                if any(word in message_lower for word in ['oi', 'olá', 'hello', 'hi']):
-                    responses = [
-                        "Olá! Como posso ajudar-te?",
-                        "Bom dia! O que precisas?",
-                        "Olá! Em que posso ser útil?"
-                    ]
-                elif any(word in message_lower for word in ['como', 'está', 'vai']):
-                    responses = [
-                        "Estou a funcionar correctamente.",
-                        "Tudo bem por aqui. E contigo?",
-                        "A funcionar normalmente."
-                    ]
-                elif any(word in message_lower for word in ['ajuda', 'help', 'socorro']):
-                    responses = [
-                        "Diz-me em que precisas de ajuda.",
-                        "Explica o problema que tens.",
-                        "Como posso ajudar-te?"
-                    ]
-                elif any(word in message_lower for word in ['obrigado', 'thanks', 'graças']):
-                    responses = [
-                        "De nada!",
-                        "Não tens de quê.",
-                        "Sempre às ordens."
-                    ]
-                elif any(word in message_lower for word in ['tempo', 'hora', 'horas']):
-                    responses = [
-                        "Não tenho acesso ao relógio do sistema.",
-                        "Verifica as horas na barra de tarefas.",
-                        "Usa o relógio do sistema."
-                    ]
-                else:
-                    responses = [
-                        "Entendo. Podes ser mais específico?",
-                        "Não tenho informação sobre isso.",
-                        "Explica melhor a tua pergunta.",
-                        "Preciso de mais detalhes.",
-                        "Reformula a pergunta, por favor."
-                    ]
-                
-                import random
-                response_text = random.choice(responses)
-            
-            # Remover "digitando..." e adicionar resposta
-            self.chat_window.after(0, self.update_chat_response, response_text)
-            
+                # Resposta local (FAQ e conversas anteriores)
+                metrics.route = "offline"
+                response_text = self.offline_response(turn.message)
+            self.finish_turn(turn, response_text)
+
+        except RequestCancelled:
+            self.telemetry.finish(placeholder, "cancelado")
+        except RequestTimeout:
+            metrics.outcome = "timeout"
+            self.post_to_ui(request, self.update_chat_response,
+                            tokenize_message("Desculpa, a pergunta esperou demasiado tempo. Tenta novamente."),
+                            placeholder)
         except Exception as e:
+            metrics.outcome = "erro"
             error_msg = f"Desculpa, ocorreu um erro: {str(e)}"
-            self.chat_window.after(0, self.update_chat_response, error_msg)
+            self.post_to_ui(request, self.update_chat_response, tokenize_message(error_msg), placeholder)
+
+    def plan_turn(self, request, message, placeholder, metrics, prestaged=None):
+        """Comando de correção, decisão de pesquisa e notas locais -> ChatTurn (None se não há pergunta)"""
+        # Correções do utilizador: /pesquisa e /sempesquisa
+        message, forced = self.routing_command(message)
+        if not message:
+            self.post_to_ui(request, self.update_chat_response,
+                            tokenize_message("Usa /pesquisa ou /sempesquisa seguido da pergunta."), placeholder)
+            return None
+        self.last_question = message
+        if prestaged is not None and (prestaged.message, prestaged.forced) != (message, forced):
+            prestaged = None  # ex: /pesquisa sem texto e a pergunta anterior mudou
+        metrics.prestaged = prestaged is not None
+        turn = ChatTurn(request, placeholder, metrics, message, forced, prestaged)
+
+        # Verificar se precisa de search (classificador local ou heurística; já calculado se antecipado)
+        turn.needs_search, turn.score = self.route_search(message, forced, prestaged.decision if prestaged else None)
+        metrics.score = turn.score
+        if forced is not None:
+            metrics.decision = "utilizador"
+        else:
+            metrics.decision = "classificador" if self._search_classifier is not None else "heuristica"
+
+        # Notas locais: excertos relevantes vão com a pergunta; se cobrem a pergunta dispensam a pesquisa
+        if prestaged is not None:
+            turn.knowledge = prestaged.knowledge
+        elif self.client:
+            turn.knowledge = self.retrieve_knowledge(message)
+        if turn.knowledge:
+            metrics.knowledge = turn.knowledge[0].score
+            strong = self.strong_knowledge(turn.knowledge)
+            turn.local_strong = strong is not None
+            if turn.local_strong and turn.needs_search and forced is None:
+                logger.debug(f"Pesquisa dispensada: notas locais ({strong.chunk.source}, "
+                             f"{strong.matched}/{strong.terms} termos)")
+                turn.needs_search = False
+                metrics.decision = "notas"
+        return turn
+
+    def answer_turn(self, turn):
+        """Resposta pela API com tratamento de erros; None se já ficou terminada no ecrã"""
+        metrics = turn.metrics
+        try:
+            return self.model_answer(turn)
+        except RequestCancelled:
+            self.abandon_hedge(turn, "cancelado")
+            self.telemetry.finish(turn.placeholder, "cancelado")
+            return None
+        except RequestTimeout:
+            metrics.outcome = "timeout"
+            self.abandon_hedge(turn, "cancelado")
+            if turn.streamed:
+                turn.stream.finish("\n⏱️ Resposta interrompida (tempo esgotado).")
+                return None
+            return "Desculpa, a resposta demorou demasiado. Tenta novamente."
+        except Exception as api_error:
+            metrics.outcome = "erro"
+            if turn.streamed:
+                # Resposta parcial já visível: terminar com aviso
+                turn.stream.finish(f"\n⚠️ Erro na API: {str(api_error)}")
+                self.abandon_hedge(turn, "cancelado")
+                return None
+            # Pedido sem pesquisa falhou: a resposta com pesquisa (se chegar) passa a principal
+            answer = self.hedge_as_answer(turn)
+            if answer is not None:
+                metrics.outcome = "ok"
+                self.memory.append_exchange(turn.message, answer)
+                return answer
+            # Se API falhar, mostrar erro
+            self.post_to_ui(turn.request, self.add_message, "Sistema",
+                            f"⚠️ Erro na API: {str(api_error)}")
+            return "Desculpa, ocorreu um erro ao processar a tua mensagem."
+
+    def model_answer(self, turn):
+        """Quota, cache e modelo: resposta do pedido (guardada na memória e nas respostas locais)"""
+        request, metrics = turn.request, turn.metrics
+        # Contexto da cache: a última resposta antes desta pergunta
+        turn.context = self.cache_context()
+        # Resposta encontrada na cache durante a antecipação (mesmo contexto): sem quota nem API
+        cached_reply = None
+        if turn.prestaged is not None and turn.prestaged.context == turn.context:
+            cached_reply = turn.prestaged.cached
+
+        if cached_reply is not None:
+            route = GROUNDED if turn.needs_search else PLAIN
+            metrics.route = "cache"
+            response_text = cached_reply
+        else:
+            # Score ambíguo: resposta sem pesquisa à frente, com pesquisa em paralelo
+            turn.hedging = not turn.local_strong and self.should_hedge(turn.score, turn.forced)
+            # Quota do lado do cliente: com pesquisa -> sem pesquisa -> resposta local
+            route = self.scheduler.acquire(turn.needs_search and not turn.hedging, request)
+            if route is None:
+                metrics.route = "degradado"
+                response_text = self.degraded_response(request, turn.message, turn.context)
+            else:
+                if turn.needs_search and route == PLAIN:
+                    self.post_to_ui(request, self.add_message, "Sistema",
+                                    "⏳ Limite de pesquisas atingido - a responder sem Google Search")
+                # Cache local: hit imediato ou pedido idêntico em curso partilhado
+                cache = self.response_cache
+                if cache is not None:
+                    response_text, hit = cache.get_or_compute(
+                        turn.message, turn.context, route == GROUNDED, lambda: self.fetch_answer(turn, route)
+                    )
+                    if hit:
+                        metrics.route = "cache"
+                else:
+                    response_text, _ = self.fetch_answer(turn, route)
+            self.settle_turn_hedge(turn)
+
+        # Pergunta e resposta entram juntas no histórico (a com pesquisa, se chegou a tempo);
+        # pedidos que falham ou são cancelados não deixam a pergunta sem resposta
+        answer = turn.grounded_reply[0] if turn.grounded_reply else response_text
+        self.memory.append_exchange(turn.message, answer)
+        if route is not None:
+            # Disponível para respostas locais (sem API ou sem quota)
+            self.offline_responder.add(turn.message, answer)
+        return response_text
+
+    def fetch_answer(self, turn, route):
+        """Pedido em paralelo (se reservado) e pedido principal com repetições -> (texto, grounded)"""
+        if turn.hedging:
+            turn.hedge = self.start_hedge(turn.request, turn.message, turn.score, turn.knowledge)
+            self.telemetry.hold(turn.metrics)  # registo só depois de resolvido
+        # 429/503: backoff com jitter (não repetir se já há texto visível)
+        return self.scheduler.run(
+            route, lambda route: self.attempt(turn, route), turn.request,
+            can_retry=lambda: not turn.streamed
+        )
+
+    def attempt(self, turn, route):
+        """Uma tentativa na rota dada -> (texto, grounded da rota que respondeu)"""
+        request, metrics = turn.request, turn.metrics
+        grounded = route == GROUNDED
+        if grounded:
+            # Mostrar feedback ao utilizador
+            self.post_to_ui(request, self.add_message, "Sistema",
+                            f"🔍 Pesquisa ativada (score: {turn.score}) - a consultar informação atualizada do Google...")
+
+        # Enviar resumo + turnos recentes (timeout limitado ao prazo do pedido)
+        choice = self.choose_model(turn.message, turn.score, grounded)
+        contents = self.with_knowledge(self.memory.contents_with(turn.message), turn.knowledge)
+        metrics.route, metrics.model, metrics.tier = route, choice.model, choice.tier
+
+        # Sem pesquisa: prefixo estável referido pela cache de contexto (se já existir)
+        cached, send = None, contents
+        if not grounded and self.context_cache is not None:
+            cached, send = self.context_cache.prepare(choice.model, contents)
+        try:
+            text = self.call_model(turn, choice.model, send, grounded, cached)
+        except Exception as e:
+            # Cache expirada ou apagada no backend: repetir inline se nada foi mostrado
+            if cached is None or error_status(e)[0] not in (400, 403, 404) or turn.streamed:
+                raise
+            self.context_cache.invalidate(choice.model, cached)
+            text = self.call_model(turn, choice.model, contents, grounded, None)
+        # Tempo até ao primeiro byte: respostas longas não tornam o tier "lento"
+        if metrics.ttfb is not None:
+            self.model_router.record(choice.tier, metrics.ttfb)
+        return text, grounded
+
+    def call_model(self, turn, model, contents, grounded, cached_content):
+        """Chamada ao backend (streaming para o ecrã ou resposta inteira)"""
+        request, metrics = turn.request, turn.metrics
+        metrics.model_started()
+        if CHAT_CONFIG.STREAMING_ENABLED:
+            turn.stream = StreamingReply(self, request, turn.placeholder)
+            return self.stream_response(request, model, contents, grounded, turn.stream, cached_content, metrics)
+        response = self.client.generate(
+            model, contents, self.assistant_personality,
+            grounded=grounded, timeout=request.remaining(), cached_content=cached_content
+        )
+        metrics.model_finished(response.usage)
+        return response.text
+
+    def settle_turn_hedge(self, turn):
+        """Depois da resposta principal: esperar pelo pedido em paralelo ou devolver a quota não usada"""
+        if turn.hedge is None:
+            if turn.hedging:
+                # Cache ou quota esgotada: o pedido com pesquisa em paralelo não começou
+                self.refund_hedge()
+            return
+        # Resposta sem pesquisa completa no ecrã antes de esperar pela outra
+        if turn.streamed:
+            turn.stream.finish()
+        turn.grounded_reply, turn.metrics.hedge = self.settle_hedge(turn.request, turn.hedge)
+        self.telemetry.release(turn.placeholder)
+
+    def abandon_hedge(self, turn, result):
+        """Pedido principal falhou ou foi cancelado: devolver a quota ou abandonar o pedido em paralelo"""
+        if turn.hedge is None:
+            if turn.hedging:
+                self.refund_hedge()
+        elif turn.metrics.hedge is None:
+            self.drop_hedge(turn.hedge, turn.metrics, result)
+
+    def hedge_as_answer(self, turn):
+        """Texto do pedido em paralelo quando o principal falhou sem mostrar nada (None se não houver)"""
+        if turn.hedge is None or turn.metrics.hedge is not None:
+            self.abandon_hedge(turn, "erro")
+            return None
+        if turn.hedge.wait(turn.request.remaining()) and turn.hedge.result is not None:
+            self.drop_hedge(turn.hedge, turn.metrics, "principal")
+            return turn.hedge.result[0]
+        self.drop_hedge(turn.hedge, turn.metrics, "erro")
+        return None
+
+    def finish_turn(self, turn, response_text):
+        """Gravar a resposta, mostrá-la e acrescentar a anotação com pesquisa (se houver)"""
+        request = turn.request
+        turn.metrics.response_chars = len(response_text)
+        if self.store is not None:
+            # Erros e a resposta genérica sem API não são respostas a reutilizar
+            failed = turn.metrics.outcome != "ok" or response_text is OFFLINE_FALLBACK
+            self.store.append(NOTICE if failed else "model", response_text)
+
+        if turn.streamed:
+            turn.stream.finish()
+        else:
+            # Substituir o placeholder pela resposta (Markdown processado aqui, fora da thread do Tk)
+            self.post_to_ui(request, self.update_chat_response, render_markdown(response_text), turn.placeholder)
+
+        if turn.grounded_reply is not None:
+            annotation = self.hedge_annotation(*turn.grounded_reply)
+            if self.store is not None:
+                self.store.append("model", annotation)
+            cache = self.response_cache
+            if cache is not None:
+                cache.put(turn.message, turn.context, True, turn.grounded_reply[0])
+            self.post_to_ui(request, self.add_message, "GeminiCat", annotation)
+
+    def degraded_response(self, request, message, context):
+        """Resposta sem chamar a API (quota esgotada): cache de qualquer rota ou offline"""
+        cache = self.response_cache
+        if cache is not None:
+            cached = cache.get(message, context, True) or cache.get(message, context, False)
+            if cached:
+                self.post_to_ui(request, self.add_message, "Sistema",
+                                "⏳ Limite de pedidos atingido - a usar resposta guardada")
+                return cached
+
+        self.post_to_ui(request, self.add_message, "Sistema",
+                        "⏳ Limite de pedidos atingido - resposta local limitada")
+        return self.offline_response(message)
     
-    def update_chat_response(self, response_text):
-        """Atualizar chat com resposta (thread-safe)"""
+    def offline_response(self, message):
+        """Resposta local sem API: FAQ e respostas anteriores (BM25), sem espera artificial"""
+        return self.offline_responder.answer(message) or OFFLINE_FALLBACK
+    
+    def update_chat_response(self, segments, placeholder):
+        """Substituir o placeholder do pedido pela resposta já tokenizada (thread do Tk)"""
         # Verificar se janela ainda existe
         if not self.chat_window or not self.chat_window.winfo_exists():
+            self.telemetry.finish(placeholder, "cancelado")
             return
 
-        # Remover última mensagem (digitando...)
+        started = time.perf_counter()
         self.chat_area.config(state=tk.NORMAL)
-        content = self.chat_area.get(1.0, tk.END)
-        lines = content.split('\n\n')
-        if len(lines) > 1:
-            new_content = '\n\n'.join(lines[:-2]) + '\n\n'
-            self.chat_area.delete(1.0, tk.END)
-            self.chat_area.insert(1.0, new_content)
+        end = self.transcript.open_reply(placeholder, "GeminiCat: ")
+        self.transcript.extend(placeholder, segments)
+        self.chat_area.see(end)
+        self.transcript.close(placeholder)
         self.chat_area.config(state=tk.DISABLED)
+        self.telemetry.rendered(placeholder, time.perf_counter() - started, final=True)
+    
+    def append_stream_segments(self, stream, segments, provisional=(), final=False):
+        """Acrescentar lote de streaming à resposta do pedido (thread do Tk)"""
+        if not self.chat_window or not self.chat_window.winfo_exists():
+            self.telemetry.finish(stream.placeholder, "cancelado")
+            return
         
-        # Adicionar resposta
-        self.add_message("GeminiCat", response_text)
+        started = time.perf_counter()
+        self.chat_area.config(state=tk.NORMAL)
+        end = f"{stream.placeholder}.end"
         
-        # Reabilitar input
-        self.input_field.config(state="normal")
-        self.send_button.config(state="normal")
-        self.input_field.focus()
+        # Primeiro lote: substituir placeholder pelo prefixo da resposta
+        if not stream.opened:
+            self.transcript.open_reply(stream.placeholder, "GeminiCat: ")
+            stream.opened = True
+        
+        self.transcript.extend(stream.placeholder, segments, provisional)
+        self.chat_area.see(end)
+        if final:
+            self.transcript.close(stream.placeholder)
+        self.chat_area.config(state=tk.DISABLED)
+        self.telemetry.rendered(stream.placeholder, time.perf_counter() - started, final)
+
+# Instância única do chat (mantém histórico entre aberturas da janela)
+_chat_instance = None
 
 def open_gemini_chat(parent_window):
     """Função para abrir chat com Gemini"""
-    chat = GeminiCatChat(parent_window)
-    chat.create_chat_window()
\ No newline at end of file
+    global _chat_instance
+    if _chat_instance is None:
+        _chat_instance = GeminiCatChat(parent_window)
+    _chat_instance.create_chat_window()
+
+def shutdown_gemini():
+    """Cancelar pedidos e gravar histórico e métricas pendentes (ao sair; os._exit não corre o atexit)"""
+    if _chat_instance is not None:
+        _chat_instance.cancel_token.cancel()
+        if _chat_instance.store is not None:
+            _chat_instance.store.close()
+    close_telemetry()
+
+def warm_up_gemini():
+    """Aquecer backend em background (imports, TLS, templates)"""
+    get_backend().warm_up_async(ASSISTANT_PERSONALITY)
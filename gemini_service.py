@@ -0,0 +1,286 @@
+"""
+Serviço Gemini partilhado pelo processo: um cliente, ligações HTTP keep-alive
+e templates de pedidos pré-construídos, com aquecimento em background
+"""
+import logging
+import os
+import threading
+import time
+
+from llm_backend import CachedContext, LLMBackend, LLMResponse, LLMStream
+
+logger = logging.getLogger('GeminiCat')
+
+
+class GeminiServiceConfig:
+    """Configurações do serviço Gemini"""
+    WARMUP_MODEL = 'gemini-2.5-flash'
+    REQUEST_TIMEOUT_MS = 60000
+    KEEPALIVE_CONNECTIONS = 4
+    KEEPALIVE_EXPIRY_SECONDS = 300
+    REWARM_IDLE_SECONDS = 120  # ligação parada há mais do que isto pode ter sido fechada pelo servidor
+
+
+SERVICE_CONFIG = GeminiServiceConfig()
+
+
+class GeminiService(LLMBackend):
+    """Dono único do genai.Client (singleton, como EventBus/TimerManager)"""
+    name = "gemini"
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance._init()
+            return cls._instance
+
+    def _init(self):
+        self._lock = threading.RLock()
+        self.genai = None
+        self.types = None
+        self.client = None
+        self.api_key = None
+        self.status = None  # (bool, str) do último setup
+        self.warm = threading.Event()
+        self._warming = False
+        self._templates = {}
+        self._last_used = 0.0  # time.monotonic() do último pedido ou aquecimento
+
+    @staticmethod
+    def read_api_key():
+        """Obter API key do Gemini (variável de ambiente ou .env)"""
+        api_key = os.getenv('GEMINI_API_KEY')
+
+        if not api_key:
+            try:
+                with open('.env', 'r') as f:
+                    for line in f:
+                        if line.startswith('GEMINI_API_KEY='):
+                            api_key = line.split('=', 1)[1].strip()
+                            break
+            except OSError:
+                pass
+
+        return api_key
+
+    @property
+    def available(self):
+        """SDK importado e cliente criado"""
+        return self.client is not None
+
+    @property
+    def supports_caching(self):
+        return self.client is not None
+
+    def _import_sdk(self):
+        if self.genai is None:
+            from google import genai
+            from google.genai import types
+            self.genai, self.types = genai, types
+
+    def _http_options(self):
+        """HttpOptions com pool keep-alive (se suportado pela versão do SDK)"""
+        try:
+            import httpx
+            return self.types.HttpOptions(
+                timeout=SERVICE_CONFIG.REQUEST_TIMEOUT_MS,
+                client_args={'limits': httpx.Limits(
+                    max_keepalive_connections=SERVICE_CONFIG.KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=SERVICE_CONFIG.KEEPALIVE_EXPIRY_SECONDS
+                )}
+            )
+        except Exception as e:
+            logger.debug(f"HttpOptions keep-alive indisponível: {e}")
+            return self.types.HttpOptions(timeout=SERVICE_CONFIG.REQUEST_TIMEOUT_MS)
+
+    def setup(self):
+        """Criar o cliente uma única vez; devolve (sucesso, mensagem)"""
+        with self._lock:
+            if self.status is not None and self.status[0]:
+                return self.status
+
+            try:
+                self._import_sdk()
+            except ImportError:
+                self.status = (False, "google-genai não instalado")
+                return self.status
+
+            self.api_key = self.api_key or self.read_api_key()
+            if not self.api_key:
+                self.status = (False, "API key não configurada")
+                return self.status
+
+            try:
+                self.client = self.genai.Client(api_key=self.api_key, http_options=self._http_options())
+                self.status = (True, "Gemini configurado com sucesso")
+            except Exception as e:
+                self.status = (False, f"Erro ao configurar Gemini: {str(e)}")
+            return self.status
+
+    def request_config(self, system_instruction, grounded):
+        """GenerateContentConfig pré-construído (reutilizado entre pedidos)"""
+        key = (system_instruction, grounded)
+        config = self._templates.get(key)
+        if config is None:
+            types = self.types
+            if grounded:
+                config = types.GenerateContentConfig(
+                    tools=[types.Tool(google_search=types.GoogleSearch())],
+                    system_instruction=system_instruction,
+                    temperature=1.0
+                )
+            else:
+                config = types.GenerateContentConfig(system_instruction=system_instruction)
+            self._templates[key] = config
+        return config
+
+    def cached_config(self, cached_content):
+        """Config que refere uma cache de contexto (system instruction vem da cache)"""
+        return self.types.GenerateContentConfig(cached_content=cached_content)
+
+    def _config(self, system_instruction, grounded, cached_content, timeout):
+        self._last_used = time.monotonic()
+        if cached_content is not None:
+            config = self.cached_config(cached_content)
+        else:
+            config = self.request_config(system_instruction, grounded)
+        return self.with_timeout(config, timeout)
+
+    def with_timeout(self, config, seconds):
+        """Template com timeout HTTP reduzido ao tempo que resta ao pedido"""
+        if seconds is None or seconds * 1000 >= SERVICE_CONFIG.REQUEST_TIMEOUT_MS:
+            return config
+        timeout_ms = max(1000, int(seconds * 1000))
+        return config.model_copy(update={'http_options': self.types.HttpOptions(timeout=timeout_ms)})
+
+    @staticmethod
+    def _usage(metadata):
+        """Uso de tokens de usage_metadata (None se ausente)"""
+        if metadata is None:
+            return None
+        return {
+            'input_tokens': metadata.prompt_token_count or 0,
+            'output_tokens': metadata.candidates_token_count or 0,
+            'cached_tokens': metadata.cached_content_token_count or 0
+        }
+
+    @staticmethod
+    def _sources(response):
+        """Fontes [(título, url)] do grounding com Google Search"""
+        sources = []
+        for candidate in response.candidates or ():
+            metadata = candidate.grounding_metadata
+            if metadata is None:
+                continue
+            for chunk in metadata.grounding_chunks or ():
+                if chunk.web is not None and chunk.web.uri:
+                    sources.append((chunk.web.title or chunk.web.uri, chunk.web.uri))
+        return tuple(sources)
+
+    def generate(self, model, contents, system_instruction=None, grounded=False, timeout=None,
+                 cached_content=None):
+        config = self._config(system_instruction, grounded, cached_content, timeout)
+        response = self.client.models.generate_content(model=model, contents=contents, config=config)
+        return LLMResponse(response.text, self._usage(response.usage_metadata), self._sources(response))
+
+    def stream(self, model, contents, system_instruction=None, grounded=False, timeout=None,
+               cached_content=None):
+        config = self._config(system_instruction, grounded, cached_content, timeout)
+        response = self.client.models.generate_content_stream(model=model, contents=contents, config=config)
+        handle = LLMStream()
+
+        def chunks():
+            try:
+                for chunk in response:
+                    if chunk.usage_metadata is not None:
+                        handle.usage = self._usage(chunk.usage_metadata)
+                    sources = self._sources(chunk)
+                    if sources:
+                        handle.sources += sources
+                    text = chunk.text
+                    if text:
+                        yield text
+            finally:
+                close = getattr(response, 'close', None)
+                if close is not None:
+                    close()
+
+        handle._chunks = chunks()
+        return handle
+
+    def count_tokens(self, model, contents):
+        return self.client.models.count_tokens(model=model, contents=contents).total_tokens
+
+    @staticmethod
+    def _expires_at(cached, ttl):
+        expire_time = getattr(cached, 'expire_time', None)
+        return expire_time.timestamp() if expire_time is not None else time.time() + ttl
+
+    def create_cache(self, model, contents, system_instruction=None, ttl=600):
+        cached = self.client.caches.create(model=model, config=self.types.CreateCachedContentConfig(
+            contents=contents,
+            system_instruction=system_instruction,
+            ttl=f"{int(ttl)}s",
+            display_name="geminicat-conversa"
+        ))
+        usage = cached.usage_metadata
+        tokens = (usage.total_token_count or 0) if usage is not None else 0
+        return CachedContext(cached.name, model, self._expires_at(cached, ttl), tokens)
+
+    def refresh_cache(self, name, ttl=600):
+        cached = self.client.caches.update(name=name, config=self.types.UpdateCachedContentConfig(ttl=f"{int(ttl)}s"))
+        return self._expires_at(cached, ttl)
+
+    def delete_cache(self, name):
+        self.client.caches.delete(name=name)
+
+    def warm_up(self, system_instruction=None):
+        """Importar SDK, criar cliente, abrir ligação TLS e construir templates"""
+        started = time.perf_counter()
+        success, message = self.setup()
+        if not success:
+            logger.info(f"Aquecimento Gemini ignorado: {message}")
+            return
+
+        if system_instruction:
+            self.request_config(system_instruction, False)
+            self.request_config(system_instruction, True)
+
+        try:
+            # Pedido de metadados (sem gerar conteúdo) só para o handshake TLS
+            self.client.models.get(model=SERVICE_CONFIG.WARMUP_MODEL)
+            self._last_used = time.monotonic()
+            self.warm.set()
+            logger.info(f"Gemini aquecido em {(time.perf_counter() - started) * 1000:.0f}ms")
+        except Exception as e:
+            logger.warning(f"Aquecimento da ligação Gemini falhou: {e}")
+
+    def warm_up_async(self, system_instruction=None):
+        """Aquecer em background (uma vez)"""
+        with self._lock:
+            if self._warming or self.warm.is_set():
+                return
+            self._warming = True
+        self._warm_in_background(system_instruction)
+
+    def keep_warm(self, system_instruction=None):
+        """Aquecer (outra vez) em background se nunca aqueceu ou a ligação está parada"""
+        with self._lock:
+            idle = time.monotonic() - self._last_used
+            if self._warming or (self.warm.is_set() and idle < SERVICE_CONFIG.REWARM_IDLE_SECONDS):
+                return
+            self._warming = True
+        self._warm_in_background(system_instruction)
+
+    def _warm_in_background(self, system_instruction):
+
+        def run():
+            try:
+                self.warm_up(system_instruction)
+            finally:
+                self._warming = False
+
+        threading.Thread(target=run, name="gemini-warmup", daemon=True).start()
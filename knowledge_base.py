@@ -0,0 +1,307 @@
+"""
+Base de conhecimento local: notas e ficheiros do utilizador (pasta
+`knowledge/`) divididos em excertos e indexados como vetores de n-gramas
+de palavras com hashing (TF-IDF normalizado) numa matriz NumPy em disco,
+aberta com memory-map
+
+O chat junta os melhores excertos à pergunta e, quando a semelhança é
+alta, responde sem Google Search. Requer apenas NumPy; sem índice (ou sem
+NumPy) o chat funciona como antes.
+
+Uso:
+    python knowledge_base.py ingest [--dir knowledge] [--out knowledge_index]
+    python knowledge_base.py query "a que horas abre a farmácia?" [-k 3]
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import unicodedata
+import zlib
+from collections import namedtuple
+
+from offline_responder import STOPWORDS
+
+try:
+    import numpy as np
+except ImportError:  # Base de conhecimento opcional
+    np = None
+
+logger = logging.getLogger('GeminiCat')
+
+DEFAULT_DIMS = 1 << 12
+CHUNK_CHARS = 800
+STEM_CHARS = 6  # palavras truncadas (plurais, género e tempos verbais caem no mesmo termo)
+# Palavras interrogativas dizem o tipo de pergunta, não o assunto: ficam de fora como as stopwords
+QUESTION_WORDS = frozenset('qual quais quando onde como quem quanto quanta quantos quantas porque'.split())
+EXTENSIONS = ('.txt', '.md', '.markdown', '.pdf')
+POINTER = 'CURRENT'  # nome da pasta da versão em uso do índice
+
+# Excerto indexado: ficheiro de origem (relativo à pasta) e texto
+Chunk = namedtuple('Chunk', 'source text')
+# Resultado da pesquisa: semelhança (cosseno), excerto, e quantos dos radicais da pergunta (`terms`) o excerto contém
+Match = namedtuple('Match', 'score chunk matched terms')
+
+_WORDS = re.compile(r'\w+')
+_PARAGRAPHS = re.compile(r'\n\s*\n')
+_SENTENCES = re.compile(r'(?<=[.!?])\s+')
+
+
+def stems(text):
+    """Radicais das palavras (sem acentos, minúsculas, sem stopwords)"""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return [word[:STEM_CHARS] for word in _WORDS.findall(text)
+            if len(word) > 1 and word not in STOPWORDS and word not in QUESTION_WORDS]
+
+
+def terms(text):
+    """Radicais das palavras e bigramas de radicais"""
+    words = stems(text)
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def term_index(term, dims):
+    """Dimensão do termo (hash crc32, estável entre processos)"""
+    return zlib.crc32(term.encode('utf-8')) & (dims - 1)
+
+
+def term_counts(text, dims):
+    """Contagens por dimensão dos termos do texto"""
+    indices = [term_index(term, dims) for term in terms(text)]
+    return np.bincount(np.array(indices, dtype=np.int64), minlength=dims).astype(np.float32)
+
+
+def split_chunks(text, chunk_chars=CHUNK_CHARS):
+    """Excertos de até `chunk_chars` caracteres, por parágrafos (e frases, se preciso)"""
+    pieces = []
+    for paragraph in _PARAGRAPHS.split(text):
+        paragraph = ' '.join(paragraph.split())
+        if len(paragraph) <= chunk_chars:
+            if paragraph:
+                pieces.append(paragraph)
+            continue
+        pieces.extend(sentence for sentence in _SENTENCES.split(paragraph) if sentence)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > chunk_chars:
+            chunks.append(current)
+            current = ""
+        while len(piece) > chunk_chars:  # Frase enorme (ex: tabela extraída de PDF)
+            chunks.append(piece[:chunk_chars])
+            piece = piece[chunk_chars:]
+        current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def read_document(path):
+    """Texto de um ficheiro (PDF só com pypdf instalado); None se não for possível ler"""
+    if path.lower().endswith('.pdf'):
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            logger.info(f"pypdf não instalado - {path} ignorado (exporta o texto para .txt)")
+            return None
+        try:
+            return "\n\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+        except Exception as e:
+            logger.warning(f"Erro ao ler {path}: {e}")
+            return None
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            return f.read()
+    except OSError as e:
+        logger.warning(f"Erro ao ler {path}: {e}")
+        return None
+
+
+def document_paths(folder):
+    """Ficheiros indexáveis da pasta (recursivo, ordem estável)"""
+    paths = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if name.lower().endswith(EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def newest_mtime(folder):
+    """Data de modificação mais recente dos documentos e das pastas (0 se não houver)
+
+    Apagar ou mudar o nome a uma nota só muda a data da pasta onde estava.
+    """
+    newest = 0.0
+    for root, _, files in os.walk(folder):
+        paths = [root] + [os.path.join(root, name) for name in files if name.lower().endswith(EXTENSIONS)]
+        for path in paths:
+            try:
+                newest = max(newest, os.stat(path).st_mtime)
+            except OSError:
+                continue  # Apagado entretanto
+    return newest
+
+
+def current_path(path):
+    """Pasta da versão em uso do índice em `path/` (índices antigos: a própria pasta)"""
+    try:
+        with open(os.path.join(path, POINTER), encoding='utf-8') as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return path
+    return os.path.join(path, version)
+
+
+def switch_version(out, version):
+    """Apontar o índice para `version` (substituição atómica do ficheiro de ponteiro)"""
+    pointer = os.path.join(out, POINTER)
+    with open(f"{pointer}.tmp", 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(f"{pointer}.tmp", pointer)
+
+
+def remove_old_versions(out, keep):
+    """Apagar versões antigas; no Windows as ainda abertas em memory-map ficam para a próxima vez"""
+    for name in os.listdir(out):
+        path = os.path.join(out, name)
+        if name != keep and name.startswith('v') and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def build_index(folder, out, dims=DEFAULT_DIMS, chunk_chars=CHUNK_CHARS):
+    """Indexar a pasta numa versão nova em `out/` (vectors.npy, idf.npy, chunks.json); devolve o nº de excertos
+
+    Os ficheiros de uma versão nunca são reescritos: quem tem o índice
+    anterior aberto em memory-map continua a lê-lo até abrir o novo.
+    """
+    started = time.time()  # Notas alteradas durante a indexação ficam mais recentes que o índice
+    chunks = []
+    for path in document_paths(folder):
+        text = read_document(path)
+        if text:
+            source = os.path.relpath(path, folder)
+            chunks.extend(Chunk(source, chunk) for chunk in split_chunks(text, chunk_chars))
+
+    counts = np.zeros((len(chunks), dims), dtype=np.float32)
+    for row, chunk in enumerate(chunks):
+        counts[row] = term_counts(chunk.text, dims)
+
+    # TF sublinear x IDF suavizado, linhas normalizadas (produto interno = cosseno)
+    document_frequency = np.count_nonzero(counts, axis=0)
+    idf = (np.log((1 + len(chunks)) / (1 + document_frequency)) + 1).astype(np.float32)
+    vectors = np.log1p(counts, out=counts) * idf
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.maximum(norms, 1e-9)
+
+    version = f"v{time.time_ns()}"
+    target = os.path.join(out, version)
+    os.makedirs(target)
+    np.save(os.path.join(target, 'vectors.npy'), vectors.astype(np.float16))
+    np.save(os.path.join(target, 'idf.npy'), idf)
+    with open(os.path.join(target, 'chunks.json'), 'w', encoding='utf-8') as f:
+        json.dump({'dims': dims, 'built_at': started, 'chunks': [list(chunk) for chunk in chunks]},
+                  f, ensure_ascii=False)
+    switch_version(out, version)
+    remove_old_versions(out, version)
+    return len(chunks)
+
+
+class KnowledgeBase:
+    """Excertos indexados e pesquisa por semelhança (cosseno) sobre a matriz em memory-map"""
+
+    def __init__(self, vectors, idf, chunks, built_at=0.0):
+        self.vectors = vectors  # np.memmap float16 (excertos x dims)
+        self.idf = idf
+        self.chunks = chunks
+        self.built_at = built_at
+        self.dims = len(idf)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @classmethod
+    def load(cls, path):
+        """Abrir índice de `path/`; None se não houver NumPy ou índice válido"""
+        if np is None:
+            return None
+        path = current_path(path)
+        try:
+            with open(os.path.join(path, 'chunks.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+            idf = np.load(os.path.join(path, 'idf.npy'))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Erro ao abrir a base de conhecimento {path}: {e}")
+            return None
+        chunks = [Chunk(*chunk) for chunk in meta['chunks']]
+        logger.info(f"Base de conhecimento: {len(chunks)} excertos ({path})")
+        return cls(vectors, idf, chunks, meta.get('built_at', 0.0))
+
+    def search(self, text, k=3):
+        """[Match] dos `k` excertos mais próximos, do melhor para o pior
+
+        O cosseno ordena mas não é comparável entre índices (depende do IDF,
+        logo do tamanho das notas, e do tamanho da pergunta); `matched`/`terms`
+        diz que parte dos radicais da pergunta aparece no excerto.
+        """
+        if not self.chunks:
+            return []
+        query = np.log1p(term_counts(text, self.dims)) * self.idf
+        columns = np.flatnonzero(query)
+        if not len(columns):
+            return []
+        weights = query[columns] / np.linalg.norm(query[columns])
+        # Só as colunas dos termos da pergunta (a matriz fica em disco)
+        scores = np.asarray(self.vectors[:, columns], dtype=np.float32) @ weights
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+
+        stem_columns = np.unique([term_index(stem, self.dims) for stem in stems(text)])
+        matched = np.count_nonzero(np.asarray(self.vectors[np.ix_(best, stem_columns)]), axis=1)
+        return [Match(float(scores[i]), self.chunks[i], int(count), len(stem_columns))
+                for i, count in zip(best, matched)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Base de conhecimento local do GeminiCat")
+    parser.add_argument("command", choices=("ingest", "query"))
+    parser.add_argument("text", nargs="?", default="")
+    parser.add_argument("--dir", default="knowledge")
+    parser.add_argument("--out", default="knowledge_index")
+    parser.add_argument("--dims", type=int, default=DEFAULT_DIMS)
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+
+    if np is None:
+        parser.error("é necessário NumPy (pip install numpy)")
+
+    if args.command == "ingest":
+        if args.dims & (args.dims - 1):
+            parser.error("--dims tem de ser uma potência de 2")
+        started = time.perf_counter()
+        count = build_index(args.dir, args.out, args.dims)
+        print(f"{count} excertos de {args.dir} -> {args.out} ({time.perf_counter() - started:.1f}s)")
+        return
+
+    knowledge = KnowledgeBase.load(args.out)
+    if knowledge is None:
+        parser.error(f"sem índice em {args.out} (corre primeiro: python knowledge_base.py ingest)")
+    started = time.perf_counter()
+    hits = knowledge.search(args.text, args.k)
+    elapsed = (time.perf_counter() - started) * 1000
+    for score, chunk, matched, total in hits:
+        print(f"{score:.3f} {matched}/{total}  {chunk.source}: {chunk.text[:120]}")
+    print(f"{len(knowledge)} excertos, {elapsed:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
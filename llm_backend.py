@@ -0,0 +1,285 @@
+"""
+Interface de backend LLM usada pelo chat, e backend falso (offline) para
+testes de carga do pipeline sem acesso à API
+"""
+import logging
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+from conversation_memory import estimate_tokens
+
+logger = logging.getLogger('GeminiCat')
+
+# Resposta completa: texto, uso de tokens (dict ou None) e fontes [(título, url)]
+LLMResponse = namedtuple('LLMResponse', 'text usage sources')
+# Prefixo registado no backend (cache de contexto): nome, modelo, validade (time.time()) e tokens
+CachedContext = namedtuple('CachedContext', 'name model expires_at tokens')
+
+
+class BackendError(Exception):
+    """Erro de backend com código HTTP (mesmos atributos que google.genai.errors.APIError)"""
+
+    def __init__(self, code, message, retry_after=None):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.message = message
+        self.retry_after = retry_after
+
+
+class LLMStream:
+    """Iterador de chunks de texto; `usage` e `sources` ficam preenchidos no fim"""
+
+    def __init__(self):
+        self.usage = None
+        self.sources = ()
+        self._chunks = iter(())
+
+    def __iter__(self):
+        return self._chunks
+
+    def close(self):
+        """Abandonar o stream (fecha a ligação subjacente)"""
+        close = getattr(self._chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+class LLMBackend(ABC):
+    """Operações que o chat precisa de um modelo de linguagem
+
+    `contents` segue o formato de turnos da API Gemini
+    ([{"role": ..., "parts": [{"text": ...}]}]) ou é uma string simples.
+    Com `cached_content`, `contents` é só o que vem depois do prefixo em
+    cache e a system instruction é a da cache (sem pesquisa).
+    """
+    name = "base"
+    supports_caching = False
+
+    @property
+    def available(self):
+        return False
+
+    def setup(self):
+        """Preparar backend; devolve (sucesso, mensagem)"""
+        return False, "Backend não implementado"
+
+    @abstractmethod
+    def generate(self, model, contents, system_instruction=None, grounded=False, timeout=None,
+                 cached_content=None):
+        """Gerar resposta completa -> LLMResponse"""
+
+    @abstractmethod
+    def stream(self, model, contents, system_instruction=None, grounded=False, timeout=None,
+               cached_content=None):
+        """Gerar resposta em streaming -> LLMStream"""
+
+    @abstractmethod
+    def count_tokens(self, model, contents):
+        """Número de tokens de `contents` para o modelo"""
+
+    @abstractmethod
+    def create_cache(self, model, contents, system_instruction=None, ttl=600):
+        """Registar prefixo (system instruction + contents) -> CachedContext"""
+
+    @abstractmethod
+    def refresh_cache(self, name, ttl=600):
+        """Prolongar validade da cache; devolve o novo expires_at"""
+
+    def delete_cache(self, name):
+        """Apagar cache (opcional: expira sozinha)"""
+
+    def warm_up_async(self, system_instruction=None):
+        """Preparar ligações em background (opcional)"""
+
+    def keep_warm(self, system_instruction=None):
+        """Reabrir a ligação em background se esteve parada (opcional; ex: utilizador a escrever)"""
+
+
+def contents_text(contents):
+    """Texto concatenado de contents (string ou lista de turnos)"""
+    if isinstance(contents, str):
+        return contents
+    return "\n".join(part.get("text", "") for turn in contents for part in turn["parts"])
+
+
+class FakeBackendConfig:
+    """Comportamento simulado do backend falso (sobreponível por variáveis de ambiente)"""
+    LATENCY_MS = int(os.getenv('GEMINICAT_FAKE_LATENCY_MS', '300'))  # até ao primeiro chunk
+    LATENCY_JITTER = 0.3  # fração aleatória da latência
+    CHUNK_MS = int(os.getenv('GEMINICAT_FAKE_CHUNK_MS', '30'))
+    CHUNK_WORDS = 4
+    RESPONSE_WORDS = 60
+    PREFILL_MS_PER_1K = int(os.getenv('GEMINICAT_FAKE_PREFILL_MS', '40'))  # por 1000 tokens de input fora da cache
+    CACHE_CREATE_MS = 200
+    ERROR_RATE = float(os.getenv('GEMINICAT_FAKE_ERROR_RATE', '0'))  # 500
+    RATE_LIMIT_RATE = float(os.getenv('GEMINICAT_FAKE_429_RATE', '0'))  # 429
+    RETRY_AFTER = 2.0
+
+
+class FakeBackend(LLMBackend):
+    """Backend local que simula latência, ritmo de streaming, erros e 429
+
+    As respostas são texto determinístico (com um link, e fontes quando
+    `grounded`) para exercitar o mesmo caminho de renderização que o Gemini.
+    Simula também a cache de contexto: o input em cache não conta para a
+    latência de prefill e aparece em `cached_tokens`.
+    """
+    name = "fake"
+    supports_caching = True
+
+    _WORDS = ("o", "gato", "observa", "a", "resposta", "com", "atenção", "e", "curiosidade",
+              "enquanto", "o", "sol", "aquece", "o", "teclado", "durante", "a", "tarde")
+
+    def __init__(self, latency_ms=None, chunk_ms=None, error_rate=None, rate_limit_rate=None,
+                 response_words=None, seed=None):
+        config = FakeBackendConfig
+        self.latency_ms = config.LATENCY_MS if latency_ms is None else latency_ms
+        self.chunk_ms = config.CHUNK_MS if chunk_ms is None else chunk_ms
+        self.error_rate = config.ERROR_RATE if error_rate is None else error_rate
+        self.rate_limit_rate = config.RATE_LIMIT_RATE if rate_limit_rate is None else rate_limit_rate
+        self.response_words = config.RESPONSE_WORDS if response_words is None else response_words
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.input_tokens = 0
+        self.cached_tokens = 0
+        self._caches = {}  # nome -> (CachedContext, contents)
+        self._cache_ids = 0
+
+    @property
+    def available(self):
+        return True
+
+    def setup(self):
+        return True, "Backend falso ativo (sem API)"
+
+    def _roll(self):
+        with self._lock:
+            self.calls += 1
+            return self._random.random(), self._random.uniform(-1, 1)
+
+    def _resolve(self, model, contents, cached_content):
+        """Contents completos e tokens em cache (BackendError 404 se a cache expirou)"""
+        if cached_content is None:
+            return contents, 0
+        with self._lock:
+            cached = self._caches.get(cached_content)
+            if cached is not None and cached[0].expires_at <= time.time():
+                del self._caches[cached_content]
+                cached = None
+        if cached is None:
+            raise BackendError(404, f"CachedContent not found: {cached_content} (simulado)")
+        context, prefix = cached
+        if context.model != model:
+            raise BackendError(400, "Model does not match cached content (simulado)")
+        return prefix + list(contents), context.tokens
+
+    def _first_byte(self, timeout, uncached_tokens=0):
+        """Simular erros e latência até ao primeiro byte (inclui prefill do input fora da cache)"""
+        roll, jitter = self._roll()
+        if roll < self.rate_limit_rate:
+            raise BackendError(429, "RESOURCE_EXHAUSTED (simulado)", retry_after=FakeBackendConfig.RETRY_AFTER)
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise BackendError(500, "INTERNAL (simulado)")
+
+        latency = self.latency_ms * (1 + FakeBackendConfig.LATENCY_JITTER * jitter) / 1000
+        latency += uncached_tokens * FakeBackendConfig.PREFILL_MS_PER_1K / 1e6
+        if timeout is not None and latency > timeout:
+            time.sleep(max(0.0, timeout))
+            raise BackendError(504, "DEADLINE_EXCEEDED (simulado)")
+        time.sleep(latency)
+
+    def _answer(self, contents, grounded, cached_tokens=0):
+        prompt = contents_text(contents).rsplit("\n", 1)[-1][:80]
+        words = [self._WORDS[i % len(self._WORDS)] for i in range(self.response_words)]
+        text = f"Sobre \"{prompt}\": {' '.join(words)}. Mais em [exemplo](https://example.com/gato)."
+        sources = ()
+        if grounded:
+            sources = (("Exemplo", "https://example.com/fonte"),)
+        input_tokens = estimate_tokens(contents_text(contents))
+        usage = {
+            'input_tokens': input_tokens,
+            'output_tokens': estimate_tokens(text),
+            'cached_tokens': cached_tokens
+        }
+        with self._lock:
+            self.input_tokens += input_tokens
+            self.cached_tokens += cached_tokens
+        return text, usage, sources
+
+    def _uncached_tokens(self, contents, cached_tokens):
+        return max(0, estimate_tokens(contents_text(contents)) - cached_tokens)
+
+    def generate(self, model, contents, system_instruction=None, grounded=False, timeout=None,
+                 cached_content=None):
+        contents, cached_tokens = self._resolve(model, contents, cached_content)
+        self._first_byte(timeout, self._uncached_tokens(contents, cached_tokens))
+        text, usage, sources = self._answer(contents, grounded, cached_tokens)
+        # Geração completa custa o mesmo que o streaming inteiro
+        chunks = max(1, self.response_words // FakeBackendConfig.CHUNK_WORDS)
+        time.sleep(chunks * self.chunk_ms / 1000)
+        return LLMResponse(text, usage, sources)
+
+    def stream(self, model, contents, system_instruction=None, grounded=False, timeout=None,
+               cached_content=None):
+        handle = LLMStream()
+
+        def chunks():
+            full, cached_tokens = self._resolve(model, contents, cached_content)
+            self._first_byte(timeout, self._uncached_tokens(full, cached_tokens))
+            text, usage, sources = self._answer(full, grounded, cached_tokens)
+            words = text.split(" ")
+            step = FakeBackendConfig.CHUNK_WORDS
+            for i in range(0, len(words), step):
+                if i:
+                    time.sleep(self.chunk_ms / 1000)
+                yield " ".join(words[i:i + step]) + (" " if i + step < len(words) else "")
+            handle.usage, handle.sources = usage, sources
+
+        handle._chunks = chunks()
+        return handle
+
+    def count_tokens(self, model, contents):
+        return estimate_tokens(contents_text(contents))
+
+    def create_cache(self, model, contents, system_instruction=None, ttl=600):
+        time.sleep(FakeBackendConfig.CACHE_CREATE_MS / 1000)
+        tokens = estimate_tokens(system_instruction or "") + estimate_tokens(contents_text(contents))
+        with self._lock:
+            self._cache_ids += 1
+            context = CachedContext(f"cachedContents/fake-{self._cache_ids}", model, time.time() + ttl, tokens)
+            self._caches[context.name] = (context, list(contents))
+        return context
+
+    def refresh_cache(self, name, ttl=600):
+        with self._lock:
+            cached = self._caches.get(name)
+            if cached is None or cached[0].expires_at <= time.time():
+                raise BackendError(404, f"CachedContent not found: {name} (simulado)")
+            context = cached[0]._replace(expires_at=time.time() + ttl)
+            self._caches[name] = (context, cached[1])
+        return context.expires_at
+
+    def delete_cache(self, name):
+        with self._lock:
+            self._caches.pop(name, None)
+
+
+_fake_backend = None
+
+
+def get_backend():
+    """Backend configurado por GEMINICAT_BACKEND ("gemini" por omissão, ou "fake")"""
+    global _fake_backend
+    if os.getenv('GEMINICAT_BACKEND', 'gemini').lower() == 'fake':
+        if _fake_backend is None:
+            logger.info("A usar backend LLM falso (GEMINICAT_BACKEND=fake)")
+            _fake_backend = FakeBackend()
+        return _fake_backend
+
+    from gemini_service import GeminiService
+    return GeminiService()
@@ -0,0 +1,248 @@
+"""
+Teste de carga do pipeline do chat com o backend LLM falso (sem Tk nem API)
+
+Percorre o mesmo caminho que a janela do chat: pool de workers, routing de
+pesquisa, limites de pedidos, memória/histórico, streaming em lotes e
+preparação da renderização, com um loop de "UI" numa só thread no lugar
+do mainloop do Tk.
+
+Uso:
+    python load_test.py --requests 400 --conversations 8 --rate 40
+    python load_test.py --latency-ms 800 --error-rate 0.05 --rate-limit-rate 0.05
+"""
+import argparse
+import heapq
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+os.environ.setdefault('GEMINICAT_BACKEND', 'fake')
+
+from gemini_chat_real import GeminiCatChat, CHAT_CONFIG
+from llm_backend import FakeBackend
+
+PROMPTS = (
+    "olá, tudo bem?",
+    "qual é o preço atual de um portátil para programar?",
+    "explica-me a diferença entre listas e tuplos em python",
+    "onde posso comprar comida para gatos perto de mim hoje?",
+    "obrigado pela ajuda",
+    "escreve um resumo curto sobre a história de lisboa",
+    "quais são as últimas notícias sobre inteligência artificial?",
+    "como faço um ciclo for em javascript?",
+)
+
+class UiLoop:
+    """Substituto do mainloop do Tk: executa callbacks `after` numa só thread"""
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self.busy_seconds = 0.0
+        self.callbacks = 0
+        threading.Thread(target=self._run, name="ui-loop", daemon=True).start()
+
+    def after(self, delay_ms, callback, *args):
+        due = time.monotonic() + delay_ms / 1000
+        with self._cond:
+            heapq.heappush(self._heap, (due, next(self._counter), callback, args))
+            self._cond.notify()
+
+    def winfo_exists(self):
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+                _, _, callback, args = heapq.heappop(self._heap)
+
+            started = time.perf_counter()
+            callback(*args)
+            self.busy_seconds += time.perf_counter() - started
+            self.callbacks += 1
+
+
+class HeadlessChat(GeminiCatChat):
+    """GeminiCatChat sem widgets: regista tempos em vez de desenhar"""
+
+    def __init__(self, backend, ui_loop, stats, prestage=False):
+        super().__init__(None)
+        self.prestage_enabled = prestage
+        self.backend = backend
+        self.chat_window = ui_loop
+        self.stats = stats
+        self.placeholder_ids = itertools.count(1)
+        self.setup_gemini()
+
+    def send(self, message):
+        """Equivalente a send_message sem o campo de input"""
+        placeholder = f"reply{id(self)}_{next(self.placeholder_ids)}"
+        prestaged = None
+        if self.prestage_enabled:
+            # Antecipação feita enquanto o utilizador escrevia (fora do tempo medido)
+            self.prestage(None, message, self._prestage_seq)
+            prestaged, self._prestage = self._prestage, None
+        self.stats.submitted(placeholder)
+        try:
+            self.workers.submit(
+                self.get_response, message, placeholder, prestaged,
+                token=self.cancel_token,
+                timeout=CHAT_CONFIG.REQUEST_TIMEOUT,
+                lane="conversa"
+            )
+        except queue.Full:
+            self.stats.rejected(placeholder)
+
+    def add_message(self, sender, message):
+        if sender == "Sistema" and message.startswith("⚠️"):
+            self.stats.errors += 1
+
+    def render(self, segments):
+        """Argumentos de insert() como no chat real (a tokenização já foi feita no worker)"""
+        args = []
+        for text, tags, url in segments:
+            args += [text, tags + ("hyperlink",) if url else tags]
+        return args
+
+    def update_chat_response(self, segments, placeholder):
+        started = time.perf_counter()
+        self.render(segments)
+        self.telemetry.rendered(placeholder, time.perf_counter() - started, final=True)
+        self.stats.first_text(placeholder)
+        self.stats.finished(placeholder)
+
+    def append_stream_segments(self, stream, segments, provisional=(), final=False):
+        self.stats.first_text(stream.placeholder)
+        stream.opened = True
+        started = time.perf_counter()
+        self.render(segments)
+        self.render(provisional)
+        self.telemetry.rendered(stream.placeholder, time.perf_counter() - started, final)
+        if final:
+            self.stats.finished(stream.placeholder)
+
+
+class LoadStats:
+    """Tempos por pedido (submissão, primeiro texto visível, fim)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.submitted_at = {}
+        self.first_at = {}
+        self.finished_at = {}
+        self.rejections = 0
+        self.errors = 0
+        self.all_done = threading.Event()
+        self.expected = 0
+
+    def submitted(self, key):
+        with self._lock:
+            self.submitted_at[key] = time.monotonic()
+
+    def rejected(self, key):
+        with self._lock:
+            self.submitted_at.pop(key, None)
+            self.rejections += 1
+            self._check_done()
+
+    def first_text(self, key):
+        with self._lock:
+            self.first_at.setdefault(key, time.monotonic())
+
+    def finished(self, key):
+        with self._lock:
+            self.finished_at[key] = time.monotonic()
+            self._check_done()
+
+    def _check_done(self):
+        if len(self.finished_at) + self.rejections >= self.expected:
+            self.all_done.set()
+
+    def latencies(self, marks):
+        return sorted(marks[key] - self.submitted_at[key] for key in marks if key in self.submitted_at)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do chat com backend falso")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--conversations", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=20.0, help="pedidos submetidos por segundo")
+    parser.add_argument("--latency-ms", type=int, default=300)
+    parser.add_argument("--chunk-ms", type=int, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--no-stream", action="store_true")
+    parser.add_argument("--cache", action="store_true", help="usar a cache de respostas em disco")
+    parser.add_argument("--respect-limits", action="store_true", help="manter os limites de pedidos/minuto")
+    parser.add_argument("--no-context-cache", action="store_true", help="enviar sempre o histórico inline")
+    parser.add_argument("--no-hedge", action="store_true", help="não duplicar pedidos com score ambíguo")
+    parser.add_argument("--prestage", action="store_true", help="antecipar routing/notas/cache antes de cada envio")
+    args = parser.parse_args()
+
+    CHAT_CONFIG.STREAMING_ENABLED = not args.no_stream
+    CHAT_CONFIG.CACHE_ENABLED = args.cache
+    CHAT_CONFIG.CONTEXT_CACHE_ENABLED = not args.no_context_cache
+    CHAT_CONFIG.HEDGE_ENABLED = not args.no_hedge
+    CHAT_CONFIG.ROUTING_LOG_ENABLED = False  # não misturar mensagens sintéticas nos dados de treino
+    CHAT_CONFIG.HISTORY_ENABLED = False  # nem no histórico de conversas
+    CHAT_CONFIG.TELEMETRY_ENABLED = False  # nem no registo de métricas (os histogramas aparecem no fim)
+    if not args.respect_limits:
+        CHAT_CONFIG.GROUNDED_RPM = CHAT_CONFIG.PLAIN_RPM = 10 ** 6
+        CHAT_CONFIG.RATE_BURST = 10 ** 6
+        CHAT_CONFIG.HEDGE_RPM = CHAT_CONFIG.HEDGE_BURST = 10 ** 6
+
+    backend = FakeBackend(
+        latency_ms=args.latency_ms, chunk_ms=args.chunk_ms, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, seed=1
+    )
+    ui_loop = UiLoop()
+    stats = LoadStats()
+    stats.expected = args.requests
+    chats = [HeadlessChat(backend, ui_loop, stats, args.prestage) for _ in range(args.conversations)]
+
+    started = time.monotonic()
+    interval = 1.0 / args.rate if args.rate > 0 else 0.0
+    for i in range(args.requests):
+        chats[i % len(chats)].send(PROMPTS[i % len(PROMPTS)])
+        if interval:
+            time.sleep(max(0.0, started + (i + 1) * interval - time.monotonic()))
+
+    stats.all_done.wait(CHAT_CONFIG.REQUEST_TIMEOUT + 10)
+    elapsed = time.monotonic() - started
+
+    total = stats.latencies(stats.finished_at)
+    first = stats.latencies(stats.first_at)
+    print(f"Pedidos: {args.requests} em {args.conversations} conversas, {elapsed:.1f}s")
+    print(f"Concluídos: {len(total)}  rejeitados (fila cheia): {stats.rejections}  erros: {stats.errors}")
+    print(f"Débito: {len(total) / elapsed:.1f} respostas/s  chamadas ao backend: {backend.calls}")
+    for label, values in (("1º texto", first), ("Total", total)):
+        print(f"{label:>9}: p50 {percentile(values, 0.5) * 1000:7.0f}ms  "
+              f"p95 {percentile(values, 0.95) * 1000:7.0f}ms  p99 {percentile(values, 0.99) * 1000:7.0f}ms")
+    print(f"Loop UI: {ui_loop.callbacks} callbacks, {ui_loop.busy_seconds * 1000:.0f}ms ocupado")
+    cached = sum((chat.context_cache.stats for chat in chats if chat.context_cache is not None), Counter())
+    print(f"Tokens de input: {backend.input_tokens} (em cache {backend.cached_tokens}, "
+          f"enviados {backend.input_tokens - backend.cached_tokens})  "
+          f"cache de contexto: {cached['hits']} hits, {cached['inline']} inline, {cached['created']} criadas")
+    hedges = chats[0].telemetry.hedges
+    if hedges:
+        print("Hedging: " + ", ".join(f"{result} {count}" for result, count in sorted(hedges.items())))
+    print("Telemetria por fase/rota (µs):")
+    for name, summary in sorted(chats[0].telemetry.summary().items()):
+        print(f"  {name:>22}: n={summary['samples']:<5} p50 {summary['p50_us']:>9}  p95 {summary['p95_us']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,8 +8,13 @@ import time
 import os
 import json
 import logging
+import math
+from collections import deque
 from functools import partial
 from PIL import Image, ImageTk, ImageDraw
+from monitor_topology import MonitorTopology, watch_display_changes
+from animation_graph import AnimationGraph
+from event_tracing import EventTracer
 # from cat_breeds import CatBreedSystem  # REMOVIDO: não utilizado
 
 # CORREÇÃO: Constantes para eliminar magic numbers
@@ -17,8 +22,7 @@ class GeminiCatConfig:
     """Configurações centralizadas do GeminiCat"""
     # Sprite settings
     SPRITE_SIZE = 128
-    ANIMATION_FRAMES = 6
-    ANIMATION_SPEED_THRESHOLD = 10
+    ANIMATION_GRAPH_FILE = "animations.json"
     
     # Timing settings (em milissegundos)
     MOOD_RESET_TIME = 2000
@@ -27,11 +31,22 @@ class GeminiCatConfig:
     BEHAVIOR_CHANGE_MIN = 100
     BEHAVIOR_CHANGE_MAX = 500
     POSITION_UPDATE_INTERVAL = 100
+    TIMER_TICK_INTERVAL = 50  # tick base do TimerManager (20 FPS)
+    
+    # Drag settings
+    DRAG_FRAME_INTERVAL = 16  # no máximo 1 movimento de janela por frame (~60 FPS)
+    DRAG_FLING_ENABLED = True
+    DRAG_VELOCITY_WINDOW = 0.1  # segundos de amostras usadas para a velocidade
+    FLING_MIN_SPEED = 400  # px/s necessários para iniciar fling
+    FLING_STOP_SPEED = 40  # px/s abaixo dos quais o fling pára
+    FLING_MAX_SPEED = 4000
+    FLING_FRICTION = 4.0  # decaimento exponencial por segundo
     
     # Movement settings
     MOVEMENT_ZONE_HEIGHT = 250
     BOTTOM_MARGIN = 40
     DEFAULT_START_X_OFFSET = 300
+    MONITOR_POLL_INTERVAL = 5000  # poll lento de mudanças de monitores
     
     # Desktop level settings
     DESKTOP_LEVEL_INIT_DELAY = 1000
@@ -39,12 +54,19 @@ class GeminiCatConfig:
     DESKTOP_CHECK_INTERVAL = 10000
     DESKTOP_RETRY_DELAY = 2000
     
+    # Chat: aquecer backend Gemini depois de o pet aparecer
+    CHAT_WARMUP_DELAY = 3000
+    
     # Colors
     TRANSPARENT_COLOR = "#000001"
     FALLBACK_BG = "lightgray"
     
     # Wake up threshold
     WAKE_UP_THRESHOLD_SECONDS = 5
+    
+    # Tracing (GEMINICAT_TRACE=1 ativa; F12 exporta o trace)
+    TRACE_BUFFER_SIZE = 8192
+    TRACE_HITCH_MS = 100  # ticks mais longos são registados como engasgos
 
 CONFIG = GeminiCatConfig()
 
@@ -79,50 +101,156 @@ def setup_logging():
 logger = setup_logging()
 
 # CORREÇÃO: Observer Pattern para eliminar circular dependencies
-from typing import Dict, List, Callable
+from typing import Any, Dict, List, Callable, NamedTuple
+import threading
+import time as time_module
 import weakref
 
+class Events:
+    """Tópicos conhecidos do EventBus"""
+    MONITOR_TOPOLOGY_CHANGED = "monitor_topology_changed"
+    DISPLAY_CHANGED = "display_changed"
+
+EventCallback = Callable[[Any], None]
+
+class _Listener(NamedTuple):
+    priority: int
+    order: int
+    ref: Callable[[], EventCallback]
+
 class EventBus:
-    """Event-driven architecture para desacoplar componentes"""
+    """Event-driven architecture para desacoplar componentes
+
+    Listeners indexados por tópico em tuplos já ordenados por prioridade,
+    reconstruídos só ao (des)subscrever - publish não aloca. Eventos podem
+    ser entregues logo (publish) ou adiados para o próximo tick (post).
+    """
     _instance = None
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls._instance._listeners = {}
+            cls._instance._order = 0
+            cls._instance._queue = []
+            cls._instance._spare_queue = []
+            cls._instance._queued = {}
+            cls._instance._queue_lock = threading.Lock()
+            cls._instance._tracer = None
         return cls._instance
     
-    def subscribe(self, event: str, callback: Callable):
-        """Subscrever a evento"""
-        if event not in self._listeners:
-            self._listeners[event] = []
+    def set_tracer(self, tracer):
+        """Ativar (ou desativar com None) a instrumentação"""
+        self._tracer = tracer
+    
+    @staticmethod
+    def _make_ref(callback: EventCallback, weak: bool):
+        """Referência ao callback - WeakMethod para bound methods"""
+        if not weak:
+            return lambda: callback
+        if hasattr(callback, '__self__') and hasattr(callback, '__func__'):
+            return weakref.WeakMethod(callback)
+        return weakref.ref(callback)
+    
+    def subscribe(self, event: str, callback: EventCallback, priority: int = 0, weak: bool = True):
+        """Subscrever a evento (prioridade maior é chamada primeiro)"""
         # Use weak references para prevenir memory leaks
-        self._listeners[event].append(weakref.ref(callback))
+        self._order += 1
+        listener = _Listener(-priority, self._order, self._make_ref(callback, weak))
+        self._listeners[event] = tuple(sorted(self._listeners.get(event, ()) + (listener,)))
+    
+    def unsubscribe(self, event: str, callback: EventCallback):
+        """Remover subscrição (e referências mortas) de um evento"""
+        self._listeners[event] = tuple(
+            listener for listener in self._listeners.get(event, ())
+            if listener.ref() not in (None, callback)
+        )
     
     def publish(self, event: str, data=None):
-        """Publicar evento"""
-        if event not in self._listeners:
+        """Publicar evento - entrega síncrona"""
+        if self._tracer is not None:
+            return self._publish_traced(event, data)
+        
+        listeners = self._listeners.get(event)
+        if not listeners:
             return
         
-        # Limpar referências mortas e executar callbacks ativos
-        alive_listeners = []
-        for weak_callback in self._listeners[event]:
-            callback = weak_callback()
-            if callback is not None:
-                try:
-                    callback(data)
-                    alive_listeners.append(weak_callback)
-                except Exception as e:
-                    logger.error(f"Erro no callback do evento {event}: {e}")
+        has_dead = False
+        for listener in listeners:
+            callback = listener.ref()
+            if callback is None:
+                has_dead = True
+                continue
+            try:
+                callback(data)
+            except Exception as e:
+                logger.error(f"Erro no callback do evento {event}: {e}")
         
-        self._listeners[event] = alive_listeners
+        # Limpar referências mortas apenas quando existem
+        if has_dead:
+            self._listeners[event] = tuple(l for l in self._listeners[event] if l.ref() is not None)
+    
+    def _publish_traced(self, event: str, data=None):
+        """publish com contagens e spans por listener"""
+        tracer = self._tracer
+        tracer.count_publish(event)
+        listeners = self._listeners.get(event)
+        if not listeners:
+            return
+        
+        clock = time_module.perf_counter_ns
+        publish_start = clock()
+        has_dead = False
+        for listener in listeners:
+            callback = listener.ref()
+            if callback is None:
+                has_dead = True
+                continue
+            start = clock()
+            try:
+                callback(data)
+            except Exception as e:
+                logger.error(f"Erro no callback do evento {event}: {e}")
+            name = getattr(callback, '__qualname__', repr(callback))
+            tracer.record('listener', name, start, clock() - start, {'event': event})
+        tracer.record('event', event, publish_start, clock() - publish_start)
+        
+        if has_dead:
+            self._listeners[event] = tuple(l for l in self._listeners[event] if l.ref() is not None)
+    
+    def post(self, event: str, data=None, coalesce: bool = True):
+        """Adiar evento para o próximo drain (eventos repetidos são fundidos)"""
+        with self._queue_lock:
+            if coalesce:
+                index = self._queued.get(event)
+                if index is not None:
+                    self._queue[index] = (event, data)  # Mantém posição, usa dados mais recentes
+                    return
+                self._queued[event] = len(self._queue)
+            self._queue.append((event, data))
+    
+    def drain(self) -> int:
+        """Entregar eventos adiados (chamado uma vez por tick)"""
+        if not self._queue:
+            return 0
+        
+        with self._queue_lock:
+            queue, self._queue = self._queue, self._spare_queue
+            self._queued.clear()
+        
+        for event, data in queue:
+            self.publish(event, data)
+        
+        delivered = len(queue)
+        queue.clear()
+        self._spare_queue = queue
+        return delivered
 
 # Singleton global event bus
 event_bus = EventBus()
 
 # CORREÇÃO: Timer Manager centralizado para thread safety
 from dataclasses import dataclass
-import time as time_module
 
 @dataclass
 class TimedTask:
@@ -142,8 +270,14 @@ class TimerManager:
             cls._instance._tasks = {}
             cls._instance._running = False
             cls._instance._window = None
+            cls._instance._tick_ms = CONFIG.TIMER_TICK_INTERVAL
+            cls._instance._tracer = None
         return cls._instance
     
+    def set_tracer(self, tracer):
+        """Ativar (ou desativar com None) spans das tasks"""
+        self._tracer = tracer
+    
     def set_window(self, window):
         """Definir janela Tkinter"""
         self._window = window
@@ -156,13 +290,23 @@ class TimerManager:
             last_run=time_module.time(),
             name=name
         )
+        self._update_tick_interval()
         logger.debug(f"Timer task '{name}' adicionado com intervalo {interval_ms}ms")
     
     def remove_task(self, name: str):
         """Remover task"""
-        self._tasks.pop(name, None)
+        if self._tasks.pop(name, None) is not None:
+            self._update_tick_interval()
         logger.debug(f"Timer task '{name}' removido")
     
+    def _update_tick_interval(self):
+        """Tick base, encurtado enquanto houver tasks mais rápidas (ex: fling)"""
+        fastest = min((task.interval for task in self._tasks.values()), default=None)
+        if fastest is None:
+            self._tick_ms = CONFIG.TIMER_TICK_INTERVAL
+        else:
+            self._tick_ms = max(1, min(CONFIG.TIMER_TICK_INTERVAL, int(fastest * 1000)))
+    
     def start(self):
         """Iniciar timer manager"""
         if not self._running and self._window:
@@ -182,93 +326,146 @@ class TimerManager:
         
         current_time = time_module.time()
         
-        # Executar tasks que estão prontos
+        if self._tracer is not None:
+            self._tick_traced(current_time)
+        else:
+            # Entregar eventos adiados uma vez por tick
+            event_bus.drain()
+            
+            # Executar tasks que estão prontos
+            for task in list(self._tasks.values()):
+                if (task.enabled and 
+                    current_time - task.last_run >= task.interval):
+                    try:
+                        task.callback()
+                        task.last_run = current_time
+                    except Exception as e:
+                        logger.error(f"Erro na task '{task.name}': {e}")
+        
+        # Schedule próximo tick (50ms = 20 FPS, menos se houver tasks rápidas)
+        if self._window and self._running:
+            self._window.after(self._tick_ms, self._tick)
+    
+    def _tick_traced(self, current_time):
+        """Tick com spans por task e deteção de engasgos"""
+        tracer = self._tracer
+        clock = time_module.perf_counter_ns
+        tick_start = clock()
+        
+        start = clock()
+        delivered = event_bus.drain()
+        if delivered:
+            tracer.record('timer', 'event_bus.drain', start, clock() - start, {'events': delivered})
+        
+        slowest = (0, None)
         for task in list(self._tasks.values()):
             if (task.enabled and 
                 current_time - task.last_run >= task.interval):
+                start = clock()
                 try:
                     task.callback()
                     task.last_run = current_time
                 except Exception as e:
                     logger.error(f"Erro na task '{task.name}': {e}")
+                duration = clock() - start
+                tracer.record('timer', task.name, start, duration)
+                slowest = max(slowest, (duration, task.name))
         
-        # Schedule próximo tick (50ms = 20 FPS)
-        if self._window and self._running:
-            self._window.after(50, self._tick)
+        tick_duration = clock() - tick_start
+        tracer.record('timer', 'tick', tick_start, tick_duration)
+        if tick_duration > CONFIG.TRACE_HITCH_MS * 1_000_000:
+            logger.warning(f"Engasgo: tick de {tick_duration / 1e6:.1f}ms (mais lenta: '{slowest[1]}' {slowest[0] / 1e6:.1f}ms)")
 
 # Singleton global timer manager
 timer_manager = TimerManager()
 
-# CORREÇÃO: State Machine para consistência de animações
-from enum import Enum
+def setup_tracing():
+    """Ativar instrumentação se GEMINICAT_TRACE estiver definido"""
+    if os.environ.get('GEMINICAT_TRACE', '0') in ('', '0'):
+        return None
+    
+    tracer = EventTracer(CONFIG.TRACE_BUFFER_SIZE)
+    event_bus.set_tracer(tracer)
+    timer_manager.set_tracer(tracer)
+    logger.info("Tracing do EventBus/TimerManager ativado")
+    return tracer
+
+tracer = setup_tracing()
+
+def export_trace(event=None):
+    """Exportar trace Chrome (chrome://tracing / Perfetto) se tracing ativo"""
+    if tracer is None:
+        return
+    path = os.environ.get('GEMINICAT_TRACE_FILE', 'geminicat_trace.json')
+    try:
+        tracer.export_chrome_trace(path)
+    except OSError as e:
+        logger.error(f"Erro ao exportar trace: {e}")
 
-class AnimationState(Enum):
-    IDLE = "idle"
-    WALKING = "walking"
-    SLEEPING = "sleeping"
+def close_chat():
+    """Gravar histórico e métricas do chat que ainda estão em fila (só se o chat foi carregado)"""
+    chat = sys.modules.get('gemini_chat_real')
+    if chat is None:
+        return
+    try:
+        chat.shutdown_gemini()
+    except Exception as e:
+        logger.error(f"Erro ao fechar o chat: {e}")
 
+# CORREÇÃO: State Machine para consistência de animações
 class AnimationStateMachine:
-    """State machine para controlar animações consistentemente"""
+    """State machine sobre o grafo de animações compilado (frames por tempo decorrido)"""
     
-    def __init__(self):
-        self.current_state = AnimationState.IDLE
-        self.walk_frame = 0
-        self.frame_counter = 0
-        self.last_sprite_name = None
-        self.walk_frames_available = 0
-    
-    def set_walk_frames_count(self, count):
-        """Definir número de frames de caminhada disponíveis"""
-        self.walk_frames_available = count
-    
-    def can_transition_to(self, new_state: AnimationState) -> bool:
-        """Verificar se transição de estado é válida"""
-        # Todas as transições são válidas neste caso simples
-        return True
-    
-    def transition_to(self, new_state: AnimationState, mood: str, vx: int, vy: int):
-        """Transição de estado com lógica consistente"""
-        if not self.can_transition_to(new_state):
-            return self.current_state
-        
-        old_state = self.current_state
-        self.current_state = new_state
-        
-        # Reset frame counter apenas em mudanças de estado
-        if old_state != new_state:
-            self.frame_counter = 0
-            if new_state != AnimationState.WALKING:
-                self.walk_frame = 0  # Reset apenas quando sai de walking
-        
-        return self.current_state
-    
-    def get_next_frame(self):
-        """Obter próximo frame de animação de forma consistente"""
-        self.frame_counter += 1
-        
-        if self.current_state == AnimationState.WALKING:
-            if self.frame_counter >= CONFIG.ANIMATION_SPEED_THRESHOLD:
-                if self.walk_frames_available > 0:
-                    self.walk_frame = (self.walk_frame + 1) % self.walk_frames_available
-                self.frame_counter = 0
-                return self.walk_frame
-            return self.walk_frame
-        
-        return 0  # Frame 0 para estados não-walking
-    
-    def get_sprite_name(self, mood: str) -> str:
-        """Obter nome do sprite baseado no estado"""
-        return f"cat_{mood}"
+    def __init__(self, graph: AnimationGraph):
+        self.graph = graph
+        self.current_state = graph.initial
+        self.target_state = graph.initial
+        self.state_started = time.monotonic()
+    
+    @property
+    def state_name(self) -> str:
+        """Nome do estado atual"""
+        return self.graph.states[self.current_state].name
+    
+    def enter(self, state_id: int, now: float):
+        """Entrar num estado, reiniciando o seu relógio"""
+        self.current_state = state_id
+        self.state_started = now
+    
+    def update(self, mood: str, moving: bool) -> str:
+        """Aplicar regras de transição e devolver o frame para o instante atual"""
+        now = time.monotonic()
+        
+        # Só muda de estado quando o alvo das regras muda (one-shots seguem 'next')
+        target = self.graph.target_state(mood, moving)
+        if target != self.target_state:
+            self.target_state = target
+            self.enter(target, now)
+        
+        frame, finished = self.graph.frame_at(self.current_state, (now - self.state_started) * 1000)
+        if finished:
+            next_state = self.graph.states[self.current_state].next_state
+            if next_state >= 0:
+                self.enter(next_state, now)
+                frame, _ = self.graph.frame_at(next_state, 0)
+        
+        return frame
 
 class CatPet:
-    def __init__(self, window):
+    def __init__(self, window, monitor_topology):
         self.window = window
         # CORREÇÃO: Eliminada dependência circular - sem desktop_app reference
         self.size = CONFIG.SPRITE_SIZE
+        
+        # OTIMIZAÇÃO: Limites de movimento pré-calculados pelo serviço de topologia
+        self.monitor_topology = monitor_topology
+        self.movement_bounds = monitor_topology.primary_bounds
+        event_bus.subscribe(Events.MONITOR_TOPOLOGY_CHANGED, self.handle_topology_change)
         self.position_frame_count = 0
         
-        # CORREÇÃO: State Machine para animações consistentes
-        self.animation_state_machine = AnimationStateMachine()
+        # Grafo de animações data-driven (estados, frames e durações em ficheiro)
+        self.animation_graph = AnimationGraph.load(CONFIG.ANIMATION_GRAPH_FILE)
+        self.animation_state_machine = AnimationStateMachine(self.animation_graph)
         
         # Sistema de raças
         self.current_breed = self.load_saved_breed()
@@ -283,13 +480,8 @@ class CatPet:
         # Cache permanente de sprites
         self.sprite_cache = {}
         
-        # Carregar sprites
+        # Carregar sprites (um por frame referenciado no grafo)
         self.sprites = self.load_sprites()
-        self.walk_sprites = self.load_walk_sprites()
-        
-        # CORREÇÃO: Informar state machine sobre frames disponíveis com proteção
-        walk_frame_count = max(1, len(self.walk_sprites))  # Mínimo 1 para evitar divisão por zero
-        self.animation_state_machine.set_walk_frames_count(walk_frame_count)
         
         # Canvas (cor diferente de transparentcolor para evitar conflitos)
         self.canvas = tk.Canvas(
@@ -307,6 +499,14 @@ class CatPet:
         # Anti-flicker: tracking de estado anterior
         self.last_image = None
         
+        # OTIMIZAÇÃO: Estado do drag coalescido (offset relativo ao ponto agarrado)
+        self.grab_offset = (0, 0)
+        self.drag_target = None
+        self.drag_scheduled = False
+        self.dragging = False
+        self.drag_samples = deque(maxlen=8)
+        self.fling_state = None
+        
         # CORREÇÃO: Estado gerido pela state machine (não variáveis individuais)
         
         # Bindings apenas no canvas (evitar duplicação)
@@ -314,9 +514,7 @@ class CatPet:
         self.canvas.bind('<Button-2>', self.open_breed_selector)
         self.canvas.bind('<Button-3>', self.on_right_click)
         self.canvas.bind('<B1-Motion>', self.on_drag)
-        
-        # Subscrever a eventos via EventBus
-        event_bus.subscribe("monitor_info_response", self.handle_monitor_info_response)
+        self.canvas.bind('<ButtonRelease-1>', self.on_drag_release)
         
         # CORREÇÃO: Usar TimerManager para coordenar todos os timers
         timer_manager.set_window(window)
@@ -327,24 +525,19 @@ class CatPet:
         
         logger.info("GeminiCat criado com sprites!")
     
-    def handle_monitor_info_response(self, data):
-        """Handle monitor info response via EventBus"""
-        self._monitor_info = data
+    def handle_topology_change(self, topology):
+        """Atualizar limites de movimento quando os monitores mudam"""
+        self.update_movement_bounds()
+    
+    def update_movement_bounds(self):
+        """Usar os limites do monitor onde o GeminiCat está"""
+        center_x = self.window.winfo_x() + self.size // 2
+        center_y = self.window.winfo_y() + self.size // 2
+        self.movement_bounds = self.monitor_topology.bounds_at(center_x, center_y)
     
     def get_monitor_info(self):
-        """Obter monitor info via EventBus"""
-        # Publicar request e usar fallback se não houver response
-        event_bus.publish("monitor_info_request")
-        
-        if hasattr(self, '_monitor_info') and self._monitor_info:
-            return self._monitor_info
-        
-        # Fallback para Tkinter se não houver monitor info
-        return {
-            'left': 0, 'top': 0, 
-            'right': self.window.winfo_screenwidth(), 
-            'bottom': self.window.winfo_screenheight()
-        }
+        """Obter monitor info da cache de topologia"""
+        return self.monitor_topology.as_dict()
     
     def load_saved_breed(self):
         """Carregar raça guardada"""
@@ -363,9 +556,31 @@ class CatPet:
             json.dump({'breed': breed}, f)
     
     def load_sprites(self):
-        """Carregar sprites HD da raça atual - OTIMIZADO: 1 PhotoImage por raça"""
+        """Carregar frames do grafo para a raça atual - frames em falta usam o sprite base"""
+        base_sprite = self.load_base_sprite()
         sprites = {}
         
+        for frame_name in self.animation_graph.frame_names:
+            frame_path = f"sprites_hd/{self.current_breed}_{frame_name}.png"
+            photo = self.sprite_cache.get(frame_path)
+            if photo is None and os.path.exists(frame_path):
+                try:
+                    # CORREÇÃO: Context manager para evitar resource leak
+                    with Image.open(frame_path) as img:
+                        photo = ImageTk.PhotoImage(img.copy())
+                    # Cache permanente
+                    self.sprite_cache[frame_path] = photo
+                except Exception as e:
+                    logger.error(f"Erro ao carregar frame {frame_name}: {e}")
+            sprites[frame_name] = photo or base_sprite
+        
+        logger.info(f"Sprites {self.current_breed} carregados - {len(sprites)} frames")
+        return sprites
+    
+    def load_base_sprite(self):
+        """Carregar sprite base HD da raça atual - OTIMIZADO: 1 PhotoImage por raça"""
+        cache_key = f"{self.current_breed}_sprite"
+        
         # Tentar carregar sprites HD 128x128
         sit_path = f"sprites_hd/{self.current_breed}_sit.png"
         logger.debug(f"Tentando carregar: {sit_path}")
@@ -373,21 +588,10 @@ class CatPet:
             try:
                 with Image.open(sit_path) as img:
                     logger.debug(f"Imagem carregada: {img.size}, modo: {img.mode}")
-                    
-                    # CORREÇÃO: Criar apenas 1 PhotoImage por raça (não 3 duplicados)
                     single_photo = ImageTk.PhotoImage(img.copy())
-                    
-                    # Reutilizar o mesmo PhotoImage para todos os moods
-                    sprites['cat_idle'] = single_photo
-                    sprites['cat_happy'] = single_photo
-                    sprites['cat_sleep'] = single_photo
-                    
-                    # Cache com chave única por raça
-                    cache_key = f"{self.current_breed}_sprite"
                     self.sprite_cache[cache_key] = single_photo
-                    
                     logger.info(f"Sprite HD {self.current_breed} carregado - 1 PhotoImage reutilizado")
-                    return sprites
+                    return single_photo
             except Exception as e:
                 logger.error(f"Erro ao carregar HD: {e}")
         else:
@@ -399,58 +603,20 @@ class CatPet:
             try:
                 with Image.open(variant_path) as img:
                     resized_img = img.resize((CONFIG.SPRITE_SIZE, CONFIG.SPRITE_SIZE), Image.NEAREST)
-                    
-                    # CORREÇÃO: Criar apenas 1 PhotoImage por raça
                     single_photo = ImageTk.PhotoImage(resized_img)
-                    
-                    # Reutilizar para todos os moods
-                    sprites['cat_idle'] = single_photo
-                    sprites['cat_happy'] = single_photo  
-                    sprites['cat_sleep'] = single_photo
-                    
-                    # Cache otimizado
-                    cache_key = f"{self.current_breed}_sprite"
                     self.sprite_cache[cache_key] = single_photo
-                    
                     logger.info(f"Sprite variante {self.current_breed} carregado - 1 PhotoImage reutilizado")
-                    return sprites
+                    return single_photo
             except Exception as e:
                 logger.error(f"Erro ao carregar variante: {e}")
         
         # Fallback final
-        if not sprites:
-            logger.warning("Usando sprites de fallback")
-            sprites = self.create_fallback_sprites()
-            # Cache fallback sprites
-            for name, photo in sprites.items():
-                self.sprite_cache[f"fallback_{name}"] = photo
-        
-        return sprites
-    
-    def load_walk_sprites(self):
-        """Carregar frames de animação de caminhada com cache permanente"""
-        walk_sprites = []
-        
-        for frame in range(6):
-            walk_path = f"sprites_hd/{self.current_breed}_walk_{frame}.png"
-            if os.path.exists(walk_path):
-                try:
-                    # CORREÇÃO: Context manager para evitar resource leak
-                    with Image.open(walk_path) as img:
-                        photo = ImageTk.PhotoImage(img.copy())
-                        walk_sprites.append(photo)
-                        
-                        # Cache permanente
-                        self.sprite_cache[f'walk_{frame}'] = photo
-                except Exception as e:
-                    logger.error(f"Erro ao carregar walk frame {frame}: {e}")
-        
-        if not walk_sprites:
-            logger.info("Sem animação de caminhada, usando sprite estático")
-        
-        return walk_sprites
+        logger.warning("Usando sprite de fallback")
+        fallback_photo = self.create_fallback_sprite()
+        self.sprite_cache["fallback_sprite"] = fallback_photo
+        return fallback_photo
     
-    def create_fallback_sprites(self):
+    def create_fallback_sprite(self):
         """Criar sprites simples como fallback - OTIMIZADO: 1 sprite reutilizado"""
         # CORREÇÃO: Import movido para topo do ficheiro
         
@@ -464,47 +630,16 @@ class CatPet:
         draw.ellipse([68, 40, 88, 60], fill='black')     # Olho direito  
         draw.ellipse([60, 70, 68, 78], fill='pink')      # Nariz
         
-        # Criar 1 PhotoImage e reutilizar
-        fallback_photo = ImageTk.PhotoImage(img)
-        
-        sprites = {
-            'cat_idle': fallback_photo,
-            'cat_happy': fallback_photo,
-            'cat_sleep': fallback_photo
-        }
-        
-        return sprites
+        # Criar 1 PhotoImage e reutilizar em todos os frames
+        return ImageTk.PhotoImage(img)
     
     def update_sprite(self, force=False):
         """CORREÇÃO: Atualizar sprite usando State Machine"""
-        # Determinar estado de animação baseado em movimento e mood
-        if (self.vx != 0 or self.vy != 0) and self.walk_sprites and self.mood != 'sleep':
-            target_state = AnimationState.WALKING
-        elif self.mood == 'sleep':
-            target_state = AnimationState.SLEEPING
-        else:
-            target_state = AnimationState.IDLE
-        
-        # Usar state machine para transição
-        current_state = self.animation_state_machine.transition_to(
-            target_state, self.mood, self.vx, self.vy
-        )
-        
-        # Obter sprite baseado no estado atual
-        if current_state == AnimationState.WALKING and self.walk_sprites:
-            # Usar animação de caminhada com proteção robusta
-            frame_index = self.animation_state_machine.get_next_frame()
-            # CORREÇÃO: Proteção contra índices inválidos (negativos ou >= length)
-            if 0 <= frame_index < len(self.walk_sprites):
-                new_image = self.walk_sprites[frame_index]
-            else:
-                # Fallback se frame inválido
-                logger.warning(f"Frame index inválido: {frame_index} para {len(self.walk_sprites)} frames")
-                new_image = self.sprites.get(f"cat_{self.mood}", None)
-        else:
-            # Usar sprite estático
-            sprite_name = self.animation_state_machine.get_sprite_name(self.mood)
-            new_image = self.sprites.get(sprite_name, None)
+        # Frame escolhido pelo grafo a partir do tempo decorrido (independente do tick)
+        moving = self.vx != 0 or self.vy != 0
+        frame_name = self.animation_state_machine.update(self.mood, moving)
+        new_image = self.sprites.get(frame_name)
+        current_state = self.animation_state_machine.state_name
         
         # Atualizar canvas apenas se imagem mudou ou é forçado
         if new_image and (self.last_image != new_image or force or not self.pet_sprite):
@@ -513,20 +648,23 @@ class CatPet:
                     self.size // 2, self.size // 2,
                     image=new_image
                 )
-                logger.debug(f"Sprite criado: {current_state.value}, ID: {self.pet_sprite}")
+                logger.debug(f"Sprite criado: {current_state}, ID: {self.pet_sprite}")
             else:
                 self.canvas.itemconfig(self.pet_sprite, image=new_image)
-                logger.debug(f"Sprite atualizado: {current_state.value}")
+                logger.debug(f"Sprite atualizado: {current_state}/{frame_name}")
             
             self.last_image = new_image
         elif not new_image:
-            logger.error(f"Sprite não encontrado para estado {current_state.value}")
+            logger.error(f"Sprite não encontrado para estado {current_state} (frame {frame_name})")
             return
     
     def on_left_click(self, event):
         """GeminiCat fica feliz quando clicado"""
         logger.debug("Clique esquerdo detectado!")
         logger.debug("GeminiCat feliz!")
+        # Guardar ponto agarrado para arrasto relativo e parar fling em curso
+        self.grab_offset = (event.x, event.y)
+        self.stop_fling()
         self.mood = 'happy'
         self.last_interaction = time.time()
         self.update_sprite(force=True)
@@ -642,6 +780,9 @@ class CatPet:
             if old_breed != breed:
                 old_cache_key = f"{old_breed}_sprite" 
                 self.sprite_cache.pop(old_cache_key, None)
+                old_frame_prefix = f"sprites_hd/{old_breed}_"
+                for key in [k for k in self.sprite_cache if k.startswith(old_frame_prefix)]:
+                    del self.sprite_cache[key]
                 logger.debug(f"Cache da raça {old_breed} limpo")
             
             self.current_breed = breed
@@ -654,11 +795,6 @@ class CatPet:
             
             # Recarregar sprites
             self.sprites = self.load_sprites()
-            self.walk_sprites = self.load_walk_sprites()
-            
-            # CORREÇÃO: Atualizar state machine com proteção após reload
-            walk_frame_count = max(1, len(self.walk_sprites))
-            self.animation_state_machine.set_walk_frames_count(walk_frame_count)
             
             # Recriar sprite
             self.update_sprite(force=True)
@@ -731,16 +867,101 @@ class CatPet:
             logger.error(f"Erro no movimento: {e}")
     
     def on_drag(self, event):
-        """Arrastar o GeminiCat"""
-        logger.debug("Arrasto detectado!")
-        try:
-            x = self.window.winfo_pointerx() - self.size//2
-            y = self.window.winfo_pointery() - self.size//2
-            logger.debug(f"Movendo para: {x}, {y}")
-            self.move_window_smooth(x, y)
-            self.last_interaction = time.time()
-        except Exception as e:
-            logger.error(f"Erro no drag: {e}")
+        """Arrastar o GeminiCat - eventos coalescidos a 1 movimento por frame"""
+        self.drag_target = (event.x_root - self.grab_offset[0], event.y_root - self.grab_offset[1])
+        if not self.drag_scheduled:
+            self.drag_scheduled = True
+            self.window.after(CONFIG.DRAG_FRAME_INTERVAL, self.apply_drag)
+    
+    def apply_drag(self):
+        """Aplicar a última posição de arrasto pendente"""
+        self.drag_scheduled = False
+        if self.drag_target is None:
+            return
+        
+        x, y = self.drag_target
+        self.drag_target = None
+        self.dragging = True
+        self.drag_samples.append((time.monotonic(), x, y))
+        self.move_window_smooth(x, y)
+        self.last_interaction = time.time()
+    
+    def on_drag_release(self, event):
+        """Fim do arrasto: aplicar posição final e iniciar fling se rápido"""
+        if self.drag_target is not None:
+            self.apply_drag()
+        if not self.dragging:
+            return  # Foi apenas um clique
+        
+        self.dragging = False
+        vx, vy = self.drag_velocity()
+        _, last_x, last_y = self.drag_samples[-1]
+        self.drag_samples.clear()
+        
+        speed = math.hypot(vx, vy)
+        if CONFIG.DRAG_FLING_ENABLED and speed >= CONFIG.FLING_MIN_SPEED:
+            scale = min(1.0, CONFIG.FLING_MAX_SPEED / speed)
+            self.fling_state = [float(last_x), float(last_y), vx * scale, vy * scale, time.monotonic()]
+            timer_manager.add_task("drag_fling", self.fling_step, CONFIG.DRAG_FRAME_INTERVAL)
+        else:
+            self.update_movement_bounds()
+    
+    def drag_velocity(self):
+        """Velocidade (px/s) a partir das amostras mais recentes do arrasto"""
+        if len(self.drag_samples) < 2:
+            return 0.0, 0.0
+        
+        t_last, x_last, y_last = self.drag_samples[-1]
+        for t_first, x_first, y_first in self.drag_samples:
+            if t_last - t_first <= CONFIG.DRAG_VELOCITY_WINDOW:
+                break
+        
+        dt = t_last - t_first
+        if dt <= 0:
+            return 0.0, 0.0
+        return (x_last - x_first) / dt, (y_last - y_first) / dt
+    
+    def fling_step(self):
+        """Um passo do fling com atrito (executado pelo TimerManager)"""
+        if self.fling_state is None:
+            timer_manager.remove_task("drag_fling")
+            return
+        
+        x, y, vx, vy, last_time = self.fling_state
+        now = time.monotonic()
+        dt = now - last_time
+        
+        x += vx * dt
+        y += vy * dt
+        decay = math.exp(-CONFIG.FLING_FRICTION * dt)
+        vx *= decay
+        vy *= decay
+        
+        # Ressaltar nas margens do monitor atual
+        topology = self.monitor_topology
+        index = topology.monitor_index_at(int(x) + self.size // 2, int(y) + self.size // 2)
+        area = topology.monitors[index]
+        min_x, max_x, _, max_y = topology.bounds[index]
+        if x < min_x or x > max_x:
+            x = max(min_x, min(x, max_x))
+            vx = -vx * 0.5
+        if y < area.top or y > max_y:
+            y = max(area.top, min(y, max_y))
+            vy = -vy * 0.5
+        
+        self.move_window_smooth(int(x), int(y))
+        self.fling_state = [x, y, vx, vy, now]
+        
+        if math.hypot(vx, vy) < CONFIG.FLING_STOP_SPEED:
+            self.stop_fling()
+    
+    def stop_fling(self):
+        """Parar fling em curso e adotar limites do monitor final"""
+        if self.fling_state is None:
+            return
+        self.fling_state = None
+        timer_manager.remove_task("drag_fling")
+        self.update_movement_bounds()
     
     def reset_mood(self):
         """Resetar humor do GeminiCat"""
@@ -799,10 +1020,14 @@ class CatPet:
         # Incrementar contador de frames
         self.position_frame_count += 1
         
+        # Durante arrasto/fling a posição é controlada pelo utilizador
+        if self.dragging or self.fling_state is not None:
+            return
+        
         if self.mood != 'sleep':
             try:
-                # CORREÇÃO: Usar EventBus para obter monitor info sem dependency
-                monitor = self.get_monitor_info()
+                # OTIMIZAÇÃO: Limites pré-calculados - apenas leitura de tuplo
+                min_x, max_x, min_y, max_y = self.movement_bounds
                 
                 geometry = self.window.geometry()
                 parts = geometry.split('+')
@@ -814,17 +1039,11 @@ class CatPet:
                     new_y = current_y + self.vy
                     
                     # Limitar movimento horizontal dentro do monitor primário
-                    min_x = monitor['left']
-                    max_x = monitor['right'] - self.size
-                    
                     if new_x <= min_x or new_x >= max_x:
                         self.vx = -self.vx
                         new_x = max(min_x, min(new_x, max_x))
                     
                     # RESTRIÇÃO: apenas últimos pixels do monitor primário
-                    min_y = monitor['bottom'] - CONFIG.MOVEMENT_ZONE_HEIGHT
-                    max_y = monitor['bottom'] - self.size - CONFIG.BOTTOM_MARGIN
-                    
                     if new_y < min_y:
                         new_y = min_y
                         self.vy = 0
@@ -858,66 +1077,33 @@ class CatDesktopApp:
         self.desktop_level_initialized = False
         self.setup_window()
         
-        # CORREÇÃO: EventBus para comunicação desacoplada
-        event_bus.subscribe("monitor_info_request", self.provide_monitor_info)
+        # Avisos de mudança de ecrã (Windows) -> DISPLAY_CHANGED -> reenumerar monitores
+        # Adiado para o tick: uma rajada de avisos (ex: ligar uma dock) dá uma só reenumeração
+        self.display_hook = watch_display_changes(
+            self.window, lambda: event_bus.post(Events.DISPLAY_CHANGED)
+        )
         
-        self.pet = CatPet(self.window)  # Sem circular dependency
-    
-    def provide_monitor_info(self, data=None):
-        """Provide monitor info via EventBus"""
-        if hasattr(self, 'monitor_info'):
-            event_bus.publish("monitor_info_response", self.monitor_info)
+        # OTIMIZAÇÃO: Poll lento da topologia (invalidação só quando muda; fallback sem avisos)
+        timer_manager.add_task("monitor_poll", self.monitor_topology.poll, CONFIG.MONITOR_POLL_INTERVAL)
+        
+        self.pet = CatPet(self.window, self.monitor_topology)  # Sem circular dependency
+        
+        # OTIMIZAÇÃO: Aquecer chat (imports, TLS) em background - 1º pedido sem arranque a frio
+        timer_manager.add_task("chat_warmup", self.warm_up_chat, CONFIG.CHAT_WARMUP_DELAY)
     
-    def get_primary_monitor_info(self):
-        """Obter informações do monitor primário usando Windows API"""
+    def warm_up_chat(self):
+        """Aquecer o backend do chat Gemini (task única)"""
+        timer_manager.remove_task("chat_warmup")
         try:
-            import ctypes
-            from ctypes import wintypes
-            
-            # Obter monitor primário
-            primary_monitor = ctypes.windll.user32.MonitorFromPoint(
-                wintypes.POINT(0, 0), 1  # MONITOR_DEFAULTTOPRIMARY
-            )
-            
-            # Estrutura MONITORINFO
-            class MONITORINFO(ctypes.Structure):
-                _fields_ = [
-                    ("cbSize", wintypes.DWORD),
-                    ("rcMonitor", wintypes.RECT),
-                    ("rcWork", wintypes.RECT),
-                    ("dwFlags", wintypes.DWORD)
-                ]
-            
-            monitor_info = MONITORINFO()
-            monitor_info.cbSize = ctypes.sizeof(MONITORINFO)
-            
-            if ctypes.windll.user32.GetMonitorInfoW(primary_monitor, ctypes.byref(monitor_info)):
-                work_area = monitor_info.rcWork
-                monitor_area = monitor_info.rcMonitor
-                
-                logger.debug(f"Monitor primário - Work area: {work_area.left},{work_area.top} to {work_area.right},{work_area.bottom}")
-                logger.debug(f"Monitor primário - Full area: {monitor_area.left},{monitor_area.top} to {monitor_area.right},{monitor_area.bottom}")
-                
-                return {
-                    'left': work_area.left,
-                    'top': work_area.top, 
-                    'right': work_area.right,
-                    'bottom': work_area.bottom,
-                    'width': work_area.right - work_area.left,
-                    'height': work_area.bottom - work_area.top
-                }
+            from gemini_chat_real import warm_up_gemini
+            warm_up_gemini()
         except Exception as e:
-            logger.error(f"Erro ao obter info do monitor: {e}")
-            
-        # Fallback para Tkinter
-        return {
-            'left': 0,
-            'top': 0,
-            'right': self.window.winfo_screenwidth(),
-            'bottom': self.window.winfo_screenheight(),
-            'width': self.window.winfo_screenwidth(),
-            'height': self.window.winfo_screenheight()
-        }
+            logger.warning(f"Aquecimento do chat falhou: {e}")
+    
+    def handle_topology_change(self, topology):
+        """Manter monitor_info atualizado e anunciar mudança via EventBus"""
+        self.monitor_info = topology.as_dict()
+        event_bus.publish(Events.MONITOR_TOPOLOGY_CHANGED, topology)
 
     def setup_window(self):
         """Configurar janela do GeminiCat"""
@@ -925,8 +1111,13 @@ class CatDesktopApp:
         
         self.window.title("GeminiCat")
         
-        # Obter informações do monitor primário
-        self.monitor_info = self.get_primary_monitor_info()
+        # Topologia de monitores em cache (Windows API ou fallback Tk/X11)
+        self.monitor_topology = MonitorTopology(
+            self.window, CONFIG.SPRITE_SIZE, CONFIG.MOVEMENT_ZONE_HEIGHT, CONFIG.BOTTOM_MARGIN
+        )
+        self.monitor_topology.add_listener(self.handle_topology_change)
+        self.monitor_info = self.monitor_topology.as_dict()
+        event_bus.subscribe(Events.DISPLAY_CHANGED, self.monitor_topology.invalidate)
         
         # Tentar transparência
         transparency_mode = False
@@ -960,6 +1151,8 @@ class CatDesktopApp:
         
         # ESC para sair
         self.window.bind('<Escape>', lambda e: self.quit())
+        # F12 exporta o trace (se GEMINICAT_TRACE ativo)
+        self.window.bind('<F12>', export_trace)
         self.window.focus_set()
     
     def is_window_visible(self):
@@ -1082,6 +1275,8 @@ class CatDesktopApp:
         print("Adeus! Miau!")
         # CORREÇÃO: Parar TimerManager antes de encerrar
         timer_manager.stop()
+        export_trace()
+        close_chat()
         try:
             self.window.destroy()
         except tk.TclError:
@@ -0,0 +1,165 @@
+"""
+Markdown das respostas do modelo -> segmentos (texto, tags, url) para o Tk
+
+Os blocos (títulos, listas, citações, código) são reconhecidos linha a
+linha e o inline (negrito, itálico, código, links) numa só regex; cada
+construção corresponde a uma tag fixa configurada uma vez no widget.
+Durante o streaming só a linha por terminar é processada de novo.
+"""
+import re
+from functools import lru_cache
+
+from message_tokens import MARKDOWN_LINK_PATTERN, URL_PATTERN, tokenize_message
+
+BASE_FONT = ("Arial", 10)
+CODE_FONT = ("Courier New", 10)
+
+# Tags fixas (nome -> opções de tag_config)
+TAG_STYLES = {
+    "md.bold": {"font": BASE_FONT + ("bold",)},
+    "md.italic": {"font": BASE_FONT + ("italic",)},
+    "md.code": {"font": CODE_FONT, "background": "#e4e4e4"},
+    "md.codeblock": {"font": CODE_FONT, "background": "#e4e4e4", "lmargin1": 12, "lmargin2": 12},
+    "md.h1": {"font": (BASE_FONT[0], 13, "bold")},
+    "md.h2": {"font": (BASE_FONT[0], 12, "bold")},
+    "md.h3": {"font": (BASE_FONT[0], 11, "bold")},
+    "md.list": {"lmargin1": 12, "lmargin2": 24},
+    "md.list2": {"lmargin1": 28, "lmargin2": 40},
+    "md.quote": {"foreground": "#555555", "lmargin1": 12, "lmargin2": 12},
+}
+
+# Inline: código | link Markdown | URL | negrito | itálico (a primeira alternativa ganha na mesma posição)
+_INLINE = re.compile(
+    r'`([^`\n]+)`'
+    f'|{MARKDOWN_LINK_PATTERN}'
+    f'|({URL_PATTERN})'
+    r'|\*\*(.+?)\*\*|__(.+?)__'
+    r'|(?<![\w*])\*([^\s*](?:[^*\n]*?[^\s*])?)\*(?!\*)|(?<!\w)_([^\s_](?:[^_\n]*?[^\s_])?)_(?!\w)'
+)
+_FENCE = re.compile(r'^\s*```')
+_HEADING = re.compile(r'^(#{1,6})\s+(.*)$')
+_BULLET = re.compile(r'^(\s*)[-*+]\s+(.*)$')
+_NUMBERED = re.compile(r'^(\s*)(\d+[.)])\s+(.*)$')
+_QUOTE = re.compile(r'^>\s?(.*)$')
+_RULE = re.compile(r'^\s*(?:-{3,}|\*{3,}|_{3,})\s*$')
+
+
+def configure_tags(text):
+    """Configurar as tags de Markdown num widget Text"""
+    for tag, options in TAG_STYLES.items():
+        text.tag_config(tag, **options)
+
+
+def render_inline(text, tags=()):
+    """Segmentos de uma linha com negrito, itálico, código e links"""
+    segments = []
+    last = 0
+    for match in _INLINE.finditer(text):
+        start = match.start()
+        if start > last:
+            segments.append((text[last:start], tags, None))
+        code, _, md_url, url, bold, bold2, italic, italic2 = match.groups()
+        if code is not None:
+            segments.append((code, tags + ("md.code",), None))
+        elif md_url is not None or url is not None:
+            # Links Markdown mostram o URL (como no chat sem formatação)
+            link = md_url if md_url is not None else url
+            segments.append((link, tags, link))
+        elif bold is not None or bold2 is not None:
+            segments.extend(tokenize_message(bold if bold is not None else bold2, tags + ("md.bold",)))
+        else:
+            segments.extend(tokenize_message(italic if italic is not None else italic2, tags + ("md.italic",)))
+        last = match.end()
+    if last < len(text):
+        segments.append((text[last:], tags, None))
+    return segments
+
+
+def render_line(line, in_code):
+    """Segmentos de uma linha (sem o \\n); devolve (segmentos, dentro de bloco de código)"""
+    if _FENCE.match(line):
+        return [], not in_code
+    if in_code:
+        return [(line, ("md.codeblock",), None)], True
+
+    match = _HEADING.match(line)
+    if match:
+        level = min(len(match.group(1)), 3)
+        return render_inline(match.group(2), (f"md.h{level}",)), False
+    match = _BULLET.match(line)
+    if match and not _RULE.match(line):
+        tag = "md.list2" if len(match.group(1)) >= 2 else "md.list"
+        return [("• ", (tag,), None)] + render_inline(match.group(2), (tag,)), False
+    match = _NUMBERED.match(line)
+    if match:
+        tag = "md.list2" if len(match.group(1)) >= 2 else "md.list"
+        return [(match.group(2) + " ", (tag,), None)] + render_inline(match.group(3), (tag,)), False
+    match = _QUOTE.match(line)
+    if match:
+        return render_inline(match.group(1), ("md.quote",)), False
+    if _RULE.match(line):
+        return [("―" * 20, (), None)], False
+    return render_inline(line), False
+
+
+def _render_lines(lines, in_code):
+    segments = []
+    for line in lines:
+        line_segments, now_in_code = render_line(line, in_code)
+        if now_in_code == in_code:  # As linhas ``` não aparecem
+            segments.extend(line_segments)
+            segments.append(("\n", ("md.codeblock",) if in_code else (), None))
+        in_code = now_in_code
+    return segments, in_code
+
+
+@lru_cache(maxsize=256)
+def _render_cached(text):
+    lines = text.split('\n')
+    segments, _ = _render_lines(lines, False)
+    # Sem \n depois da última linha
+    if segments and segments[-1][0] == "\n":
+        segments.pop()
+    return tuple(segments)
+
+
+def render_markdown(text):
+    """Segmentos (texto, tags, url) de uma mensagem completa (com cache por texto)"""
+    return list(_render_cached(text))
+
+
+class MarkdownStream:
+    """Renderização incremental para streaming
+
+    Linhas completas são processadas uma vez (segmentos definitivos); a
+    linha por terminar é processada de novo a cada chunk e mostrada como
+    provisória até chegar o \\n.
+    """
+
+    def __init__(self):
+        self.in_code = False
+        self.tail = ""
+
+    def feed(self, text):
+        """Acrescentar texto -> (segmentos definitivos, segmentos provisórios da última linha)"""
+        text = self.tail + text
+        cut = text.rfind('\n') + 1
+        committed = []
+        if cut:
+            lines = text[:cut - 1].split('\n')
+            committed, self.in_code = _render_lines(lines, self.in_code)
+        self.tail = text[cut:]
+        return committed, self.provisional()
+
+    def provisional(self):
+        """Segmentos da linha por terminar (sem alterar o estado)"""
+        if not self.tail:
+            return []
+        segments, _ = render_line(self.tail, self.in_code)
+        return segments
+
+    def finish(self):
+        """Fim da resposta: a linha por terminar passa a definitiva"""
+        segments = self.provisional()
+        self.tail = ""
+        return segments
@@ -0,0 +1,28 @@
+"""
+Tokenizador de mensagens do chat: divide o texto em segmentos
+(texto, tags, url) numa só passagem, com as regexes compiladas uma vez
+"""
+import re
+
+# Padrões de links (Markdown e URLs simples, com e sem protocolo)
+MARKDOWN_LINK_PATTERN = r'\[([^\]]+)\]\(([^\)]+)\)'
+URL_PATTERN = r'(?:https?://)?(?:www\.)?[a-zA-Z0-9-]+\.[a-zA-Z]{2,}(?:/[^\s\)\]\>]*)?'
+
+# Markdown tem prioridade sobre URL simples na mesma posição (grupos 1-2 Markdown, 3 URL)
+LINK_REGEX = re.compile(f'{MARKDOWN_LINK_PATTERN}|({URL_PATTERN})')
+
+
+def tokenize_message(text, tags=()):
+    """Segmentos [(texto, tags, url ou None)] - links Markdown mostram o URL, não o texto"""
+    segments = []
+    last = 0
+    for match in LINK_REGEX.finditer(text):
+        start = match.start()
+        if start > last:
+            segments.append((text[last:start], tags, None))
+        url = match.group(2) if match.group(2) is not None else match.group(3)
+        segments.append((url, tags, url))
+        last = match.end()
+    if last < len(text):
+        segments.append((text[last:], tags, None))
+    return segments
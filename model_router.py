@@ -0,0 +1,108 @@
+"""
+Escolha do modelo por pedido a partir de características locais baratas
+(tamanho, score de pesquisa, profundidade da conversa, grounding), com
+latência registada por tier
+"""
+import logging
+import threading
+from collections import namedtuple
+
+from event_tracing import LatencyHistogram
+
+logger = logging.getLogger('GeminiCat')
+
+FAST = "rapido"
+NORMAL = "normal"
+STRONG = "forte"
+TIER_ORDER = (FAST, NORMAL, STRONG)
+
+# Modelo escolhido e motivo (para logs/telemetria)
+ModelChoice = namedtuple('ModelChoice', 'tier model reason')
+
+
+class ModelRouter:
+    """Regras simples por tier, com recuo para o tier abaixo se o escolhido estiver lento
+
+    Args:
+        models: dict tier -> nome do modelo (tiers em falta são ignorados)
+        fast_max_chars: mensagens até este tamanho, sem pesquisa nem keywords, vão para o tier rápido
+        strong_min_chars: a partir deste tamanho (ou com código/vários parágrafos) vão para o forte
+        strong_min_depth: conversas com pelo menos estes turnos e mensagem não trivial vão para o forte
+        latency_budgets: dict tier -> segundos até ao primeiro byte; média recente acima disto desce um tier
+    """
+
+    def __init__(self, models, fast_max_chars=40, strong_min_chars=600, strong_min_paragraphs=3,
+                 strong_min_depth=16, latency_budgets=None, smoothing=0.2):
+        self.models = {tier: model for tier, model in models.items() if model}
+        self.fast_max_chars = fast_max_chars
+        self.strong_min_chars = strong_min_chars
+        self.strong_min_paragraphs = strong_min_paragraphs
+        self.strong_min_depth = strong_min_depth
+        self.latency_budgets = latency_budgets or {}
+        self.smoothing = smoothing
+
+        self.histograms = {tier: LatencyHistogram() for tier in TIER_ORDER}
+        self._recent = {}  # tier -> média móvel exponencial (s)
+        self._lock = threading.Lock()
+
+    def _tier_for(self, message, score, depth, grounded):
+        length = len(message)
+        if length <= self.fast_max_chars and not grounded and score <= 0 and '\n' not in message:
+            return FAST, "curta"
+
+        paragraphs = sum(1 for block in message.split('\n\n') if block.strip())
+        if length >= self.strong_min_chars:
+            return STRONG, "longa"
+        if '```' in message or paragraphs >= self.strong_min_paragraphs:
+            return STRONG, "estruturada"
+        if depth >= self.strong_min_depth and length > self.fast_max_chars * 4:
+            return STRONG, "conversa longa"
+        return NORMAL, "normal"
+
+    def _available(self, tier):
+        """Tier configurado mais próximo (desce e depois sobe)"""
+        index = TIER_ORDER.index(tier)
+        for candidate in TIER_ORDER[index::-1] + TIER_ORDER[index + 1:]:
+            if candidate in self.models:
+                return candidate
+        raise ValueError("nenhum modelo configurado")
+
+    def choose(self, message, score=0, depth=0, grounded=False):
+        """Modelo para o pedido -> ModelChoice"""
+        tier, reason = self._tier_for(message, score, depth, grounded)
+        tier = self._available(tier)
+
+        # Tier acima do orçamento de latência: descer um nível (se existir)
+        budget = self.latency_budgets.get(tier)
+        if budget is not None and tier != FAST:
+            lower = TIER_ORDER[TIER_ORDER.index(tier) - 1]
+            with self._lock:
+                recent = self._recent.get(tier)
+                slow = recent is not None and recent > budget and lower in self.models
+                if slow:
+                    # Esquecer aos poucos a lentidão para voltar a experimentar o tier
+                    self._recent[tier] = recent * (1 - self.smoothing)
+            if slow:
+                reason = f"{reason}, {tier} lento ({recent:.1f}s)"
+                tier = lower
+
+        return ModelChoice(tier, self.models[tier], reason)
+
+    def record(self, tier, seconds):
+        """Registar o tempo até ao primeiro byte de um pedido ao modelo do tier"""
+        with self._lock:
+            self.histograms[tier].add(int(seconds * 1e9))
+            previous = self._recent.get(tier)
+            self._recent[tier] = seconds if previous is None else (
+                previous + self.smoothing * (seconds - previous)
+            )
+
+    def stats(self):
+        """Latência por tier (histograma + média recente)"""
+        with self._lock:
+            recent = dict(self._recent)
+        return {
+            tier: dict(self.histograms[tier].as_dict(), model=self.models.get(tier),
+                       recent_s=round(recent[tier], 3) if tier in recent else None)
+            for tier in TIER_ORDER
+        }
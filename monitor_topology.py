@@ -0,0 +1,295 @@
+"""
+Serviço de topologia de monitores com cache e limites de movimento pré-calculados
+"""
+import logging
+import re
+import shutil
+import subprocess
+import sys
+from collections import namedtuple
+
+logger = logging.getLogger('GeminiCat')
+
+# Área de trabalho de um monitor (sem barra de tarefas)
+MonitorArea = namedtuple('MonitorArea', 'left top right bottom primary')
+
+# Limites de movimento do pet dentro de um monitor
+MovementBounds = namedtuple('MovementBounds', 'min_x max_x min_y max_y')
+
+
+class WindowsMonitorBackend:
+    """Enumera monitores via EnumDisplayMonitors/GetMonitorInfoW"""
+    name = "win32"
+
+    def __init__(self):
+        import ctypes
+        from ctypes import wintypes
+
+        self._ctypes = ctypes
+        self._wintypes = wintypes
+        self._user32 = ctypes.windll.user32
+
+        class MONITORINFO(ctypes.Structure):
+            _fields_ = [
+                ("cbSize", wintypes.DWORD),
+                ("rcMonitor", wintypes.RECT),
+                ("rcWork", wintypes.RECT),
+                ("dwFlags", wintypes.DWORD)
+            ]
+
+        self._MONITORINFO = MONITORINFO
+        self._MonitorEnumProc = ctypes.WINFUNCTYPE(
+            ctypes.c_int, wintypes.HMONITOR, wintypes.HDC,
+            ctypes.POINTER(wintypes.RECT), wintypes.LPARAM
+        )
+
+    def signature(self):
+        """Assinatura barata da configuração atual (para o poll lento)"""
+        metrics = self._user32.GetSystemMetrics
+        work = self._wintypes.RECT()
+        SPI_GETWORKAREA = 0x0030
+        self._user32.SystemParametersInfoW(SPI_GETWORKAREA, 0, self._ctypes.byref(work), 0)
+        # SM_CMONITORS e SM_[XY]VIRTUALSCREEN / SM_C[XY]VIRTUALSCREEN
+        return (metrics(80), metrics(76), metrics(77), metrics(78), metrics(79),
+                work.left, work.top, work.right, work.bottom)
+
+    def enumerate(self):
+        """Obter a área de trabalho de todos os monitores"""
+        ctypes = self._ctypes
+        monitors = []
+        MONITORINFOF_PRIMARY = 1
+
+        def callback(hmonitor, hdc, rect, lparam):
+            info = self._MONITORINFO()
+            info.cbSize = ctypes.sizeof(self._MONITORINFO)
+            if self._user32.GetMonitorInfoW(hmonitor, ctypes.byref(info)):
+                work = info.rcWork
+                monitors.append(MonitorArea(
+                    work.left, work.top, work.right, work.bottom,
+                    bool(info.dwFlags & MONITORINFOF_PRIMARY)
+                ))
+            return 1
+
+        self._user32.EnumDisplayMonitors(None, None, self._MonitorEnumProc(callback), 0)
+        return monitors
+
+
+class WindowsDisplayHook:
+    """Avisos de mudança de ecrã do Windows na janela do Tk (subclass via comctl32)
+
+    WM_DISPLAYCHANGE (resolução, monitores ligados/desligados) e
+    WM_SETTINGCHANGE com SPI_SETWORKAREA (barra de tarefas) chegam à janela
+    de topo; `callback` corre depois no loop do Tk, fora do WndProc.
+    """
+    WM_SETTINGCHANGE = 0x001A
+    WM_DISPLAYCHANGE = 0x007E
+    SPI_SETWORKAREA = 0x002F
+
+    def __init__(self, window, callback):
+        import ctypes
+        from ctypes import wintypes
+
+        comctl32 = ctypes.windll.comctl32
+        lresult = ctypes.c_ssize_t
+        subclass_proc = ctypes.WINFUNCTYPE(
+            lresult, wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM,
+            ctypes.c_size_t, ctypes.c_size_t
+        )
+        comctl32.DefSubclassProc.restype = lresult
+        comctl32.DefSubclassProc.argtypes = (wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM)
+        comctl32.SetWindowSubclass.restype = wintypes.BOOL
+        comctl32.SetWindowSubclass.argtypes = (wintypes.HWND, subclass_proc, ctypes.c_size_t, ctypes.c_size_t)
+
+        def proc(hwnd, msg, wparam, lparam, subclass_id, ref_data):
+            if msg == self.WM_DISPLAYCHANGE or (msg == self.WM_SETTINGCHANGE and wparam == self.SPI_SETWORKAREA):
+                window.after_idle(callback)
+            return comctl32.DefSubclassProc(hwnd, msg, wparam, lparam)
+
+        self._proc = subclass_proc(proc)  # Referência mantida: o ctypes não a guarda
+        # Janela de topo do Tk (wrapper); instalar depois de overrideredirect, que a recria
+        hwnd = int(window.wm_frame(), 16)
+        if not comctl32.SetWindowSubclass(hwnd, self._proc, 1, 0):
+            raise OSError("SetWindowSubclass falhou")
+
+
+def watch_display_changes(window, callback):
+    """Chamar `callback` quando o sistema avisa de mudança de ecrã; None se não houver avisos (só poll)"""
+    if sys.platform != 'win32':
+        return None
+    try:
+        return WindowsDisplayHook(window, callback)
+    except Exception as e:
+        logger.warning(f"Avisos de mudança de ecrã indisponíveis: {e}")
+        return None
+
+
+class TkMonitorBackend:
+    """Fallback multiplataforma: xrandr em X11 ou dimensões do ecrã do Tk"""
+    name = "tk"
+
+    # Ex: " 0: +*eDP-1 1920/344x1080/194+0+0  eDP-1"
+    _XRANDR_LINE = re.compile(r'^\s*\d+:\s+\+?(\*?)\S+\s+(\d+)/\d+x(\d+)/\d+\+(-?\d+)\+(-?\d+)')
+
+    def __init__(self, window):
+        self.window = window
+        self._xrandr = shutil.which('xrandr') if sys.platform.startswith('linux') else None
+
+    def signature(self):
+        """Assinatura barata: dimensões do ecrã virtual reportadas pelo Tk"""
+        return (self.window.winfo_screenwidth(), self.window.winfo_screenheight(),
+                self.window.winfo_vrootwidth(), self.window.winfo_vrootheight())
+
+    def enumerate(self):
+        """Obter monitores via xrandr (se disponível) ou ecrã único do Tk"""
+        monitors = self._enumerate_xrandr() if self._xrandr else []
+        if monitors:
+            return monitors
+
+        return [MonitorArea(0, 0, self.window.winfo_screenwidth(),
+                            self.window.winfo_screenheight(), True)]
+
+    def _enumerate_xrandr(self):
+        try:
+            output = subprocess.run(
+                [self._xrandr, '--listmonitors'],
+                capture_output=True, text=True, timeout=2
+            ).stdout
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.debug(f"xrandr indisponível: {e}")
+            return []
+
+        monitors = []
+        for line in output.splitlines():
+            match = self._XRANDR_LINE.match(line)
+            if match:
+                primary, width, height, x, y = match.groups()
+                x, y = int(x), int(y)
+                monitors.append(MonitorArea(x, y, x + int(width), y + int(height), bool(primary)))
+
+        if monitors and not any(m.primary for m in monitors):
+            monitors[0] = monitors[0]._replace(primary=True)
+        return monitors
+
+
+class MonitorTopology:
+    """Cache da topologia de monitores com limites de movimento pré-calculados
+
+    Os limites só são recalculados em `invalidate()` (mudança de ecrã) ou
+    quando o poll lento deteta uma assinatura diferente. O caminho quente
+    do pet limita-se a ler o tuplo `primary_bounds`.
+    """
+
+    def __init__(self, window, sprite_size, zone_height, bottom_margin, backend=None):
+        self.window = window
+        self.sprite_size = sprite_size
+        self.zone_height = zone_height
+        self.bottom_margin = bottom_margin
+        self.backend = backend or self._select_backend(window)
+        self._listeners = []
+        self._signature = None
+
+        self.monitors = ()
+        self.bounds = ()
+        self.primary_index = 0
+        self.primary_bounds = MovementBounds(0, 0, 0, 0)
+        self.refresh()
+
+    @staticmethod
+    def _select_backend(window):
+        if sys.platform == 'win32':
+            try:
+                return WindowsMonitorBackend()
+            except Exception as e:
+                logger.warning(f"Backend Windows de monitores indisponível: {e}")
+        return TkMonitorBackend(window)
+
+    def add_listener(self, callback):
+        """Registar callback chamado com a topologia quando os monitores mudam"""
+        self._listeners.append(callback)
+
+    def compute_bounds(self, area):
+        """Calcular limites de movimento (zona inferior) para um monitor"""
+        min_y = area.bottom - self.zone_height
+        max_y = area.bottom - self.sprite_size - self.bottom_margin
+        return MovementBounds(area.left, area.right - self.sprite_size, min_y, max(min_y, max_y))
+
+    def refresh(self):
+        """Reenumerar monitores e recalcular limites; devolve True se mudou"""
+        # Em caso de erro fica a última assinatura obtida: o poll só tenta de novo se ela mudar
+        signature = self._signature
+        try:
+            signature = self.backend.signature()
+            monitors = tuple(self.backend.enumerate())
+        except Exception as e:
+            logger.error(f"Erro ao enumerar monitores ({self.backend.name}): {e}")
+            monitors = ()
+
+        if not monitors:
+            monitors = (MonitorArea(0, 0, self.window.winfo_screenwidth(),
+                                    self.window.winfo_screenheight(), True),)
+
+        self._signature = signature
+        if monitors == self.monitors:
+            return False
+
+        self.monitors = monitors
+        self.bounds = tuple(self.compute_bounds(area) for area in monitors)
+        self.primary_index = next((i for i, m in enumerate(monitors) if m.primary), 0)
+        self.primary_bounds = self.bounds[self.primary_index]
+
+        for area in monitors:
+            logger.debug(f"Monitor ({self.backend.name}) - Work area: {area.left},{area.top} to {area.right},{area.bottom}"
+                         f"{' (primário)' if area.primary else ''}")
+        return True
+
+    def invalidate(self, data=None):
+        """Forçar nova leitura (ex: evento de mudança de ecrã)"""
+        if self.refresh():
+            self._notify()
+
+    def poll(self):
+        """Poll lento: só reenumera se a assinatura barata mudou"""
+        try:
+            signature = self.backend.signature()
+        except Exception as e:
+            logger.debug(f"Erro na assinatura de monitores: {e}")
+            return
+
+        if signature != self._signature:
+            logger.info("Configuração de monitores alterada - a atualizar topologia")
+            self.invalidate()
+
+    def _notify(self):
+        for callback in self._listeners:
+            try:
+                callback(self)
+            except Exception as e:
+                logger.error(f"Erro no listener de topologia: {e}")
+
+    @property
+    def primary(self):
+        """Área de trabalho do monitor primário"""
+        return self.monitors[self.primary_index]
+
+    def monitor_index_at(self, x, y):
+        """Índice do monitor que contém o ponto (primário se nenhum)"""
+        for index, area in enumerate(self.monitors):
+            if area.left <= x < area.right and area.top <= y < area.bottom:
+                return index
+        return self.primary_index
+
+    def bounds_at(self, x, y):
+        """Limites de movimento do monitor que contém o ponto"""
+        return self.bounds[self.monitor_index_at(x, y)]
+
+    def as_dict(self, index=None):
+        """Info do monitor no formato antigo de get_primary_monitor_info"""
+        area = self.monitors[self.primary_index if index is None else index]
+        return {
+            'left': area.left,
+            'top': area.top,
+            'right': area.right,
+            'bottom': area.bottom,
+            'width': area.right - area.left,
+            'height': area.bottom - area.top
+        }
@@ -0,0 +1,215 @@
+"""
+Respostas locais sem API: índice BM25 sobre perguntas e respostas já
+recebidas e sobre um ficheiro de FAQ editável (`faq.json`)
+
+O índice invertido é atualizado incrementalmente a cada resposta nova;
+uma pesquisa percorre só as listas dos termos da pergunta.
+"""
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+logger = logging.getLogger('GeminiCat')
+
+_WORDS = re.compile(r'\w+')
+# Palavras demasiado comuns para distinguir perguntas (já sem acentos)
+STOPWORDS = frozenset(
+    'a o as os um uma uns umas de do da dos das em no na nos nas por para com sem e ou '
+    'que se me te lhe vos sao ser foi era ha mais menos muito ja nao sim eu tu ele ela '
+    'isto isso aquilo este esse essa ao aos pelo pela meu minha teu tua'.split()
+)
+
+
+def tokenize(text):
+    """Termos sem acentos nem stopwords (minúsculas)"""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return [word for word in _WORDS.findall(text) if word not in STOPWORDS]
+
+
+class BM25Index:
+    """Índice invertido com ranking BM25 e inserção/remoção incrementais
+
+    Cada posting guarda já a parte do BM25 que só depende do documento
+    (frequência normalizada pelo tamanho, com a média da altura da
+    inserção); a pesquisa só multiplica pelo idf. Termos frequentes não
+    trazem candidatos novos: só somam aos documentos que os termos raros
+    já encontraram.
+
+    Args:
+        k1, b: parâmetros BM25 (saturação de frequência e normalização por tamanho)
+        common_fraction: fração de documentos a partir da qual um termo conta como frequente
+    """
+
+    def __init__(self, k1=1.2, b=0.75, common_fraction=0.05):
+        self.k1 = k1
+        self.b = b
+        self.common_fraction = common_fraction
+        self.postings = {}  # termo -> {doc: peso do termo no documento}
+        self.lengths = {}  # doc -> nº de termos
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def add(self, doc, terms):
+        """Indexar documento (substitui o anterior com o mesmo id)"""
+        if doc in self.lengths:
+            self.remove(doc)
+        self.lengths[doc] = len(terms)
+        self._total_length += len(terms)
+        average = self._total_length / len(self.lengths) or 1.0
+        norm = self.k1 * (1 - self.b + self.b * len(terms) / average)
+        for term, frequency in Counter(terms).items():
+            self.postings.setdefault(term, {})[doc] = frequency * (self.k1 + 1) / (frequency + norm)
+
+    def remove(self, doc, terms=None):
+        """Retirar documento (com `terms` só percorre as listas desses termos)"""
+        length = self.lengths.pop(doc, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in (set(terms) if terms is not None else list(self.postings)):
+            docs = self.postings.get(term)
+            if docs is not None and docs.pop(doc, None) is not None and not docs:
+                del self.postings[term]
+
+    def search(self, terms, limit=1):
+        """[(score, termos encontrados, doc)] dos melhores documentos para os termos"""
+        count = len(self.lengths)
+        lists = sorted((docs for docs in map(self.postings.get, set(terms)) if docs), key=len)
+        if not lists:
+            return []
+        common = max(32, self.common_fraction * count)
+        scores = {}
+        matched = Counter()
+        for docs in lists:
+            idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            if len(docs) <= common or not scores:
+                items = docs.items()
+            else:
+                # Termo frequente: só os candidatos já encontrados
+                items = [(doc, docs[doc]) for doc in scores if doc in docs]
+            for doc, weight in items:
+                scores[doc] = scores.get(doc, 0.0) + idf * weight
+                matched[doc] += 1
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(score, matched[doc], doc) for doc, score in best]
+
+
+class OfflineResponder:
+    """Melhor resposta guardada (FAQ ou conversas anteriores) para uma pergunta
+
+    Cada documento é uma pergunta com a sua resposta; os termos da
+    pergunta contam a dobrar. Perguntas repetidas ficam só com a
+    resposta mais recente. O FAQ é relido quando o ficheiro muda.
+
+    Args:
+        faq_path: JSON com [{"perguntas": [...], "resposta": "..."}]
+        min_score: score BM25 mínimo para aceitar uma resposta
+        min_coverage: fração mínima dos termos da pergunta presentes na resposta escolhida
+        max_answers: respostas de conversas mantidas no índice (as mais antigas saem)
+    """
+
+    def __init__(self, faq_path='faq.json', min_score=1.5, min_coverage=0.5, max_answers=5000):
+        self.faq_path = faq_path
+        self.min_score = min_score
+        self.min_coverage = min_coverage
+        self.max_answers = max_answers
+        self.index = BM25Index()
+        self.answers = {}  # doc -> (resposta, termos)
+        self._by_question = {}  # pergunta normalizada -> doc (conversas)
+        self._faq_docs = []
+        self._faq_mtime = None
+        self._next_doc = 0
+        self._lock = threading.Lock()
+
+    def load(self, pairs=()):
+        """Indexar FAQ e pares (pergunta, resposta) já guardados, do mais antigo para o mais recente"""
+        with self._lock:
+            self._reload_faq()
+            for question, answer in pairs:
+                self._add(question, answer)
+        return self
+
+    def add(self, question, answer):
+        """Indexar resposta nova (thread de trabalho)"""
+        with self._lock:
+            self._add(question, answer)
+
+    def _add(self, question, answer):
+        question_terms = tokenize(question)
+        if not question_terms or not answer:
+            return
+        key = ' '.join(question_terms)
+        previous = self._by_question.pop(key, None)
+        if previous is not None:
+            self._remove(previous)
+        doc = self._insert(question_terms, answer)
+        self._by_question[key] = doc
+        # Limite de tamanho: sair a pergunta mais antiga (dict mantém a ordem de inserção)
+        while len(self._by_question) > self.max_answers:
+            oldest = next(iter(self._by_question))
+            self._remove(self._by_question.pop(oldest))
+
+    def _insert(self, question_terms, answer):
+        doc = self._next_doc
+        self._next_doc += 1
+        terms = question_terms * 2 + tokenize(answer)
+        self.index.add(doc, terms)
+        self.answers[doc] = (answer, terms)
+        return doc
+
+    def _remove(self, doc):
+        _, terms = self.answers.pop(doc)
+        self.index.remove(doc, terms)
+
+    def _reload_faq(self):
+        """(Re)indexar o FAQ se o ficheiro mudou desde a última leitura"""
+        try:
+            mtime = os.stat(self.faq_path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._faq_mtime:
+            return
+        self._faq_mtime = mtime
+        for doc in self._faq_docs:
+            self._remove(doc)
+        self._faq_docs = []
+        if mtime is None:
+            return
+
+        try:
+            with open(self.faq_path, encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"FAQ {self.faq_path} inválido: {e}")
+            return
+        for entry in entries:
+            answer = entry.get('resposta')
+            for question in entry.get('perguntas', ()):
+                question_terms = tokenize(question)
+                if question_terms and answer:
+                    self._faq_docs.append(self._insert(question_terms, answer))
+        logger.debug(f"FAQ carregado: {len(self._faq_docs)} perguntas")
+
+    def answer(self, question):
+        """Resposta com melhor score BM25, ou None se nenhuma for suficientemente próxima"""
+        terms = tokenize(question)
+        if not terms:
+            return None
+        with self._lock:
+            self._reload_faq()
+            hits = self.index.search(terms)
+            if not hits:
+                return None
+            score, matched, doc = hits[0]
+            if score < self.min_score or matched < self.min_coverage * len(set(terms)):
+                return None
+            return self.answers[doc][0]
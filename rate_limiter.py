@@ -0,0 +1,232 @@
+"""
+Limitação de pedidos do lado do cliente: token buckets por rota (com e sem
+pesquisa), backoff exponencial com jitter em 429/503 e degradação de rota
+"""
+import logging
+import random
+import re
+import threading
+import time
+
+from chat_workers import RequestCancelled, RequestTimeout
+
+logger = logging.getLogger('GeminiCat')
+
+GROUNDED = "grounded"
+PLAIN = "plain"
+
+RETRYABLE_CODES = frozenset({429, 503})
+_DURATION_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*s?\s*$')
+
+
+class TokenBucket:
+    """Token bucket clássico: `rate_per_minute` de reposição, até `burst` acumulados"""
+
+    def __init__(self, rate_per_minute, burst):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """Consumir um token; devolve 0 se conseguiu, senão segundos até haver um"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            if self.rate <= 0:
+                return float('inf')
+            return (1 - self._tokens) / self.rate
+
+    def refund(self):
+        """Devolver um token reservado e não usado (sem passar de `burst`)"""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    @property
+    def available(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return int(self._tokens)
+
+
+def parse_duration(value):
+    """Converter "17s", "2.5" ou 3 em segundos (None se inválido)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = _DURATION_PATTERN.match(value)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def error_status(error):
+    """Extrair (código HTTP, retry-after em segundos) de uma exceção do SDK ou backend
+
+    Reconhece `code`/`status_code`, o atributo `retry_after`, o header
+    Retry-After da resposta e o `retryDelay` de google.rpc.RetryInfo.
+    """
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    retry_after = parse_duration(getattr(error, 'retry_after', None))
+
+    if retry_after is None:
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None)
+        if headers is not None:
+            try:
+                retry_after = parse_duration(headers.get('retry-after'))
+            except Exception:
+                pass
+
+    if retry_after is None:
+        details = getattr(error, 'details', None)
+        if isinstance(details, dict):
+            details = details.get('error', details).get('details', ())
+        if isinstance(details, (list, tuple)):
+            for detail in details:
+                if isinstance(detail, dict) and 'retryDelay' in detail:
+                    retry_after = parse_duration(detail['retryDelay'])
+                    break
+
+    return (code if isinstance(code, int) else None), retry_after
+
+
+def backoff_delay(attempt, base, cap):
+    """Backoff exponencial com "full jitter" (tentativa 0 -> até `base` segundos)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RateLimitScheduler:
+    """Decide a rota de cada pedido e repete-o com backoff em 429/503
+
+    Ordem de degradação: com pesquisa -> sem pesquisa -> (None) resposta
+    local. Um 429 põe a rota em pausa até ao retry-after indicado.
+    """
+
+    def __init__(self, grounded_rpm, plain_rpm, burst=3, max_wait=10.0,
+                 retry_attempts=3, retry_base_delay=1.0, retry_max_delay=30.0):
+        self.buckets = {
+            GROUNDED: TokenBucket(grounded_rpm, burst),
+            PLAIN: TokenBucket(plain_rpm, burst)
+        }
+        self.max_wait = max_wait
+        self.retry_attempts = retry_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._cooldown_until = {GROUNDED: 0.0, PLAIN: 0.0}
+        self._lock = threading.Lock()
+
+    def cooldown(self, route):
+        """Segundos de pausa que restam à rota"""
+        with self._lock:
+            return max(0.0, self._cooldown_until[route] - time.monotonic())
+
+    def _pause(self, route, seconds):
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self._cooldown_until[route]:
+                self._cooldown_until[route] = until
+        logger.info(f"Rota {route} em pausa por {seconds:.1f}s")
+
+    def _wait(self, request, seconds):
+        """Esperar (interrompível por cancelamento); False se cancelado"""
+        return not request.token.wait(seconds)
+
+    def try_acquire(self, route):
+        """Reservar quota da rota sem esperar nem degradar; False se não houver"""
+        return not self.cooldown(route) and self.buckets[route].try_acquire() == 0
+
+    def refund(self, route):
+        """Devolver quota reservada com `try_acquire` que acabou por não ser usada"""
+        self.buckets[route].refund()
+
+    def acquire(self, grounded, request):
+        """Reservar quota e devolver a rota (GROUNDED/PLAIN) ou None se não houver
+
+        Sem quota de pesquisa cai para PLAIN; sem quota nenhuma espera até
+        `max_wait` (e o prazo do pedido) antes de desistir.
+        """
+        if grounded and not self.cooldown(GROUNDED):
+            if self.buckets[GROUNDED].try_acquire() == 0:
+                return GROUNDED
+            logger.info("Quota de pesquisa esgotada - a responder sem Google Search")
+
+        waited = 0.0
+        while True:
+            wait = self.cooldown(PLAIN) or self.buckets[PLAIN].try_acquire()
+            if wait == 0:
+                return PLAIN
+
+            remaining = request.remaining()
+            budget = self.max_wait - waited
+            if remaining is not None:
+                budget = min(budget, remaining)
+            if wait > budget or not self._wait(request, wait):
+                return None
+            waited += wait
+
+    def run(self, route, call, request, can_retry=None):
+        """Executar `call(route)` com repetições em 429/503
+
+        Um 429 com pesquisa degrada para sem pesquisa (se houver quota); o
+        resto espera com backoff, respeitando o retry-after e o prazo.
+        `can_retry()` permite recusar repetições (ex: resposta parcial já visível).
+        Cada repetição reserva quota da rota como o pedido original. Se o
+        pedido for cancelado ou o prazo acabar durante a espera, sai com
+        RequestCancelled ou RequestTimeout em vez do erro da API.
+        """
+        attempt = 0
+        while True:
+            try:
+                return call(route)
+            except Exception as e:
+                code, retry_after = error_status(e)
+                if code not in RETRYABLE_CODES or attempt >= self.retry_attempts:
+                    raise
+                if can_retry is not None and not can_retry():
+                    raise
+
+                delay = backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                if code == 429:
+                    self._pause(route, delay)
+
+                attempt += 1
+                if route == GROUNDED and self.try_acquire(PLAIN):
+                    logger.info(f"Erro {code} com pesquisa - a repetir sem Google Search")
+                    route = PLAIN
+                    continue
+
+                logger.info(f"Erro {code} - nova tentativa em {delay:.1f}s ({attempt}/{self.retry_attempts})")
+                self._sleep(request, delay)
+                # Cada tentativa é um pedido novo à API: gasta quota como o primeiro
+                self._take(route, request, e)
+
+    def _sleep(self, request, seconds):
+        """Esperar antes de repetir; RequestTimeout se passa do prazo, RequestCancelled se cancelado"""
+        remaining = request.remaining()
+        if remaining is not None and seconds > remaining:
+            raise RequestTimeout(f"Nova tentativa em {seconds:.1f}s passa do prazo do pedido")
+        if not self._wait(request, seconds):
+            raise RequestCancelled()
+
+    def _take(self, route, request, error):
+        """Reservar quota da rota para uma repetição, esperando até `max_wait` (senão volta a lançar `error`)"""
+        waited = 0.0
+        while True:
+            wait = self.cooldown(route) or self.buckets[route].try_acquire()
+            if wait == 0:
+                return
+            if waited + wait > self.max_wait:
+                raise error
+            self._sleep(request, wait)
+            waited += wait
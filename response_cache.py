@@ -0,0 +1,274 @@
+"""
+Cache local de respostas (SQLite) com TTL, coalescência de pedidos em curso
+e lookup opcional por semelhança (TF-IDF de n-gramas de caracteres)
+"""
+import hashlib
+import logging
+import math
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+logger = logging.getLogger('GeminiCat')
+
+# Só pontuação decorativa: aspas, ¿¡ e sinais de fim de frase seguidos de espaço ou no fim
+# (operadores e símbolos como + - * / = # fazem parte da pergunta: "1 + 2" ≠ "1 - 2", "C++" ≠ "C")
+_PUNCTUATION = re.compile(r'["\'`“”‘’«»¿¡]|[?!.,;:…]+(?=\s|$)')
+_WHITESPACE = re.compile(r'\s+')
+_EXACT_TOKENS = re.compile(r'\d+(?:[.,]\d+)*|[^\w\s]')
+
+
+def normalize_prompt(text):
+    """Normalizar pergunta: minúsculas, sem pontuação decorativa e espaços repetidos"""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = _PUNCTUATION.sub(' ', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def exact_tokens(text):
+    """Números e símbolos da pergunta normalizada: têm de coincidir numa pergunta semelhante"""
+    return _EXACT_TOKENS.findall(text)
+
+
+def char_ngrams(text, n=3):
+    """Contagem de n-gramas de caracteres (com padding nas margens)"""
+    padded = f" {text} "
+    return Counter(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+
+
+class _InFlight:
+    """Pedido em curso partilhado por pedidos idênticos"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SimilarityIndex:
+    """Índice invertido de n-gramas com pesos TF-IDF (tudo em memória)"""
+
+    REFRESH_FRACTION = 0.1  # Fração de documentos mudados que obriga a recalcular todas as normas
+
+    def __init__(self):
+        self._docs = {}  # key -> (scope, Counter de n-gramas)
+        self._postings = {}  # n-grama -> set(keys)
+        self._norms = {}  # key -> norma do vetor TF-IDF
+        self._stale = 0  # documentos adicionados/removidos desde o último recálculo das normas
+
+    def add(self, key, scope, normalized):
+        if key in self._docs:
+            self.remove(key)
+        grams = char_ngrams(normalized)
+        self._docs[key] = (scope, grams)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(key)
+        self._norms[key] = self._norm(grams)
+        self._stale += 1
+
+    def remove(self, key):
+        entry = self._docs.pop(key, None)
+        if entry is None:
+            return
+        for gram in entry[1]:
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+        self._norms.pop(key, None)
+        self._stale += 1
+
+    def _idf(self, gram):
+        return math.log((1 + len(self._docs)) / (1 + len(self._postings.get(gram, ())))) + 1
+
+    def _norm(self, grams):
+        return math.sqrt(sum((tf * self._idf(g)) ** 2 for g, tf in grams.items()))
+
+    def _refresh_norms(self):
+        """Recalcular as normas com o IDF atual só depois de mudar uma fração dos documentos
+
+        Cada documento novo já tem a sua norma; as outras ficam com o IDF de
+        quando foram calculadas, que pouco muda enquanto o índice muda pouco.
+        """
+        if self._stale <= self.REFRESH_FRACTION * len(self._docs):
+            return
+        self._norms = {key: self._norm(grams) for key, (_, grams) in self._docs.items()}
+        self._stale = 0
+
+    def best_match(self, scope, normalized):
+        """Devolver (key, semelhança coseno) do documento mais parecido no mesmo âmbito"""
+        if not self._docs:
+            return None, 0.0
+        self._refresh_norms()
+
+        query = char_ngrams(normalized)
+        weights = {g: tf * self._idf(g) for g, tf in query.items()}
+        query_norm = math.sqrt(sum(w * w for w in weights.values()))
+        if not query_norm:
+            return None, 0.0
+
+        scores = {}
+        for gram, weight in weights.items():
+            idf = self._idf(gram)
+            for key in self._postings.get(gram, ()):
+                doc_scope, grams = self._docs[key]
+                if doc_scope == scope:
+                    scores[key] = scores.get(key, 0.0) + weight * grams[gram] * idf
+
+        best_key, best_score = None, 0.0
+        for key, dot in scores.items():
+            score = dot / (query_norm * self._norms[key])
+            if score > best_score:
+                best_key, best_score = key, score
+        return best_key, best_score
+
+
+class ResponseCache:
+    """Cache persistente de respostas indexada por pergunta normalizada + contexto"""
+
+    def __init__(self, path='response_cache.sqlite3', grounded_ttl=3600, plain_ttl=7 * 86400,
+                 similarity_threshold=0.9, max_entries=2000):
+        self.grounded_ttl = grounded_ttl
+        self.plain_ttl = plain_ttl
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                normalized TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                expires REAL NOT NULL
+            )
+        """)
+        self._db.execute("DELETE FROM responses WHERE expires < ?", (time.time(),))
+        self._db.commit()
+
+        self.similarity = None
+        if similarity_threshold:
+            self.similarity = SimilarityIndex()
+            for key, normalized, scope in self._db.execute("SELECT key, normalized, scope FROM responses"):
+                self.similarity.add(key, scope, normalized)
+
+    @staticmethod
+    def _scope(context, grounded):
+        return f"{'g' if grounded else 'p'}:{context}"
+
+    @staticmethod
+    def _key(normalized, scope):
+        return hashlib.sha1(f"{scope}\n{normalized}".encode('utf-8')).hexdigest()
+
+    def get(self, prompt, context="", grounded=False):
+        """Resposta em cache (exata ou semelhante) ou None"""
+        normalized = normalize_prompt(prompt)
+        scope = self._scope(context, grounded)
+        key = self._key(normalized, scope)
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, expires FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None and self.similarity is not None:
+                similar_key, score = self.similarity.best_match(scope, normalized)
+                if similar_key and score >= self.similarity_threshold:
+                    similar = self._db.execute(
+                        "SELECT response, expires, normalized FROM responses WHERE key = ?", (similar_key,)
+                    ).fetchone()
+                    # "1234 + 5678" e "1234 - 5678" são parecidos em n-gramas mas não são a mesma pergunta
+                    if similar is not None and exact_tokens(similar[2]) == exact_tokens(normalized):
+                        logger.debug(f"Cache: pergunta semelhante (coseno {score:.2f})")
+                        key = similar_key
+                        row = similar[:2]
+
+            if row is None:
+                return None
+            response, expires = row
+            if expires < time.time():
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                if self.similarity is not None:
+                    self.similarity.remove(key)
+                return None
+            return response
+
+    def put(self, prompt, context, grounded, response):
+        """Guardar resposta com TTL curto (grounded) ou longo (sem pesquisa)"""
+        if not response:
+            return
+        normalized = normalize_prompt(prompt)
+        scope = self._scope(context, grounded)
+        key = self._key(normalized, scope)
+        now = time.time()
+        ttl = self.grounded_ttl if grounded else self.plain_ttl
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, normalized, scope, response, now, now + ttl)
+            )
+            self._evict()
+            self._db.commit()
+            if self.similarity is not None:
+                self.similarity.add(key, scope, normalized)
+
+    def _evict(self):
+        """Remover entradas mais antigas acima do limite (com lock)"""
+        count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        evicted = self._db.execute(
+            "SELECT key FROM responses ORDER BY created LIMIT ?", (count - self.max_entries,)
+        ).fetchall()
+        self._db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        if self.similarity is not None:
+            for (key,) in evicted:
+                self.similarity.remove(key)
+
+    def get_or_compute(self, prompt, context, grounded, compute):
+        """Cache hit, esperar por pedido idêntico em curso, ou calcular e guardar
+
+        `compute()` devolve (resposta, grounded): a resposta fica guardada na
+        rota que de facto respondeu, que pode não ser a pedida (ex: pesquisa
+        degradada para sem pesquisa num 429).
+
+        Returns:
+            tuple: (str: resposta, bool: veio da cache/pedido partilhado)
+        """
+        cached = self.get(prompt, context, grounded)
+        if cached is not None:
+            return cached, True
+
+        key = self._key(normalize_prompt(prompt), self._scope(context, grounded))
+        with self._lock:
+            inflight = self._inflight.get(key)
+            owner = inflight is None
+            if owner:
+                inflight = self._inflight[key] = _InFlight()
+
+        if not owner:
+            inflight.done.wait()
+            if inflight.error is not None:
+                raise inflight.error
+            return inflight.result, True
+
+        try:
+            inflight.result, answered_grounded = compute()
+            self.put(prompt, context, answered_grounded, inflight.result)
+            return inflight.result, False
+        except Exception as e:
+            inflight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.done.set()
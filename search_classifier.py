@@ -0,0 +1,303 @@
+"""
+Classificador local para decidir o Google Search grounding
+
+Regressão logística sobre n-gramas de caracteres com hashing,
+treinada a partir do registo de decisões de routing e das correções do
+utilizador (/pesquisa, /sempesquisa). Requer apenas NumPy; sem ficheiro de
+pesos (ou sem NumPy) o chat usa a heurística de should_activate_search.
+
+Uso:
+    python search_classifier.py train [--log routing_log.jsonl] [--out search_classifier.npz]
+    python search_classifier.py eval [--log routing_log.jsonl]
+"""
+import argparse
+import json
+import logging
+import math
+import re
+import threading
+import time
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # Classificador opcional
+    np = None
+
+logger = logging.getLogger('GeminiCat')
+
+DEFAULT_DIMS = 1 << 14
+NGRAM_RANGE = (2, 4)
+SCORE_RANGE = (-8, 10)
+CORRECTION_WEIGHT = 5.0
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+# Constantes do hash polinomial dos n-gramas (estável entre processos, ao contrário de hash())
+_HASH_BASE = 1000003
+_HASH_MIX = 0x9E3779B97F4A7C15
+
+
+def feature_indices(text, score=None, dims=DEFAULT_DIMS, ngram_range=NGRAM_RANGE):
+    """Índices únicos (array ordenado) dos n-gramas de caracteres e do score heurístico
+
+    Hash polinomial vetorizado sobre os code points: O(n) operações NumPy
+    por tamanho de n-grama, sem ciclo Python por carácter.
+    """
+    text = f" {_WHITESPACE.sub(' ', text.lower()).strip()} "
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    shift = np.uint64(64 - (dims.bit_length() - 1))
+    parts = []
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        count = len(codes) - n + 1
+        if count <= 0:
+            continue
+        hashes = np.full(count, n, dtype=np.uint64)
+        for k in range(n):
+            hashes = hashes * np.uint64(_HASH_BASE) + codes[k:k + count]
+        parts.append((hashes * np.uint64(_HASH_MIX)) >> shift)
+    if score is not None:
+        score = min(max(score, SCORE_RANGE[0]), SCORE_RANGE[1])
+        parts.append(np.array([zlib.crc32(f"\0score{score}".encode('ascii')) & (dims - 1)], dtype=np.uint64))
+    if not parts:
+        return np.zeros(0, dtype=np.int64)
+    return np.unique(np.concatenate(parts)).astype(np.int64)
+
+
+class SearchClassifier:
+    """Regressão logística esparsa (pesos num vetor NumPy de `dims` floats)"""
+
+    def __init__(self, weights, bias=0.0, threshold=0.5):
+        self.weights = weights
+        self.bias = float(bias)
+        self.threshold = float(threshold)
+        self.dims = len(weights)
+
+    @classmethod
+    def load(cls, path):
+        """Carregar pesos (.npz); None se não houver NumPy ou ficheiro válido"""
+        if np is None:
+            logger.info("NumPy não instalado - routing de pesquisa pela heurística")
+            return None
+        try:
+            with np.load(path) as data:
+                classifier = cls(data['weights'].astype(np.float32), float(data['bias']), float(data['threshold']))
+            logger.info(f"Classificador de pesquisa carregado: {path}")
+            return classifier
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Erro ao carregar classificador de pesquisa: {e} - usando heurística")
+            return None
+
+    def save(self, path):
+        np.savez(path, weights=self.weights, bias=self.bias, threshold=self.threshold)
+
+    def probability(self, text, score=None):
+        """Probabilidade de a mensagem precisar de pesquisa"""
+        indices = feature_indices(text, score, self.dims)
+        if not len(indices):
+            return 1 / (1 + math.exp(-self.bias))
+        logit = float(self.weights[indices].sum()) / math.sqrt(len(indices)) + self.bias
+        return 1 / (1 + math.exp(-max(-30.0, min(30.0, logit))))
+
+    def predict(self, text, score=None):
+        """(bool: ativar pesquisa, float: probabilidade)"""
+        probability = self.probability(text, score)
+        return probability >= self.threshold, probability
+
+    @classmethod
+    def train(cls, examples, dims=DEFAULT_DIMS, epochs=300, learning_rate=20.0, l2=1e-4):
+        """Treinar com gradiente descendente (batch completo, classes equilibradas)
+
+        Args:
+            examples: lista de (texto, score, label 0/1, peso)
+        """
+        rows, cols = [], []
+        labels = np.zeros(len(examples), dtype=np.float64)
+        sample_weights = np.zeros(len(examples), dtype=np.float64)
+        values = np.zeros(len(examples), dtype=np.float64)
+        for row, (text, score, label, weight) in enumerate(examples):
+            indices = feature_indices(text, score, dims)
+            rows.append(np.full(len(indices), row, dtype=np.int64))
+            cols.append(indices)
+            labels[row] = label
+            sample_weights[row] = weight
+            values[row] = 1 / math.sqrt(len(indices)) if len(indices) else 0.0
+        rows = np.concatenate(rows)
+        cols = np.concatenate(cols)
+
+        # Equilibrar classes (grounded costuma ser minoria)
+        for label in (0, 1):
+            mask = labels == label
+            total = sample_weights[mask].sum()
+            if total:
+                sample_weights[mask] *= sample_weights.sum() / (2 * total)
+        sample_weights /= sample_weights.sum()
+
+        weights = np.zeros(dims, dtype=np.float64)
+        bias = 0.0
+        row_values = values[rows]
+        for _ in range(epochs):
+            logits = np.bincount(rows, weights=weights[cols] * row_values, minlength=len(examples)) + bias
+            errors = (1 / (1 + np.exp(-np.clip(logits, -30, 30))) - labels) * sample_weights
+            gradient = np.bincount(cols, weights=errors[rows] * row_values, minlength=dims)
+            weights -= learning_rate * (gradient + l2 * weights)
+            bias -= learning_rate * errors.sum()
+
+        return cls(weights.astype(np.float32), bias)
+
+
+class RoutingLog:
+    """Registo JSONL das decisões de routing e correções do utilizador"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _append(self, record):
+        record['ts'] = round(time.time(), 3)
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+            except OSError as e:
+                logger.debug(f"Erro ao escrever registo de routing: {e}")
+
+    def decision(self, message, score, heuristic, probability, grounded):
+        self._append({
+            'message': message, 'score': score, 'heuristic': heuristic,
+            'probability': None if probability is None else round(probability, 4),
+            'grounded': grounded
+        })
+
+    def correction(self, message, score, grounded):
+        self._append({'message': message, 'score': score, 'label': grounded, 'correction': True})
+
+
+def load_examples(path):
+    """Exemplos (texto, score, label, peso, heurística) a partir do registo
+
+    A última correção de uma mensagem prevalece sobre as decisões registadas.
+    """
+    examples = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            message = record.get('message')
+            if not message:
+                continue
+            previous = examples.get(message)
+            if record.get('correction'):
+                heuristic = previous[4] if previous else None
+                examples[message] = (message, record['score'], int(record['label']), CORRECTION_WEIGHT, heuristic)
+            elif previous is None or previous[3] != CORRECTION_WEIGHT:
+                examples[message] = (message, record['score'], int(record['heuristic']), 1.0, record['heuristic'])
+    return list(examples.values())
+
+
+FOLDS = 5
+
+
+def _fold(message):
+    """Partição determinística para validação cruzada"""
+    return zlib.crc32(message.encode('utf-8')) % FOLDS
+
+
+def _is_correction(example):
+    return example[3] == CORRECTION_WEIGHT
+
+
+def _metrics(labels, predictions):
+    tp = sum(1 for y, p in zip(labels, predictions) if y and p)
+    fp = sum(1 for y, p in zip(labels, predictions) if not y and p)
+    fn = sum(1 for y, p in zip(labels, predictions) if y and not p)
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return precision, recall, tp + fp
+
+
+def evaluate(examples):
+    """Comparar classificador e heurística nas correções do utilizador
+
+    Só as correções (/pesquisa, /sempesquisa) têm label humano: o resto do
+    registo são decisões da própria heurística, e medir a heurística (ou um
+    classificador treinado a imitá-la) contra elas é circular. Validação
+    cruzada em FOLDS partições: cada exemplo é previsto por um classificador
+    treinado sem ele. As correções tendem a ser casos em que o routing
+    falhou, por isso os números servem para comparar os dois, não como
+    precisão absoluta.
+    """
+    predicted = {}
+    for fold in range(FOLDS):
+        train_set = [e for e in examples if _fold(e[0]) != fold]
+        test_set = [e for e in examples if _fold(e[0]) == fold]
+        if not train_set or not test_set:
+            continue
+        classifier = SearchClassifier.train([e[:4] for e in train_set])
+        for e in test_set:
+            predicted[e[0]] = classifier.predict(e[0], e[1])[0]
+    if not predicted:
+        print("Exemplos insuficientes para avaliação")
+        return
+
+    corrections = [e for e in examples if _is_correction(e) and e[0] in predicted]
+    logged = [e for e in examples if not _is_correction(e) and e[0] in predicted]
+    print(f"Exemplos: {len(examples)} ({len(corrections)} correções do utilizador, "
+          f"{len(logged)} decisões da heurística)")
+
+    if corrections:
+        labels = [e[2] for e in corrections]
+        classifier_predictions = [predicted[e[0]] for e in corrections]
+        heuristic = [bool(e[4]) if e[4] is not None else e[1] >= 3 for e in corrections]
+        print(f"Correções do utilizador (labels humanos, {FOLDS}-fold):")
+        for name, predictions in (("heurística", heuristic), ("classificador", classifier_predictions)):
+            precision, recall, grounded = _metrics(labels, predictions)
+            print(f"{name:>13}: precisão {precision:.2f}  recall {recall:.2f}  chamadas com pesquisa {grounded}")
+        heuristic_calls = sum(heuristic)
+        if heuristic_calls:
+            print(f"Poupança em chamadas com pesquisa: {(1 - sum(classifier_predictions) / heuristic_calls) * 100:.0f}%")
+    else:
+        print("Sem correções do utilizador: não há labels humanos para medir a qualidade do routing "
+              "(usa /pesquisa e /sempesquisa no chat)")
+
+    if logged:
+        agreement = sum(1 for e in logged if predicted[e[0]] == bool(e[2])) / len(logged)
+        print(f"Decisões da heurística: classificador concorda em {agreement * 100:.0f}% "
+              f"(circular - os labels são a própria heurística, não mede qualidade)")
+
+    started = time.perf_counter()
+    for e in examples:
+        classifier.predict(e[0], e[1])
+    print(f"Latência: {(time.perf_counter() - started) / len(examples) * 1e6:.1f} µs/mensagem")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classificador local de routing de pesquisa")
+    parser.add_argument("command", choices=("train", "eval"))
+    parser.add_argument("--log", default="routing_log.jsonl")
+    parser.add_argument("--out", default="search_classifier.npz")
+    args = parser.parse_args()
+
+    if np is None:
+        parser.error("é necessário NumPy (pip install numpy)")
+
+    examples = load_examples(args.log)
+    if args.command == "eval":
+        evaluate(examples)
+        return
+
+    if len({e[2] for e in examples}) < 2:
+        parser.error("o registo precisa de exemplos com e sem pesquisa")
+    classifier = SearchClassifier.train([e[:4] for e in examples])
+    classifier.save(args.out)
+    print(f"Classificador treinado com {len(examples)} exemplos -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
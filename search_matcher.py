@@ -0,0 +1,96 @@
+"""
+Matcher de keywords compilado: todos os conjuntos de padrões numa só regex,
+uma passagem pelo texto devolve todas as ocorrências (com sobreposições)
+"""
+import re
+from collections import namedtuple
+
+# Ocorrência de um padrão: posição [start, end), categorias e se coincide com palavras inteiras
+Hit = namedtuple('Hit', 'start end pattern categories whole_word')
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+def _trie_regex(patterns):
+    """Regex em forma de trie (ex: onde(?: posso| comprar)?) - o match é o padrão mais longo"""
+    trie = {}
+    for pattern in patterns:
+        node = trie
+        for char in pattern:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        terminal = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if terminal:
+            return f'(?:{body})?'
+        return body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Procura simultânea de vários conjuntos de padrões (substrings)
+
+    A regex `(?=(trie))` testa cada posição uma vez e captura o padrão mais
+    longo que começa aí; os padrões mais curtos na mesma posição (prefixos
+    do mais longo) vêm de uma tabela pré-calculada, por isso todas as
+    ocorrências são encontradas tal como com `pattern in text` um a um.
+    """
+
+    def __init__(self, pattern_sets):
+        categories = {}
+        for category, patterns in pattern_sets.items():
+            for pattern in patterns:
+                if pattern:
+                    categories.setdefault(pattern, []).append(category)
+        self.categories = {pattern: tuple(cats) for pattern, cats in categories.items()}
+
+        # Padrão mais longo numa posição -> todos os padrões que são seus prefixos
+        self._prefixes = {
+            pattern: tuple(sorted((p for p in self.categories if pattern.startswith(p)), key=len))
+            for pattern in self.categories
+        }
+        self._regex = re.compile(f'(?=({_trie_regex(self.categories)}))') if self.categories else None
+
+    def find_all(self, text):
+        """Todas as ocorrências de todos os padrões, por ordem de posição"""
+        if self._regex is None:
+            return []
+        hits = []
+        length = len(text)
+        for match in self._regex.finditer(text):
+            start = match.start()
+            before_ok = start == 0 or not _is_word_char(text[start - 1])
+            for pattern in self._prefixes[match.group(1)]:
+                end = start + len(pattern)
+                whole_word = before_ok and (end == length or not _is_word_char(text[end]))
+                hits.append(Hit(start, end, pattern, self.categories[pattern], whole_word))
+        return hits
+
+    def first_ends(self, text):
+        """Padrões presentes -> fim da primeira ocorrência (uma passagem, sem construir Hits)"""
+        if self._regex is None:
+            return {}
+        ends = {}
+        for match in self._regex.finditer(text):
+            start = match.start()
+            for pattern in self._prefixes[match.group(1)]:
+                if pattern not in ends:
+                    ends[pattern] = start + len(pattern)
+        return ends
+
+    def present(self, text):
+        """Conjunto de padrões presentes no texto (sem posições - caminho rápido)"""
+        if self._regex is None:
+            return set()
+        found = set()
+        for longest in set(self._regex.findall(text)):
+            found.update(self._prefixes[longest])
+        return found
@@ -0,0 +1,134 @@
+"""
+Cache de contexto com o backend falso: criação única do prefixo, renovação
+e recriação quando expira, e volta ao envio inline quando a cache falha
+
+Uso:
+    python -m unittest test_context_cache
+"""
+import time
+import unittest
+
+from context_cache import ContextCache
+from conversation_memory import make_turn
+from llm_backend import BackendError, FakeBackend
+
+MODEL = "gemini-2.5-flash"
+SYSTEM = "És um gato que responde a perguntas."
+
+
+class SyncContextCache(ContextCache):
+    """Criação, renovação e remoção no próprio thread, para os testes serem determinísticos"""
+
+    def _background(self, target, *args):
+        target(*args)
+
+
+class FailingBackend(FakeBackend):
+    def __init__(self):
+        super().__init__(latency_ms=0, chunk_ms=0)
+        self.create_calls = 0
+
+    def create_cache(self, model, contents, system_instruction=None, ttl=600):
+        self.create_calls += 1
+        raise BackendError(400, "Cached content is too small (simulado)")
+
+
+def conversation(turns):
+    roles = ("user", "model")
+    return [make_turn(roles[i % 2], f"mensagem {i} sobre gatos, teclados e o sol da tarde") for i in range(turns)]
+
+
+class ContextCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = FakeBackend(latency_ms=0, chunk_ms=0)
+
+    def make_cache(self, backend=None, **options):
+        options.setdefault('min_tokens', {'default': 10})
+        return SyncContextCache(backend or self.backend, SYSTEM, **options)
+
+    def test_prefix_is_created_once_and_reused(self):
+        cache = self.make_cache()
+        contents = conversation(5)
+
+        name, sent = cache.prepare(MODEL, contents)
+        self.assertIsNone(name)
+        self.assertEqual(sent, contents)
+        self.assertEqual(cache.stats['created'], 1)
+
+        name, sent = cache.prepare(MODEL, contents + [make_turn("user", "e agora?")])
+        self.assertIsNotNone(name)
+        self.assertEqual(sent, contents[4:] + [make_turn("user", "e agora?")])
+
+        again, _ = cache.prepare(MODEL, contents + [make_turn("user", "outra pergunta")])
+        self.assertEqual(again, name)
+        self.assertEqual(cache.stats['created'], 1)
+        self.assertEqual(len(self.backend._caches), 1)
+
+        # O backend aceita o nome e reconstrói o pedido completo
+        response = self.backend.generate(MODEL, sent, cached_content=name)
+        self.assertGreater(response.usage['cached_tokens'], 0)
+
+    def test_ttl_close_to_expiry_is_refreshed(self):
+        cache = self.make_cache(ttl=600, refresh_margin=601)
+        contents = conversation(5)
+        cache.prepare(MODEL, contents)
+        created = self.backend._caches[cache._entries[MODEL].context.name][0].expires_at
+
+        time.sleep(0.01)
+        name, _ = cache.prepare(MODEL, contents + [make_turn("user", "e agora?")])
+        self.assertEqual(cache.stats['refreshed'], 1)
+        self.assertGreater(self.backend._caches[name][0].expires_at, created)
+        self.assertEqual(cache.stats['created'], 1)
+
+    def test_expired_cache_is_recreated(self):
+        cache = self.make_cache(ttl=1, refresh_margin=0, expiry_margin=0)
+        contents = conversation(5)
+        cache.prepare(MODEL, contents)
+        first, _ = cache.prepare(MODEL, contents)
+        self.assertIsNotNone(first)
+
+        time.sleep(1.1)
+        name, sent = cache.prepare(MODEL, contents)
+        self.assertIsNone(name)
+        self.assertEqual(sent, contents)
+        self.assertNotIn(first, self.backend._caches)
+
+        second, _ = cache.prepare(MODEL, contents)
+        self.assertIsNotNone(second)
+        self.assertNotEqual(second, first)
+        self.assertEqual(cache.stats['created'], 2)
+
+    def test_invalidated_cache_falls_back_to_inline(self):
+        cache = self.make_cache()
+        contents = conversation(5)
+        cache.prepare(MODEL, contents)
+        name, sent = cache.prepare(MODEL, contents)
+
+        # Cache apagada do lado do backend: o pedido falha com 404 e o chat invalida-a
+        self.backend.delete_cache(name)
+        with self.assertRaises(BackendError) as error:
+            self.backend.generate(MODEL, sent, cached_content=name)
+        self.assertEqual(error.exception.code, 404)
+        cache.invalidate(MODEL, name)
+
+        name, sent = cache.prepare(MODEL, contents)
+        self.assertIsNone(name)
+        self.assertEqual(sent, contents)
+        self.assertEqual(cache.stats['errors'], 1)
+
+    def test_failed_create_sends_inline_and_waits_before_retrying(self):
+        backend = FailingBackend()
+        cache = self.make_cache(backend)
+        contents = conversation(5)
+
+        for _ in range(3):
+            name, sent = cache.prepare(MODEL, contents)
+            self.assertIsNone(name)
+            self.assertEqual(sent, contents)
+        self.assertEqual(backend.create_calls, 1)
+        self.assertEqual(cache.stats['errors'], 1)
+        self.assertEqual(cache.stats['inline'], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
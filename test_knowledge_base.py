@@ -0,0 +1,96 @@
+"""
+Notas locais juntas à pergunta e pesquisa dispensada: decisões pelos termos
+da pergunta que o excerto contém, iguais com poucas ou muitas notas
+
+Uso:
+    python -m unittest test_knowledge_base
+"""
+import os
+import random
+import tempfile
+import unittest
+
+from gemini_chat_real import GeminiCatChat
+from knowledge_base import KnowledgeBase, build_index, np
+
+NOTES = {
+    'farmacia.md': "A farmácia abre às 9h e fecha às 19h.",
+    'ginasio.md': "O ginásio abre às 7h.",
+    'gato.md': "O Tareco come ração de salmão duas vezes por dia.",
+}
+PLACES = ("loja escola biblioteca correio banco padaria mercado praia jardim museu cinema teatro "
+          "piscina estação hospital restaurante café oficina igreja câmara").split()
+VERBS = "abre fecha funciona atende começa termina".split()
+
+
+def write_notes(folder, filler=0, seed=1):
+    """Notas fixas e `filler` notas curtas parecidas entre si (horários de outros sítios)"""
+    rng = random.Random(seed)
+    notes = dict(NOTES)
+    for i in range(filler):
+        notes[f'nota{i}.md'] = (f"O {rng.choice(PLACES)} {rng.choice(VERBS)} às {rng.randint(6, 22)}h "
+                                f"e tem {rng.choice(PLACES)} perto.")
+    for name, text in notes.items():
+        with open(os.path.join(folder, name), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+@unittest.skipIf(np is None, "requer NumPy")
+class KnowledgeDecisionTest(unittest.TestCase):
+    # Com 3 notas e com 150: o cosseno muda com o IDF, as decisões não podem mudar
+    CORPUS_SIZES = (0, 147)
+
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.TemporaryDirectory()
+        cls.chats = []
+        for filler in cls.CORPUS_SIZES:
+            notes = os.path.join(cls.folder.name, f'notas{filler}')
+            index = os.path.join(cls.folder.name, f'indice{filler}')
+            os.makedirs(notes)
+            write_notes(notes, filler)
+            build_index(notes, index)
+            chat = GeminiCatChat(None)
+            chat._knowledge = KnowledgeBase.load(index)
+            chat._knowledge_loaded = True  # Sem verificação da pasta configurada
+            cls.chats.append(chat)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.chats = []
+        cls.folder.cleanup()
+
+    def decide(self, chat, message):
+        knowledge = chat.retrieve_knowledge(message)
+        strong = chat.strong_knowledge(knowledge)
+        return [hit.chunk.source for hit in knowledge], strong.chunk.source if strong else None
+
+    def assertDecision(self, message, attached, strong):
+        for chat, size in zip(self.chats, self.CORPUS_SIZES):
+            with self.subTest(message=message, notes=len(NOTES) + size):
+                sources, strong_source = self.decide(chat, message)
+                self.assertEqual(sources[:1], [attached] if attached else [])
+                self.assertEqual(strong_source, strong)
+
+    def test_note_that_answers_is_attached(self):
+        # Cosseno 0.14-0.23 conforme o número de notas: antes ficava abaixo do mínimo com poucas notas
+        self.assertDecision("a que horas abre a farmácia?", 'farmacia.md', None)
+
+    def test_note_on_same_subject_does_not_suppress_search(self):
+        # Só 'ginásio' em comum: a nota vai com a pergunta mas o preço tem de ser pesquisado
+        self.assertDecision("preço do ginásio", 'ginasio.md', None)
+
+    def test_note_with_every_term_suppresses_search(self):
+        self.assertDecision("quando abre o ginásio?", 'ginasio.md', 'ginasio.md')
+        self.assertDecision("o Tareco come o quê?", 'gato.md', 'gato.md')
+
+    def test_single_term_never_suppresses_search(self):
+        self.assertDecision("farmácia", 'farmacia.md', None)
+
+    def test_unrelated_question_attaches_nothing(self):
+        self.assertDecision("qual é a capital de frança?", None, None)
+        self.assertDecision("qual é o melhor portátil para programar?", None, None)
+
+
+if __name__ == "__main__":
+    unittest.main()
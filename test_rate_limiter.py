@@ -0,0 +1,91 @@
+"""
+Repetições do RateLimitScheduler: quota gasta por tentativa, e
+cancelamento ou prazo durante a espera
+
+Uso:
+    python -m unittest test_rate_limiter
+"""
+import threading
+import unittest
+
+from chat_workers import ChatRequest, RequestCancelled, RequestTimeout
+from llm_backend import BackendError
+from rate_limiter import GROUNDED, PLAIN, RateLimitScheduler
+
+
+def make_request(timeout=None):
+    return ChatRequest(None, (), None, timeout, None)
+
+
+class FlakyCall:
+    """Falha com `code` nas primeiras `failures` chamadas; regista as rotas usadas"""
+
+    def __init__(self, failures, code=503, retry_after=None):
+        self.failures = failures
+        self.code = code
+        self.retry_after = retry_after
+        self.routes = []
+
+    def __call__(self, route):
+        self.routes.append(route)
+        if len(self.routes) <= self.failures:
+            raise BackendError(self.code, "simulado", retry_after=self.retry_after)
+        return "ok"
+
+
+class RateLimitSchedulerTest(unittest.TestCase):
+    def make_scheduler(self, burst=3, rpm=600, **options):
+        options.setdefault('retry_base_delay', 0.01)
+        options.setdefault('retry_max_delay', 0.01)
+        return RateLimitScheduler(rpm, rpm, burst=burst, **options)
+
+    def test_each_retry_takes_a_token(self):
+        scheduler = self.make_scheduler(burst=3, rpm=0.001)
+        request = make_request()
+        route = scheduler.acquire(False, request)
+        self.assertEqual(route, PLAIN)
+
+        call = FlakyCall(failures=2)
+        self.assertEqual(scheduler.run(route, call, request), "ok")
+        self.assertEqual(call.routes, [PLAIN, PLAIN, PLAIN])
+        self.assertEqual(scheduler.buckets[PLAIN].available, 0)
+
+    def test_retry_without_quota_gives_up_with_the_api_error(self):
+        scheduler = self.make_scheduler(burst=1, rpm=0.001, max_wait=0.05)
+        request = make_request()
+        route = scheduler.acquire(False, request)
+
+        call = FlakyCall(failures=1)
+        with self.assertRaises(BackendError):
+            scheduler.run(route, call, request)
+        self.assertEqual(call.routes, [PLAIN])
+
+    def test_grounded_error_falls_back_to_plain_with_its_own_token(self):
+        scheduler = self.make_scheduler()
+        request = make_request()
+        route = scheduler.acquire(True, request)
+        self.assertEqual(route, GROUNDED)
+
+        call = FlakyCall(failures=1, code=429)
+        self.assertEqual(scheduler.run(route, call, request), "ok")
+        self.assertEqual(call.routes, [GROUNDED, PLAIN])
+        self.assertEqual(scheduler.buckets[PLAIN].available, 2)
+
+    def test_cancel_during_backoff_raises_request_cancelled(self):
+        scheduler = self.make_scheduler(retry_base_delay=5, retry_max_delay=5)
+        request = make_request()
+        threading.Timer(0.05, request.token.cancel).start()
+
+        with self.assertRaises(RequestCancelled):
+            scheduler.run(PLAIN, FlakyCall(failures=1, retry_after=5), request)
+
+    def test_backoff_past_deadline_raises_request_timeout(self):
+        scheduler = self.make_scheduler()
+        request = make_request(timeout=1)
+
+        with self.assertRaises(RequestTimeout):
+            scheduler.run(PLAIN, FlakyCall(failures=1, code=429, retry_after=30), request)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Regressão da cache de respostas: perguntas que só diferem em operadores ou
+símbolos não podem partilhar resposta
+
+Uso:
+    python -m unittest test_response_cache
+"""
+import os
+import tempfile
+import unittest
+
+from response_cache import ResponseCache, SimilarityIndex, normalize_prompt
+
+
+class NormalizePromptTest(unittest.TestCase):
+    def test_decorative_punctuation_is_ignored(self):
+        self.assertEqual(normalize_prompt("Olá!!  Tudo bem?"), normalize_prompt("olá tudo bem"))
+        self.assertEqual(normalize_prompt("«Olá», tudo bem"), normalize_prompt("olá tudo bem"))
+
+    def test_operators_and_symbols_are_kept(self):
+        self.assertNotEqual(normalize_prompt("quanto é 1234 + 5678?"), normalize_prompt("quanto é 1234 - 5678?"))
+        self.assertNotEqual(normalize_prompt("C++"), normalize_prompt("C"))
+        self.assertEqual(normalize_prompt("o pi é 3.14?"), "o pi é 3.14")
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(os.path.join(self.folder.name, 'cache.sqlite3'))
+
+    def tearDown(self):
+        self.cache._db.close()
+        self.folder.cleanup()
+
+    def test_exact_key_keeps_operators(self):
+        self.cache.put("quanto é 1234 + 5678?", "", False, "6912")
+        self.assertEqual(self.cache.get("Quanto é 1234 + 5678"), "6912")
+        self.assertIsNone(self.cache.get("quanto é 1234 - 5678?"))
+
+    def test_similar_question_needs_same_numbers_and_symbols(self):
+        self.cache.put("explica-me como funcionam os templates em C++ com exemplos", "", False, "cpp")
+        self.assertIsNone(self.cache.get("explica-me como funcionam os templates em C com exemplos"))
+        self.cache.put("qual é o resultado de 1234 + 5678 em python, passo a passo", "", False, "6912")
+        self.assertIsNone(self.cache.get("qual é o resultado de 1234 - 5678 em python, passo a passo"))
+        self.assertEqual(self.cache.get("qual é o resultado de 1234 + 5678 em python passo a passo!"), "6912")
+
+
+class SimilarityIndexTest(unittest.TestCase):
+    QUESTIONS = [f"pergunta número {i} sobre o tema {topic}"
+                 for i in range(200) for topic in ("gatos", "python")]
+
+    def test_add_does_not_recompute_every_norm(self):
+        index = SimilarityIndex()
+        for i, question in enumerate(self.QUESTIONS[:100]):
+            index.add(str(i), "p:", normalize_prompt(question))
+        index.best_match("p:", "pergunta sobre gatos")
+        norms = dict(index._norms)
+        index.add("novo", "p:", "uma pergunta nova sobre gatos")
+        index.best_match("p:", "pergunta sobre gatos")
+        self.assertEqual({k: v for k, v in index._norms.items() if k != "novo"}, norms)
+
+    def test_scores_stay_close_to_full_recompute(self):
+        index = SimilarityIndex()
+        for i, question in enumerate(self.QUESTIONS):
+            index.add(str(i), "p:", normalize_prompt(question))
+            if i % 7 == 0:
+                index.best_match("p:", "pergunta sobre python")
+        for i in range(0, len(self.QUESTIONS), 3):
+            index.remove(str(i))
+
+        query = normalize_prompt("pergunta número 42 sobre o tema python")
+        key, score = index.best_match("p:", query)
+        index._stale = len(index._docs) + 1  # Forçar recálculo com o IDF atual
+        fresh_key, fresh_score = index.best_match("p:", query)
+        self.assertEqual(key, fresh_key)
+        self.assertAlmostEqual(score, fresh_score, delta=0.02)
+
+
+if __name__ == "__main__":
+    unittest.main()
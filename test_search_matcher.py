@@ -0,0 +1,152 @@
+"""
+Equivalência do matcher de keywords de should_activate_search com o
+algoritmo anterior (um `in` por keyword), e casos de padrões negativos e
+de limites de palavra
+
+Uso:
+    python -m unittest test_search_matcher
+"""
+import random
+import unittest
+
+from gemini_chat_real import GeminiCatChat
+from search_matcher import KeywordMatcher
+
+FIXED_MESSAGES = (
+    "",
+    "   ",
+    "olá",
+    "Onde posso comprar ração hoje?",
+    "  qual é o melhor portátil?",
+    "Como estás?",
+    "ele estava a ver o preço ontem e foram embora",
+    "PREÇOS ATUALIZADOS!!",
+    "sabias que o chá tem cafeína?",
+    "em stock em lisboa",
+    "qual é o telefone da farmácia?",
+    "verifica se a loja abre amanhã, e vê se há desconto " * 4,
+    "x" * 200,
+)
+
+
+def legacy_score(chat, user_message):
+    """Algoritmo de scoring anterior, copiado tal como estava"""
+    score = 0
+    message_lower = user_message.lower()
+    message_words = message_lower.split()
+
+    for keyword in chat.search_keywords:
+        if keyword in message_lower:
+            score += 1
+    if '?' in user_message:
+        score += 2
+    if '!' in user_message:
+        score += 1
+    first_word = message_words[0] if message_words else ''
+    if first_word in chat.question_words:
+        score += 2
+    for keyword in chat.search_keywords:
+        if keyword in ' '.join(message_words[:3]):
+            score += 1
+            break
+    if len(user_message) < 50 and any(kw in message_lower for kw in chat.search_keywords):
+        score += 1
+    if any(indicator in message_lower for indicator in chat.narrative_indicators):
+        score -= 2
+    if len(user_message) > 150 and '?' not in user_message:
+        score -= 1
+    past_tense_indicators = ['estava', 'estive', 'fui', 'era', 'foram']
+    if any(past in message_lower for past in past_tense_indicators):
+        score -= 1
+    emotional_patterns = [
+        'como estás', 'como está', 'como vai', 'como te sentes',
+        'estou feliz', 'estou triste', 'estou bem', 'estou mal',
+        'sinto-me', 'sentes-te'
+    ]
+    if any(pattern in message_lower for pattern in emotional_patterns):
+        score -= 5
+    return (score >= 3, score)
+
+
+SEPARATORS = (" ", " ", " ", "  ", "\t", ", ", "?", "!", "")
+# Sem espaços repetidos nem tabs: o algoritmo anterior só normalizava espaços nas primeiras 3 palavras
+REGULAR_SEPARATORS = (" ", " ", " ", ", ", "?", "!", "")
+
+
+def corpus(chat, count, seed, separators=SEPARATORS):
+    """Mensagens fixas e aleatórias (keywords, palavras soltas, maiúsculas e pontuação)"""
+    rng = random.Random(seed)
+    vocabulary = sorted(chat.search_keywords | chat.question_words | chat.narrative_indicators |
+                        chat.past_tense_indicators | chat.emotional_patterns)
+    filler = ["o", "gato", "casa", "python", "lisboa", "chá", "também", "porque", "x", "123"]
+    messages = list(FIXED_MESSAGES)
+    for _ in range(count):
+        words = [rng.choice(vocabulary if rng.random() < 0.4 else filler)
+                 for _ in range(rng.randint(0, 40))]
+        text = "".join(word + rng.choice(separators) for word in words)
+        if rng.random() < 0.3:
+            text = text.upper()
+        if rng.random() < 0.2:
+            text = " " + text
+        messages.append(text)
+    return messages
+
+
+class SearchScoreTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.chat = GeminiCatChat(None)
+
+    def test_same_score_as_legacy_algorithm(self):
+        for message in corpus(self.chat, 2000, seed=1, separators=REGULAR_SEPARATORS):
+            with self.subTest(message=message):
+                self.assertEqual(self.chat.should_activate_search(message), legacy_score(self.chat, message))
+
+    def test_repeated_whitespace_is_normalized(self):
+        # Padrões com espaço contam com espaços repetidos ou tabs em toda a mensagem
+        # (antes só nas primeiras 3 palavras)
+        for message, regular in (("onde   posso comprar ração?", "onde posso comprar ração?"),
+                                 ("qual\té o horário da loja", "qual é o horário da loja"),
+                                 ("tens isso em\tstock em lisboa", "tens isso em stock em lisboa")):
+            with self.subTest(message=message):
+                self.assertEqual(self.chat.should_activate_search(message),
+                                 legacy_score(self.chat, regular))
+
+    def test_negative_patterns_lower_the_score(self):
+        self.assertEqual(self.chat.should_activate_search("Como estás?"), (False, -1))
+        self.assertEqual(self.chat.should_activate_search("onde posso comprar ração?"), (True, 8))
+        # Narrativa (-2) e passado (-1), e já não começa por palavra interrogativa nem keyword
+        self.assertEqual(self.chat.should_activate_search("ela estava a ver onde posso comprar ração?"), (False, 2))
+
+    def test_patterns_match_inside_words(self):
+        # Tal como o `in` anterior: 'ele' conta dentro de 'telefone' e 'há' dentro de 'chá'
+        self.assertEqual(self.chat.should_activate_search("qual é o telefone da farmácia?"),
+                         legacy_score(self.chat, "qual é o telefone da farmácia?"))
+        self.assertEqual(self.chat.should_activate_search("gosto de chá"), (True, 3))
+
+
+class KeywordMatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.matcher = KeywordMatcher({'search': {'onde', 'onde posso', 'há'}, 'narrative': {'ele'}})
+
+    def test_overlapping_patterns_are_all_found(self):
+        self.assertEqual(self.matcher.present("onde posso ir"), {'onde', 'onde posso'})
+        hits = self.matcher.find_all("onde posso ir")
+        self.assertEqual([(hit.start, hit.end, hit.pattern) for hit in hits],
+                         [(0, 4, 'onde'), (0, 10, 'onde posso')])
+
+    def test_word_boundaries(self):
+        hits = {hit.pattern: hit.whole_word for hit in self.matcher.find_all("o telefone dele")}
+        self.assertEqual(hits, {'ele': False})
+        self.assertTrue(self.matcher.find_all("ele")[0].whole_word)
+        self.assertFalse(self.matcher.find_all("chá")[0].whole_word)
+        self.assertTrue(self.matcher.find_all("há chá?")[0].whole_word)
+
+    def test_empty_pattern_sets(self):
+        matcher = KeywordMatcher({'search': set()})
+        self.assertEqual(matcher.present("qualquer coisa"), set())
+        self.assertEqual(matcher.find_all("qualquer coisa"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()